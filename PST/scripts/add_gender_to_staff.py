@@ -1,9 +1,31 @@
 # add_gender_to_staff.py
 # Script to add gender column to staff-list.csv based on names
 
+import argparse
 import csv
+import hashlib
+import json
+import os
 import re
-from collections import Counter
+import shutil
+import tempfile
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import instrumentation
+import staff_data
+
+# numpy and pyarrow take a few hundred ms to import; arrow_available() loads them the
+# first time a batch is classified, so commands that don't classify start quickly
+np = pa = pc = None
+_arrow_loaded = False
+
+# Rows held in memory at once while streaming; keeps memory flat on large exports
+CHUNK_SIZE = 5000
+SAMPLE_SIZE = 20
+SHARDS_PER_WORKER = 4
+# Distinct names/tokens remembered by the prediction cache (0 disables it)
+CACHE_SIZE = 100_000
 
 # Gambian/West African name patterns for gender prediction
 MALE_NAMES = {
@@ -20,6 +42,134 @@ FEMALE_NAMES = {
     'kaddy', 'adama', 'asanna', 'fatoumata', 'hawa', 'sanyang', 'ceesay'
 }
 
+# Substrings checked against the whole name when no single part matches
+FEMALE_INDICATORS = ['binta', 'fatou', 'awa', 'isatou', 'neneh']
+MALE_INDICATORS = ['lamin', 'ousman', 'momodou', 'ebrima']
+
+# Compiled lookup tables for predict_genders(); male wins where a name is in both sets,
+# matching the order of the checks in predict_gender()
+NAME_GENDERS = {**{name: 'Female' for name in FEMALE_NAMES}, **{name: 'Male' for name in MALE_NAMES}}
+NON_LETTERS_RE = re.compile(r'[^a-z]')
+FEMALE_INDICATORS_RE = re.compile('|'.join(map(re.escape, FEMALE_INDICATORS)))
+MALE_INDICATORS_RE = re.compile('|'.join(map(re.escape, MALE_INDICATORS)))
+
+_NAME_GENDER_KEYS = _NAME_GENDER_VALUES = None
+
+def arrow_available():
+    """Import numpy/pyarrow for the vectorized classifier; False if they aren't installed"""
+    global np, pa, pc, _NAME_GENDER_KEYS, _NAME_GENDER_VALUES, _arrow_loaded
+    if not _arrow_loaded:
+        try:
+            import numpy
+            import pyarrow
+            import pyarrow.compute
+        except ImportError:
+            pass
+        else:
+            _NAME_GENDER_KEYS = pyarrow.array(list(NAME_GENDERS), type=pyarrow.string())
+            _NAME_GENDER_VALUES = numpy.array(list(NAME_GENDERS.values()), dtype=object)
+            np, pa, pc = numpy, pyarrow, pyarrow.compute
+        _arrow_loaded = True
+    return pa is not None
+
+# Fingerprint of the rules above; persisted caches built from other rules are discarded
+RULES_FINGERPRINT = hashlib.sha256(json.dumps(
+    [sorted(MALE_NAMES), sorted(FEMALE_NAMES), FEMALE_INDICATORS, MALE_INDICATORS]
+).encode('utf-8')).hexdigest()
+
+_MISSING = object()
+
+class LRUCache:
+    """Bounded mapping that evicts the least recently used entry, with hit/miss counters"""
+
+    def __init__(self, maxsize=CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        value = self._data.get(key, _MISSING)
+        if value is _MISSING:
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def items(self):
+        """Entries from least to most recently used"""
+        return list(self._data.items())
+
+class GenderCache:
+    """
+    Memoizes predictions per normalized full name and the lookup result per name part.
+    Can be saved to and loaded from a JSON file between runs.
+    """
+
+    def __init__(self, maxsize=CACHE_SIZE):
+        self.names = LRUCache(maxsize)
+        self.tokens = LRUCache(maxsize)
+
+    @staticmethod
+    def normalize(full_name):
+        """
+        Cache key for a name. Predictions only depend on the lowercased name parts,
+        so case and whitespace differences share one entry.
+        """
+        return ' '.join(full_name.lower().split()) if isinstance(full_name, str) else ''
+
+    @property
+    def hits(self):
+        return self.names.hits + self.tokens.hits
+
+    @property
+    def misses(self):
+        return self.names.misses + self.tokens.misses
+
+    def update(self, entries):
+        """Add (normalized name, gender) pairs, e.g. collected from a worker's cache"""
+        for key, gender in entries:
+            self.names.put(key, gender)
+
+    @classmethod
+    def load(cls, path, maxsize=CACHE_SIZE):
+        """Load a cache saved by save(); returns an empty cache if the file is missing or stale"""
+        cache = cls(maxsize)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return cache
+        if data.get('rules') != RULES_FINGERPRINT:
+            return cache
+        cache.update(data.get('names', []))
+        for key, gender in data.get('tokens', []):
+            cache.tokens.put(key, gender)
+        return cache
+
+    def save(self, path):
+        data = {
+            'rules': RULES_FINGERPRINT,
+            'names': self.names.items(),
+            'tokens': self.tokens.items(),
+        }
+        fd, tmp_path = _make_temp_file(path)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
 def predict_gender(full_name):
     """
     Predict gender based on Gambian/West African name patterns
@@ -45,62 +195,595 @@ def predict_gender(full_name):
     name_lower = full_name.lower()
     
     # Check for female indicators
-    if any(indicator in name_lower for indicator in ['binta', 'fatou', 'awa', 'isatou', 'neneh']):
+    if any(indicator in name_lower for indicator in FEMALE_INDICATORS):
         return 'Female'
     
     # Check for male indicators
-    if any(indicator in name_lower for indicator in ['lamin', 'ousman', 'momodou', 'ebrima']):
+    if any(indicator in name_lower for indicator in MALE_INDICATORS):
         return 'Male'
     
     return 'Unknown'
 
-def main():
+def _predict_gender_compiled(full_name, token_cache=None):
+    """predict_gender() using the precompiled lookup tables; same results"""
+    if not full_name:
+        return 'Unknown'
+
+    name_lower = full_name.lower()
+    for part in name_lower.split():
+        if token_cache is None:
+            gender = NAME_GENDERS.get(NON_LETTERS_RE.sub('', part))
+        else:
+            gender = token_cache.get(part, _MISSING)
+            if gender is _MISSING:
+                gender = NAME_GENDERS.get(NON_LETTERS_RE.sub('', part))
+                token_cache.put(part, gender)
+        if gender:
+            return gender
+
+    if FEMALE_INDICATORS_RE.search(name_lower):
+        return 'Female'
+    if MALE_INDICATORS_RE.search(name_lower):
+        return 'Male'
+    return 'Unknown'
+
+def predict_genders(names, cache=None):
+    """
+    Predict gender for a whole column of names at once.
+    Accepts a pandas Series, NumPy array or any iterable of names; missing values
+    (None/NaN) are treated as empty names. Results are identical to calling
+    predict_gender() on each name.
+    With a GenderCache, each distinct name is classified at most once while it stays cached.
+    Returns: list of 'Male', 'Female', or 'Unknown' in input order
+    """
+    if cache is None:
+        return _predict_genders_batch(names)
+
+    keys = [cache.normalize(name) for name in names]
+    genders = [None] * len(keys)
+    pending = {}
+    for i, key in enumerate(keys):
+        if key in pending:
+            # Repeat of a name first seen in this batch; answered without reclassifying
+            cache.names.hits += 1
+            pending[key].append(i)
+            continue
+        gender = cache.names.get(key)
+        if gender is None:
+            pending[key] = [i]
+        else:
+            genders[i] = gender
+
+    if pending:
+        new_keys = list(pending)
+        for key, gender in zip(new_keys, _predict_genders_batch(new_keys, cache.tokens)):
+            cache.names.put(key, gender)
+            for i in pending[key]:
+                genders[i] = gender
+
+    return genders
+
+def _predict_genders_batch(names, token_cache=None):
+    """Uncached predict_genders(); token_cache is used for names classified in Python"""
+    if not hasattr(names, '__len__'):
+        names = list(names)
+    if arrow_available():
+        try:
+            values = pa.array(names, type=pa.string(), from_pandas=True)
+        except (pa.ArrowException, TypeError):
+            values = None  # e.g. numbers mixed in; handled row by row below
+        if values is not None:
+            return _predict_genders_arrow(values, token_cache)
+
+    return [_predict_gender_compiled(name if isinstance(name, str) else '', token_cache)
+            for name in names]
+
+def _predict_genders_arrow(values, token_cache=None):
+    """
+    Vectorized predict_genders() over a pyarrow string array. Each distinct name is
+    classified once: all names are lowercased and split in one pass, every part is
+    cleaned with one regex replace and resolved with a single hash lookup against
+    NAME_GENDERS, and the substring indicators are matched with one compiled regex each.
+    """
+    encoded = pc.dictionary_encode(values.fill_null(''))
+    names = encoded.dictionary
+    genders = np.full(len(names), 'Unknown', dtype=object)
+
+    # Arrow's case mapping and whitespace rules match Python's for plain ASCII only;
+    # anything else goes through the Python implementation
+    vectorizable = pc.and_(pc.string_is_ascii(names),
+                           pc.invert(pc.match_substring_regex(names, '[\x1c-\x1f]')))
+    vectorizable = vectorizable.to_numpy(zero_copy_only=False)
+    for i in np.flatnonzero(~vectorizable):
+        genders[i] = _predict_gender_compiled(names[i].as_py(), token_cache)
+
+    rows = np.flatnonzero(vectorizable)
+    lower = pc.ascii_lower(names.take(pa.array(rows)))
+
+    # The first name part found in NAME_GENDERS decides the gender
+    parts = pc.ascii_split_whitespace(lower)
+    part_rows = pc.list_parent_indices(parts).to_numpy()
+    codes = pc.index_in(pc.replace_substring_regex(pc.list_flatten(parts), NON_LETTERS_RE.pattern, ''),
+                        value_set=_NAME_GENDER_KEYS)
+    matched = codes.is_valid().to_numpy(zero_copy_only=False)
+    first_rows, first = np.unique(part_rows[matched], return_index=True)
+    resolved = np.full(len(rows), 'Unknown', dtype=object)
+    resolved[first_rows] = _NAME_GENDER_VALUES[codes.filter(codes.is_valid()).to_numpy()[first]]
+
+    # Substring indicators only apply to names with no matching part
+    female = pc.match_substring_regex(lower, FEMALE_INDICATORS_RE.pattern).to_numpy(zero_copy_only=False)
+    resolved[(resolved == 'Unknown') & female] = 'Female'
+    male = pc.match_substring_regex(lower, MALE_INDICATORS_RE.pattern).to_numpy(zero_copy_only=False)
+    resolved[(resolved == 'Unknown') & male] = 'Male'
+
+    genders[rows] = resolved
+    return genders[encoded.indices.to_numpy()].tolist()
+
+def _make_temp_file(target_file):
+    """
+    Create an empty temporary file in the same directory as target_file, so it
+    can later be renamed over target_file. Returns: (fd, path)
+    """
+    target_dir = os.path.dirname(os.path.abspath(target_file))
+    fd, tmp_path = tempfile.mkstemp(prefix='.gender-', suffix='.csv', dir=target_dir)
+    # mkstemp creates files as 0600; use the permissions open() would have given
+    umask = os.umask(0)
+    os.umask(umask)
+    os.chmod(tmp_path, 0o666 & ~umask)
+    return fd, tmp_path
+
+def iter_chunks(reader, chunk_size):
+    """Yield lists of at most chunk_size rows from a csv reader"""
+    chunk = []
+    for row in reader:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def _classify_rows(reader, writer, chunk_size, sample_size, cache=None, report_progress=True):
+    """
+    Classify rows from reader one chunk at a time and write them to writer.
+    Returns: (total_records, gender_counts, sample_rows)
+    """
+    gender_counts = Counter()
+    sample_rows = []
+    total_records = 0
+
+    chunks = iter_chunks(reader, chunk_size)
+    while True:
+        with instrumentation.span('read'):
+            chunk = next(chunks, None)
+        if chunk is None:
+            break
+        with instrumentation.span('classify'):
+            genders = predict_genders([row.get('staff_name') for row in chunk], cache)
+            for row, gender in zip(chunk, genders):
+                row['gender'] = gender
+            gender_counts.update(genders)
+        with instrumentation.span('write'):
+            writer.writerows(chunk)
+
+        if len(sample_rows) < sample_size:
+            sample_rows.extend(chunk[:sample_size - len(sample_rows)])
+
+        total_records += len(chunk)
+        if report_progress:
+            print(f"  Processed {total_records:,} records...")
+
+    return total_records, gender_counts, sample_rows
+
+def _read_header(input_file):
+    """
+    Read the header line of input_file.
+    Returns: (input fieldnames, output fieldnames, byte offset of the first data line)
+    """
+    with open(input_file, 'rb') as f:
+        header_line = f.readline()
+        data_start = f.tell()
+
+    # utf-8-sig drops the byte order mark spreadsheet exports put before the first
+    # column name, as pyarrow does, so every path sees the same field names
+    fieldnames = next(csv.reader([header_line.decode('utf-8-sig')]), [])
+
+    # Check if staff_name column exists
+    if 'staff_name' not in fieldnames:
+        raise ValueError("'staff_name' column not found in the file")
+
+    # Add gender to fieldnames if not already there
+    output_fieldnames = list(fieldnames)
+    if 'gender' not in output_fieldnames:
+        output_fieldnames.append('gender')
+    return fieldnames, output_fieldnames, data_start
+
+def find_shards(input_file, data_start, shard_count):
+    """
+    Split the data section of input_file into shard_count byte ranges that each
+    start at the beginning of a line.
+    Returns: list of (start, end) byte offsets, in file order
+    """
+    file_size = os.path.getsize(input_file)
+    step = max((file_size - data_start) // shard_count, 1)
+
+    boundaries = [data_start]
+    with open(input_file, 'rb') as f:
+        for i in range(1, shard_count):
+            offset = max(data_start + i * step, boundaries[-1])
+            if offset >= file_size:
+                break
+            # Move forward to the start of the next line
+            f.seek(offset - 1)
+            f.readline()
+            boundaries.append(min(f.tell(), file_size))
+    boundaries.append(file_size)
+
+    return [(start, end) for start, end in zip(boundaries, boundaries[1:]) if end > start]
+
+def _iter_lines(input_file, start, end):
+    """Yield the decoded lines of input_file that start within [start, end)"""
+    position = start
+    with open(input_file, 'rb') as f:
+        f.seek(start)
+        for line in f:
+            yield line.decode('utf-8')
+            position += len(line)
+            if position >= end:
+                break
+
+def _enrich_shard(input_file, start, end, fieldnames, output_fieldnames, shard_path,
+                  chunk_size, sample_size, cache_size, cache_file):
+    """
+    Process-pool worker: classify one byte range of input_file into shard_path.
+    Returns: (records, gender_counts, sample_rows, (cache hits, misses, entries) or None)
+    """
+    cache = None
+    if cache_size > 0:
+        cache = GenderCache.load(cache_file, cache_size) if cache_file else GenderCache(cache_size)
+
+    reader = csv.DictReader(_iter_lines(input_file, start, end), fieldnames=fieldnames)
+    with open(shard_path, 'w', encoding='utf-8', newline='') as f_out:
+        writer = csv.DictWriter(f_out, fieldnames=output_fieldnames)
+        result = _classify_rows(reader, writer, chunk_size, sample_size, cache, report_progress=False)
+
+    cache_result = None
+    if cache is not None:
+        # Only the names are sent back; they are what a persisted cache needs most
+        cache_result = (cache.hits, cache.misses, cache.names.items() if cache_file else [])
+    return result + (cache_result,)
+
+def _enrich_file_parallel(input_file, output_file, f_out, workers, chunk_size, sample_size,
+                          cache=None, cache_file=None):
+    """
+    Classify input_file across a pool of worker processes and append the shards
+    to f_out in their original order. Each worker keeps its own cache; their
+    counters and entries are merged into cache.
+    Returns: (total_records, gender_counts, sample_rows)
+    """
+    fieldnames, output_fieldnames, data_start = _read_header(input_file)
+    # A few shards per worker keeps every core busy when shards take uneven time
+    shards = find_shards(input_file, data_start, workers * SHARDS_PER_WORKER)
+
+    gender_counts = Counter()
+    sample_rows = []
+    total_records = 0
+
+    shard_dir = tempfile.mkdtemp(prefix='.gender-shards-', dir=os.path.dirname(os.path.abspath(output_file)))
+    try:
+        shard_paths = [os.path.join(shard_dir, f'shard-{i:05d}.csv') for i in range(len(shards))]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(_enrich_shard, input_file, start, end, fieldnames, output_fieldnames,
+                            shard_path, chunk_size, sample_size,
+                            cache.names.maxsize if cache is not None else 0, cache_file)
+                for (start, end), shard_path in zip(shards, shard_paths)
+            ]
+            # Merge in submission order so the output matches the serial path byte for byte
+            for i, (future, shard_path) in enumerate(zip(futures, shard_paths), 1):
+                with instrumentation.span('classify'):
+                    count, counts, sample, cache_result = future.result()
+                with instrumentation.span('write'), \
+                        open(shard_path, 'r', encoding='utf-8', newline='') as f_shard:
+                    shutil.copyfileobj(f_shard, f_out)
+                os.remove(shard_path)
+
+                total_records += count
+                gender_counts += counts
+                if cache_result is not None:
+                    hits, misses, entries = cache_result
+                    cache.names.hits += hits
+                    cache.names.misses += misses
+                    cache.update(entries)
+                if len(sample_rows) < sample_size:
+                    sample_rows.extend(sample[:sample_size - len(sample_rows)])
+                print(f"  Shard {i}/{len(shards)} done - {total_records:,} records processed...")
+    finally:
+        shutil.rmtree(shard_dir, ignore_errors=True)
+
+    return total_records, gender_counts, sample_rows
+
+def enrich_file(input_file, output_file, chunk_size=CHUNK_SIZE, sample_size=SAMPLE_SIZE, workers=1,
+                cache=None, cache_file=None):
+    """
+    Stream input_file through the gender classifier into output_file, one chunk at a time.
+    The output is written to a temporary file next to output_file and renamed into
+    place once complete, so readers never see a half-written file.
+
+    With workers > 1 the file is split into byte-range shards on line boundaries and
+    classified in a process pool. The output is byte-identical to the serial path
+    provided no field contains an embedded newline (one record per line).
+
+    cache is an optional GenderCache shared across chunks; cache_file is the path it
+    was loaded from, which lets parallel workers start from the same entries.
+    Returns: (fieldnames, total_records, gender_counts, sample_rows)
+    """
+    fieldnames = _read_header(input_file)[1]
+
+    fd, tmp_path = _make_temp_file(output_file)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8', newline='') as f_out:
+            writer = csv.DictWriter(f_out, fieldnames=fieldnames)
+            writer.writeheader()
+
+            if workers > 1:
+                f_out.flush()
+                total_records, gender_counts, sample_rows = _enrich_file_parallel(
+                    input_file, output_file, f_out, workers, chunk_size, sample_size,
+                    cache, cache_file)
+            else:
+                # Reads from the shared Arrow cache when pyarrow is installed
+                reader = staff_data.iter_staff_rows(input_file)
+                total_records, gender_counts, sample_rows = _classify_rows(
+                    reader, writer, chunk_size, sample_size, cache)
+
+        os.replace(tmp_path, output_file)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    _count_io(input_file, output_file, total_records)
+    return fieldnames, total_records, gender_counts, sample_rows
+
+def _count_io(input_file, output_file, total_records):
+    instrumentation.count('rows', total_records)
+    instrumentation.count('bytes_read', os.path.getsize(input_file))
+    instrumentation.count('bytes_written', os.path.getsize(output_file))
+
+def _row_key(row, key_columns):
+    """Identify a staff row by its TIN and employee number; None if it has neither"""
+    values = [row.get(col) or '' for col in key_columns]
+    return '\x1f'.join(values) if any(values) else None
+
+def _row_hash(row, fieldnames):
+    values = '\x1f'.join(row.get(col) or '' for col in fieldnames)
+    return hashlib.blake2b(values.encode('utf-8'), digest_size=8).hexdigest()
+
+MANIFEST_VERSION = 2
+
+def load_manifest(manifest_file, fieldnames):
+    """
+    Load the row manifest written by the previous incremental run.
+    Returns: [[row key, row hash, gender], ...] in input order, one entry per row (the
+    key is None for rows with neither TIN nor employee number), empty if missing or
+    made for other rules/columns
+    """
+    try:
+        with open(manifest_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return []
+    if (data.get('version') != MANIFEST_VERSION or data.get('rules') != RULES_FINGERPRINT
+            or data.get('fieldnames') != fieldnames):
+        return []
+    return data.get('rows', [])
+
+def save_manifest(manifest_file, fieldnames, rows):
+    fd, tmp_path = _make_temp_file(manifest_file)
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump({'version': MANIFEST_VERSION, 'rules': RULES_FINGERPRINT, 'fieldnames': fieldnames,
+                   'rows': rows}, f)
+    os.replace(tmp_path, manifest_file)
+
+def enrich_file_incremental(input_file, output_file, manifest_file, chunk_size=CHUNK_SIZE,
+                            sample_size=SAMPLE_SIZE, cache=None):
+    """
+    Like enrich_file(), but only classifies rows that are new or changed since the
+    run that wrote manifest_file. The manifest records every row in order; a row whose
+    tin/eeno and content match a previous row (each previous row matched at most once,
+    so repeated keys and rows without a key are counted exactly) reuses that row's
+    gender. When the input lists exactly the previous rows in the same order,
+    output_file is left untouched.
+    Returns: (fieldnames, total_records, gender_counts, sample_rows, changes) where
+    changes counts inserted/modified/unchanged/deleted rows and rows written
+    """
+    input_fieldnames, fieldnames, _ = _read_header(input_file)
+    key_columns = [col for col in ('tin', 'eeno') if col in input_fieldnames]
+    if not key_columns:
+        raise ValueError("incremental mode needs a 'tin' or 'eeno' column to identify rows")
+
+    old_rows = load_manifest(manifest_file, input_fieldnames)
+    # Previous genders by (key, hash), one entry per previous row still unmatched
+    unmatched_old = {}
+    for key, row_hash, gender in old_rows:
+        unmatched_old.setdefault((key, row_hash), []).append(gender)
+    # Keyed rows that matched no previous row; settled as modified or inserted at the end
+    unmatched_new = Counter()
+    new_rows = []
+    changes = Counter()
+    gender_counts = Counter()
+    sample_rows = []
+    total_records = 0
+    same_rows = True
+
+    fd, tmp_path = _make_temp_file(output_file)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8', newline='') as f_out, \
+                open(input_file, 'r', encoding='utf-8-sig', newline='') as f_in:
+            writer = csv.DictWriter(f_out, fieldnames=fieldnames)
+            writer.writeheader()
+
+            chunks = iter_chunks(csv.DictReader(f_in), chunk_size)
+            while True:
+                with instrumentation.span('read'):
+                    chunk = next(chunks, None)
+                if chunk is None:
+                    break
+                to_classify = []
+                chunk_entries = []
+                with instrumentation.span('diff'):
+                    for row in chunk:
+                        key = _row_key(row, key_columns)
+                        row_hash = _row_hash(row, input_fieldnames)
+                        position = len(new_rows) + len(chunk_entries)
+                        if same_rows and (position >= len(old_rows)
+                                          or old_rows[position][:2] != [key, row_hash]):
+                            same_rows = False
+
+                        previous = unmatched_old.get((key, row_hash))
+                        if previous:
+                            row['gender'] = previous.pop()
+                            changes['unchanged'] += 1
+                        else:
+                            to_classify.append(row)
+                            unmatched_new[key] += 1
+
+                        chunk_entries.append((key, row_hash))
+
+                with instrumentation.span('classify'):
+                    genders = predict_genders([row.get('staff_name') for row in to_classify], cache)
+                    for row, gender in zip(to_classify, genders):
+                        row['gender'] = gender
+
+                for row, (key, row_hash) in zip(chunk, chunk_entries):
+                    gender_counts[row['gender']] += 1
+                    new_rows.append([key, row_hash, row['gender']])
+                with instrumentation.span('write'):
+                    writer.writerows(chunk)
+
+                if len(sample_rows) < sample_size:
+                    sample_rows.extend(chunk[:sample_size - len(sample_rows)])
+                total_records += len(chunk)
+                print(f"  Processed {total_records:,} records ({sum(unmatched_new.values()):,} classified)...")
+
+        # A key seen both among the unmatched previous rows and the unmatched new rows
+        # was edited; rows without a key have no identity, so they are only added or removed
+        unmatched_old_keys = Counter()
+        for (key, _), genders in unmatched_old.items():
+            unmatched_old_keys[key] += len(genders)
+        for key, count in unmatched_new.items():
+            modified = min(count, unmatched_old_keys[key]) if key is not None else 0
+            changes['modified'] += modified
+            changes['inserted'] += count - modified
+            unmatched_old_keys[key] -= modified
+        changes['deleted'] = sum(unmatched_old_keys.values())
+
+        if same_rows and len(new_rows) == len(old_rows) and os.path.exists(output_file):
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, output_file)
+            save_manifest(manifest_file, input_fieldnames, new_rows)
+            changes['written'] = total_records
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    _count_io(input_file, output_file, total_records)
+    instrumentation.count('rows_classified', changes['inserted'] + changes['modified'])
+    return fieldnames, total_records, gender_counts, sample_rows, changes
+
+def replace_atomically(source_file, target_file):
+    """
+    Make target_file a copy of source_file via a rename, so target_file is
+    never left truncated. Hard-links when possible to avoid copying the data.
+    """
+    fd, tmp_path = _make_temp_file(target_file)
+    os.close(fd)
+    os.remove(tmp_path)
+    try:
+        try:
+            os.link(source_file, tmp_path)
+        except OSError:
+            shutil.copyfile(source_file, tmp_path)
+        os.replace(tmp_path, target_file)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Add a gender column to a staff list CSV')
+    parser.add_argument('input_file', nargs='?', default='staff-list.csv')
+    parser.add_argument('output_file', nargs='?', default='staff-list-with-gender.csv')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                        help=f'rows read, classified and written per chunk (default: {CHUNK_SIZE:,})')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='worker processes; > 1 splits the file into shards classified in parallel')
+    parser.add_argument('--cache-size', type=int, default=CACHE_SIZE,
+                        help=f'distinct names/name parts kept in the prediction cache, 0 to disable (default: {CACHE_SIZE:,})')
+    parser.add_argument('--cache-file',
+                        help='load the prediction cache from this file and save it back after the run')
+    parser.add_argument('--incremental', action='store_true',
+                        help='only classify rows added or changed since the last incremental run')
+    parser.add_argument('--manifest',
+                        help='row manifest used by --incremental (default: <output_file>.manifest.json)')
+    instrumentation.add_arguments(parser)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    with instrumentation.instrumented('add_gender_to_staff', args):
+        _main(args)
+
+def _main(args):
     print("=" * 60)
     print("Adding Gender Column to Staff List")
     print("=" * 60)
     print()
     
-    input_file = 'staff-list.csv'
-    output_file = 'staff-list-with-gender.csv'
+    input_file = args.input_file
+    output_file = args.output_file
     
-    # Read the CSV file
-    print(f"Reading {input_file}...")
+    cache = None
+    if args.cache_size > 0:
+        if args.cache_file:
+            cache = GenderCache.load(args.cache_file, args.cache_size)
+            print(f"Loaded {len(cache.names):,} cached names from {args.cache_file}")
+        else:
+            cache = GenderCache(args.cache_size)
+
+    # Stream the CSV file through the classifier
+    print(f"Reading {input_file} and predicting gender based on names...")
     try:
-        with open(input_file, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            fieldnames = reader.fieldnames
-            
-            # Check if staff_name column exists
-            if 'staff_name' not in fieldnames:
-                print("✗ Error: 'staff_name' column not found in the file")
-                return
-            
-            # Add gender to fieldnames if not already there
-            if 'gender' not in fieldnames:
-                fieldnames = list(fieldnames) + ['gender']
-            
-            rows = list(reader)
-            total_records = len(rows)
-            print(f"✓ Loaded {total_records:,} records")
-            
+        if args.incremental:
+            if args.workers > 1:
+                print("  Note: --incremental runs in a single process; ignoring --workers")
+            manifest_file = args.manifest or output_file + '.manifest.json'
+            fieldnames, total_records, gender_counts, sample_rows, changes = enrich_file_incremental(
+                input_file, output_file, manifest_file, chunk_size=args.chunk_size, cache=cache)
+        else:
+            fieldnames, total_records, gender_counts, sample_rows = enrich_file(
+                input_file, output_file, chunk_size=args.chunk_size, workers=args.workers,
+                cache=cache, cache_file=args.cache_file)
+    except ValueError as e:
+        print(f"✗ Error: {e}")
+        return
     except Exception as e:
-        print(f"✗ Error reading file: {e}")
+        print(f"✗ Error processing file: {e}")
         return
     
-    # Add gender column
-    print("\nPredicting gender based on names...")
-    gender_counts = Counter()
-    
-    for i, row in enumerate(rows, 1):
-        if i % 5000 == 0:
-            print(f"  Processed {i:,} / {total_records:,} records...")
-        
-        staff_name = row.get('staff_name', '')
-        gender = predict_gender(staff_name)
-        row['gender'] = gender
-        gender_counts[gender] += 1
-    
     print(f"✓ Processed all {total_records:,} records")
+    if args.incremental:
+        print(f"  New: {changes['inserted']:,}, changed: {changes['modified']:,}, "
+              f"unchanged: {changes['unchanged']:,}, removed: {changes['deleted']:,}")
+        if changes['written']:
+            print(f"✓ Successfully saved {total_records:,} records with gender column to {output_file}")
+        else:
+            print(f"✓ No changes since the last run; {output_file} left as is")
+    else:
+        print(f"✓ Successfully saved {total_records:,} records with gender column to {output_file}")
     
     # Show statistics
     print("\nGender Distribution:")
@@ -108,33 +791,26 @@ def main():
         percentage = (count / total_records) * 100
         print(f"  {gender}: {count:,} ({percentage:.1f}%)")
     
-    # Save the updated file
-    print(f"\nSaving to {output_file}...")
-    try:
-        with open(output_file, 'w', encoding='utf-8', newline='') as f:
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(rows)
-        print(f"✓ Successfully saved {total_records:,} records with gender column")
-    except Exception as e:
-        print(f"✗ Error saving file: {e}")
-        return
+    if cache is not None:
+        lookups = cache.hits + cache.misses
+        hit_rate = (cache.hits / lookups * 100) if lookups else 0
+        print(f"\nPrediction cache: {cache.hits:,} hits, {cache.misses:,} misses ({hit_rate:.1f}% hit rate)")
+        if args.cache_file:
+            cache.save(args.cache_file)
+            print(f"✓ Saved {len(cache.names):,} cached names to {args.cache_file}")
     
     # Show sample
     print("\nSample records with gender:")
     print(f"{'Staff Name':<30} {'Gender':<10}")
     print("-" * 40)
-    for row in rows[:20]:
+    for row in sample_rows:
         print(f"{row.get('staff_name', ''):<30} {row.get('gender', ''):<10}")
     
     # Optionally update original file
     print("\n" + "=" * 60)
-    update = input("Do you want to update the original staff-list.csv? (yes/no): ")
+    update = input(f"Do you want to update the original {input_file}? (yes/no): ")
     if update.lower() == 'yes':
-        with open(input_file, 'w', encoding='utf-8', newline='') as f:
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(rows)
+        replace_atomically(output_file, input_file)
         print("✓ Original file updated")
     else:
         print(f"Original file unchanged. Updated data saved in {output_file}")
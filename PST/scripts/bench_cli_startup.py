@@ -0,0 +1,111 @@
+# bench_cli_startup.py
+# Measure how long the pst command line takes to start
+#
+# Every case runs in a fresh Python process, --repeat times; the minimum and median
+# wall times are reported:
+#
+#   python                  a bare interpreter (the floor for everything else)
+#   pst --help              the command list
+#   pst <command> --help    dispatch plus the command's module and argument parser
+#   <command> ready         the command's module plus everything its work imports
+#                           (pandas for enrich/prepare, openpyxl for build-form and
+#                           clean-workbook, requests and the ODK client for uploads),
+#                           i.e. the time before it can start on its input
+#
+# Commands that only talk to ODK Central should start within --budget (default 100ms);
+# with --check the exit code is 1 when a `--help` case, or the ready case of such a
+# command, is over it. The ready time of those commands includes requests itself.
+#
+# Usage:
+#     python bench_cli_startup.py [--repeat 10] [--budget 100] [--check] [--importtime COMMAND]
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from pst import COMMANDS
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# What each command imports before it can do its work
+READY_IMPORTS = {
+    'enrich': 'import add_gender_to_staff; add_gender_to_staff.arrow_available(); import pandas',
+    'prepare': 'import prepare_staff_list_csv; import pandas',
+    'build-form': 'import create_autofill_tin_form; import openpyxl',
+    'upload': 'import quick_upload; import requests, odk_central',
+    'create-project': 'import create_odk_project; import requests, odk_central',
+    'clean-workbook': 'import delete_instance_name_column; import openpyxl',
+}
+NETWORK_COMMANDS = {'upload', 'create-project'}
+
+def time_command(args, repeat):
+    """Wall times in ms of running python with args from the scripts folder"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable] + args, cwd=SCRIPTS_DIR,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+def cases():
+    """(label, python arguments, command it belongs to or None)"""
+    yield 'python', ['-c', 'pass'], None
+    yield 'pst --help', ['pst.py', '--help'], None
+    for name in COMMANDS:
+        yield f'pst {name} --help', ['pst.py', name, '--help'], name
+    for name, imports in READY_IMPORTS.items():
+        yield f'{name} ready', ['-c', imports], name
+
+def show_importtime(name, top=15):
+    """Print the slowest imports of a command's ready case (python -X importtime)"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', READY_IMPORTS[name]],
+                            cwd=SCRIPTS_DIR, capture_output=True, text=True)
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative_us, module = line.split('|', 2)
+        imports.append((int(cumulative_us), module.rstrip()))
+    print(f"\nSlowest imports of '{name}' (cumulative, top {top}):")
+    for cumulative_us, module in sorted(imports, reverse=True)[:top]:
+        print(f"  {cumulative_us / 1000:>8.1f} ms  {module}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the startup time of the pst command line')
+    parser.add_argument('--repeat', type=int, default=10, help='runs per case (default: 10)')
+    parser.add_argument('--budget', type=float, default=100,
+                        help='startup budget in ms for --help and network commands (default: 100)')
+    parser.add_argument('--check', action='store_true', help='exit with 1 if a budgeted case is over budget')
+    parser.add_argument('--importtime', choices=list(READY_IMPORTS),
+                        help="also list the slowest imports of this command's ready case")
+    args = parser.parse_args()
+
+    over = 0
+    print(f"{'case':<28} {'min ms':>8} {'median ms':>10}")
+    for label, python_args, command in cases():
+        times = time_command(python_args, args.repeat)
+        fastest, median = min(times), statistics.median(times)
+        line = f"{label:<28} {fastest:>8.1f} {median:>10.1f}"
+        if label.endswith('--help') or command in NETWORK_COMMANDS:
+            if median > args.budget:
+                over += 1
+                line += f"  ✗ over {args.budget:.0f}ms"
+            else:
+                line += "  ✓"
+        print(line)
+
+    if args.importtime:
+        show_importtime(args.importtime)
+
+    if over:
+        print(f"\n✗ {over} case(s) over the {args.budget:.0f}ms startup budget")
+        return 1 if args.check else 0
+    print(f"\n✓ Every budgeted case starts within {args.budget:.0f}ms")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,63 @@
+# bench_gender_classifier.py
+# Benchmark predict_genders() (batch) against the per-row predict_gender() loop
+
+import argparse
+import random
+import time
+
+from add_gender_to_staff import (
+    FEMALE_NAMES, MALE_NAMES, arrow_available, predict_gender, predict_genders
+)
+
+try:
+    import pandas as pd
+except ImportError:
+    pd = None
+
+OTHER_NAMES = ['john', 'smith', 'njie', 'touray', 'bojang', 'darboe', 'sowe', 'faal']
+
+def make_names(count, seed=42):
+    """Build a reproducible list of staff names, including awkward edge cases"""
+    rng = random.Random(seed)
+    pool = sorted(MALE_NAMES) + sorted(FEMALE_NAMES) + OTHER_NAMES
+    edge_cases = ['', '   ', None, 'Mr. Ebrima-Sowe', "O'Mar Touray", 'XBINTAY K',
+                  'Njie Lamina', 'Dr. FATOU', 'Awah Touray', 'john\tsmith']
+    names = []
+    for _ in range(count):
+        if rng.random() < 0.02:
+            names.append(rng.choice(edge_cases))
+        else:
+            parts = [rng.choice(pool).title() for _ in range(rng.randint(1, 4))]
+            names.append(' '.join(parts))
+    return names
+
+def time_call(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the batch gender classifier')
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    print(f"Generating {args.rows:,} names...")
+    names = make_names(args.rows)
+    column = pd.Series(names) if pd is not None else names
+    print(f"Batch backend: {'pyarrow' if arrow_available() else 'pure Python (pyarrow not installed)'}")
+
+    expected, loop_time = time_call(lambda: [predict_gender(n) if n is not None else 'Unknown' for n in names])
+    actual, batch_time = time_call(predict_genders, column)
+
+    mismatches = sum(1 for a, b in zip(expected, actual) if a != b)
+    if mismatches or len(expected) != len(actual):
+        print(f"✗ Results differ from predict_gender() for {mismatches:,} names")
+        return
+
+    print(f"✓ Results identical for all {args.rows:,} names")
+    print(f"  predict_gender() loop: {loop_time:.2f}s ({args.rows / loop_time:,.0f} names/s)")
+    print(f"  predict_genders():     {batch_time:.2f}s ({args.rows / batch_time:,.0f} names/s)")
+    print(f"  Speed-up: {loop_time / batch_time:.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+# bench_odk_clients.py
+# Load-test the ODK Central clients against the local fake server (fake_central.py)
+#
+# Runs offline, so it can check performance claims in CI. For each form count it
+# starts a fresh fake server and deploys that many forms with their staff_list.csv
+# attachment, as deploy_forms.py does, both one request at a time and with
+# --concurrency requests in flight. It reports requests/sec, p50/p99 latency as seen by
+# the client (retries included) and total deploy time. The server can be made slow or
+# flaky with --latency, --error-rate and --rate-limit.
+#
+# It calls ODKCentralClient and deploy_forms.deploy directly rather than running the
+# upload scripts, so the timings cover the client alone: upload_to_odk_central.py asks
+# for credentials with input(), and the other scripts build forms and print progress
+# around the same client calls.
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+from deploy_forms import deploy
+from fake_central import FakeCentral
+from odk_central import ODKCentralClient
+from xlsform_builder import build_xlsform
+
+def make_form_files(folder, staff_rows=1000, seed=7):
+    """A small XLSForm and a staff_list.csv attachment to deploy"""
+    xlsform = os.path.join(folder, 'bench_form.xlsx')
+    build_xlsform({
+        'survey': [{'type': 'text', 'name': 'tin', 'label': 'TIN'}],
+        'settings': {'form_title': 'Benchmark form', 'form_id': 'bench_form', 'version': '1'},
+    }, xlsform)
+
+    rng = random.Random(seed)
+    attachment = os.path.join(folder, 'staff_list.csv')
+    with open(attachment, 'w', encoding='utf-8') as f:
+        f.write('tin,eeno,staff_name,gender,organisation,job\n')
+        for i in range(staff_rows):
+            f.write(f"{rng.randrange(10**7, 10**8)},{100000 + i},Staff {i},Male,Ministry {i % 40},Job {i % 300}\n")
+    return xlsform, attachment
+
+def run_deploy(server_options, form_count, concurrency, xlsform, attachment):
+    """Deploy form_count forms against a fresh fake server; returns the measurements"""
+    with FakeCentral(**server_options) as central:
+        client = ODKCentralClient(central.url, 'bench@example.org', 'secret', token_cache_file=None,
+                                  publish_record_file=None, pool_size=concurrency)
+        with client:
+            project_id = client.create_project('Benchmark').json()['id']
+            specs = [{'form_id': f'bench_form_{i}', 'xlsform': xlsform, 'attachments': [attachment]}
+                     for i in range(form_count)]
+            start = time.perf_counter()
+            # deploy() prints a line per form; keep the benchmark output to the table
+            with contextlib.redirect_stdout(io.StringIO()):
+                results = asyncio.run(deploy(client, project_id, specs, concurrency))
+            elapsed = time.perf_counter() - start
+            summary = client.metrics.summary()
+
+    return {
+        'forms': form_count,
+        'concurrency': concurrency,
+        'deployed': sum(1 for r in results if r['ok']),
+        'seconds': elapsed,
+        'requests': summary['requests'],
+        'retries': summary['retries'],
+        'requests_per_second': summary['requests'] / elapsed if elapsed else 0.0,
+        'p50_ms': summary['p50_seconds'] * 1000,
+        'p99_ms': summary['p99_seconds'] * 1000,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the ODK Central clients against a local fake server')
+    parser.add_argument('--forms', default='1,10,500', help='comma-separated form counts (default: 1,10,500)')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--latency', type=float, default=0.02, help='server latency per request in seconds')
+    parser.add_argument('--jitter', type=float, default=0.01)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit', type=int, default=None)
+    parser.add_argument('--staff-rows', type=int, default=1000, help='rows in the attachment')
+    parser.add_argument('--json', help='also write the results to this JSON file')
+    args = parser.parse_args()
+
+    server_options = {'latency': args.latency, 'jitter': args.jitter, 'error_rate': args.error_rate,
+                      'rate_limit': args.rate_limit, 'seed': 1}
+    form_counts = [int(n) for n in args.forms.split(',')]
+
+    print(f"Fake server: latency {args.latency * 1000:.0f}ms (+{args.jitter * 1000:.0f}ms jitter), "
+          f"error rate {args.error_rate:.0%}, rate limit {args.rate_limit or 'none'}")
+    print(f"{'forms':>6} {'conc':>5} {'ok':>5} {'total s':>9} {'requests':>9} {'retries':>8} "
+          f"{'req/s':>8} {'p50 ms':>8} {'p99 ms':>8}")
+
+    results = []
+    with tempfile.TemporaryDirectory() as folder:
+        xlsform, attachment = make_form_files(folder, args.staff_rows)
+        for form_count in form_counts:
+            for concurrency in sorted({1, args.concurrency}):
+                r = run_deploy(server_options, form_count, concurrency, xlsform, attachment)
+                results.append(r)
+                print(f"{r['forms']:>6} {r['concurrency']:>5} {r['deployed']:>5} {r['seconds']:>9.2f} "
+                      f"{r['requests']:>9} {r['retries']:>8} {r['requests_per_second']:>8.1f} "
+                      f"{r['p50_ms']:>8.1f} {r['p99_ms']:>8.1f}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'server': server_options, 'results': results}, f, indent=2)
+        print(f"\n✓ Results written to {args.json}")
+
+    # Without injected faults every form must deploy
+    failed = [r for r in results if r['deployed'] != r['forms']]
+    return 1 if failed and not (args.error_rate or args.rate_limit) else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,207 @@
+# bench_pipeline.py
+# Benchmark the staff data pipeline end to end on synthetic staff lists
+#
+# For each row count a staff list is generated (generate_staff_list.py) and pushed
+# through the pipeline stages in order:
+#
+#   generate          write the synthetic raw staff list
+#   add_gender        add_gender_to_staff.enrich_file()
+#   prepare           prepare_staff_list_csv.prepare_staff_list(), whole file in memory
+#   prepare_chunked   the same with --chunksize streaming
+#   variants          build_form_variants.build_form_variants() (forced rebuild)
+#
+# Each stage runs in a fresh Python process, so its peak RSS is its own (worker
+# processes included). Reported per stage: wall time, peak RSS and rows/sec.
+#
+# With --bom the staff list starts with a UTF-8 byte order mark, as Excel writes
+# CSVs, and the add_gender stage checks its output header came through without it.
+#
+# With --baseline FILE the results are compared to the ones stored there and a stage
+# is flagged when its rows/sec drops, or its peak RSS grows, by more than --tolerance;
+# the exit code is then 1. --save-baseline stores this run's results in FILE.
+#
+# Usage:
+#     python bench_pipeline.py [--rows 10000,1000000] [--stages ...] [--bom] [--baseline FILE [--save-baseline]]
+#     python bench_pipeline.py --rows 10000000 --stages generate,add_gender,prepare_chunked
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import instrumentation
+
+STAGES = ['generate', 'add_gender', 'prepare', 'prepare_chunked', 'variants']
+# The stage whose output each stage reads
+INPUT_STAGE = {'add_gender': 'generate', 'prepare': 'add_gender', 'prepare_chunked': 'add_gender',
+               'variants': 'prepare'}
+PREPARE_CHUNKSIZE = 500_000
+
+def _paths(workdir):
+    return {
+        'raw': os.path.join(workdir, 'staff-list.csv'),
+        'gender': os.path.join(workdir, 'staff-list-with-gender.csv'),
+        'staff_list': os.path.join(workdir, 'staff_list.csv'),
+        'staff_list_chunked': os.path.join(workdir, 'staff_list_chunked.csv'),
+        'forms': os.path.join(workdir, 'forms'),
+    }
+
+def run_stage(stage, rows, workdir, seed=42, bom=False):
+    """Run one stage in this process; imports happen here so they count towards it"""
+    paths = _paths(workdir)
+    if stage == 'generate':
+        from generate_staff_list import generate_staff_list
+        generate_staff_list(paths['raw'], rows, seed, bom=bom)
+    elif stage == 'add_gender':
+        from add_gender_to_staff import enrich_file
+        fieldnames = enrich_file(paths['raw'], paths['gender'])[0]
+        if bom and fieldnames[0] != 'tin':
+            raise RuntimeError(f"byte order mark kept in the header: first column {fieldnames[0]!r}")
+    elif stage == 'prepare':
+        from prepare_staff_list_csv import prepare_staff_list
+        prepare_staff_list(paths['gender'], paths['staff_list'])
+    elif stage == 'prepare_chunked':
+        from prepare_staff_list_csv import prepare_staff_list
+        prepare_staff_list(paths['gender'], paths['staff_list_chunked'], chunksize=PREPARE_CHUNKSIZE)
+    elif stage == 'variants':
+        from build_form_variants import build_form_variants
+        build_form_variants(paths['staff_list'], paths['forms'], force=True)
+    else:
+        raise ValueError(f"unknown stage {stage!r}")
+
+def measure_stage(stage, rows, workdir, bom=False):
+    """Run a stage in a child process; returns its measurements"""
+    result = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--run-stage', stage, '--rows', str(rows),
+         '--workdir', workdir] + (['--bom'] if bom else []),
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    if result.returncode != 0:
+        raise RuntimeError(f"stage {stage} failed:\n{result.stderr.strip() or result.stdout.strip()}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def _child_main(stage, rows, workdir, bom=False):
+    start = time.perf_counter()
+    # The stages report progress on stdout; only the measurements go to the parent
+    with contextlib.redirect_stdout(io.StringIO()):
+        run_stage(stage, rows, workdir, bom=bom)
+    seconds = time.perf_counter() - start
+    print(json.dumps({
+        'stage': stage,
+        'rows': rows,
+        'seconds': seconds,
+        'peak_rss_mb': instrumentation.peak_memory_mb(include_children=True),
+        'rows_per_second': rows / seconds if seconds else 0.0,
+        'spans': instrumentation.current().summary()['spans'],
+    }))
+
+def stages_to_run(stages):
+    """The requested stages plus the ones producing their input, in pipeline order"""
+    needed = set()
+    for stage in stages:
+        while stage and stage not in needed:
+            needed.add(stage)
+            stage = INPUT_STAGE.get(stage)
+    return [stage for stage in STAGES if stage in needed]
+
+def load_baseline(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_baseline(path, baseline, results):
+    """Store results in the baseline file, replacing earlier entries for the same rows/stage"""
+    for r in results:
+        baseline.setdefault(str(r['rows']), {})[r['stage']] = {
+            'rows_per_second': r['rows_per_second'],
+            'peak_rss_mb': r['peak_rss_mb'],
+            'seconds': r['seconds'],
+        }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+
+def regressions(result, baseline, tolerance):
+    """Descriptions of how result is worse than its baseline entry beyond tolerance"""
+    reference = baseline.get(str(result['rows']), {}).get(result['stage'])
+    if not reference:
+        return []
+    problems = []
+    if result['rows_per_second'] < reference['rows_per_second'] * (1 - tolerance):
+        problems.append(f"rows/s {result['rows_per_second']:,.0f} vs {reference['rows_per_second']:,.0f}")
+    if (result['peak_rss_mb'] is not None and reference.get('peak_rss_mb')
+            and result['peak_rss_mb'] > reference['peak_rss_mb'] * (1 + tolerance)):
+        problems.append(f"peak RSS {result['peak_rss_mb']:,.0f} MB vs {reference['peak_rss_mb']:,.0f} MB")
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the staff data pipeline on synthetic staff lists')
+    parser.add_argument('--rows', default='10000,1000000', help='comma-separated row counts (default: 10000,1000000)')
+    parser.add_argument('--stages', default=','.join(STAGES), help="comma-separated stages (default: all)")
+    parser.add_argument('--baseline', help='JSON file of baseline results to compare against')
+    parser.add_argument('--save-baseline', action='store_true', help='store this run in the --baseline file')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed slowdown / memory growth against the baseline (default: 0.25)')
+    parser.add_argument('--bom', action='store_true',
+                        help='generate the staff list with a UTF-8 byte order mark (checks it is handled)')
+    parser.add_argument('--json', help='also write the results to this JSON file')
+    parser.add_argument('--run-stage', help=argparse.SUPPRESS)
+    parser.add_argument('--workdir', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_stage:
+        _child_main(args.run_stage, int(args.rows), args.workdir, args.bom)
+        return 0
+
+    stages = args.stages.split(',')
+    unknown = [stage for stage in stages if stage not in STAGES]
+    if unknown:
+        print(f"✗ Error: unknown stages {unknown}; choose from {STAGES}")
+        return 1
+    if args.save_baseline and not args.baseline:
+        print("✗ Error: --save-baseline needs --baseline FILE")
+        return 1
+
+    baseline = load_baseline(args.baseline) if args.baseline else {}
+    compared = bool(baseline)
+    results = []
+    flagged = 0
+
+    print(f"{'rows':>11} {'stage':<16} {'seconds':>9} {'peak MB':>9} {'rows/s':>12}")
+    for rows in (int(n) for n in args.rows.split(',')):
+        with tempfile.TemporaryDirectory() as workdir:
+            for stage in stages_to_run(stages):
+                r = measure_stage(stage, rows, workdir, args.bom)
+                if stage not in stages:
+                    continue
+                results.append(r)
+                peak = f"{r['peak_rss_mb']:>9,.0f}" if r['peak_rss_mb'] is not None else f"{'-':>9}"
+                line = f"{rows:>11,} {stage:<16} {r['seconds']:>9.2f} {peak} {r['rows_per_second']:>12,.0f}"
+                problems = regressions(r, baseline, args.tolerance)
+                if problems:
+                    flagged += 1
+                    line += "  ✗ regression: " + '; '.join(problems)
+                print(line)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'results': results}, f, indent=2)
+        print(f"\n✓ Results written to {args.json}")
+    if args.save_baseline:
+        save_baseline(args.baseline, baseline, results)
+        print(f"✓ Baseline saved to {args.baseline}")
+
+    if flagged:
+        print(f"\n✗ {flagged} stage(s) regressed by more than {args.tolerance:.0%}")
+        return 1
+    if compared:
+        print(f"\n✓ No regressions beyond {args.tolerance:.0%} of the baseline")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
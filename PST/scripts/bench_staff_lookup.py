@@ -0,0 +1,87 @@
+# bench_staff_lookup.py
+# Benchmark TIN lookups against staff_list.csv layouts, as ODK Collect's pulldata() does them
+#
+# Each form runs five pulldata() calls for the same TIN. Collect imports the attachment
+# into SQLite; columns ending in _key get an index, others are scanned. This compares:
+#   - scan:      unsorted CSV rows, linear search (no index)
+#   - sqlite:    SQLite table without an index on the key (plain 'tin' column)
+#   - indexed:   SQLite table with an index on 'tin_key' (indexed companion)
+#
+# Collect never binary-searches the attachment, so sorting it by TIN does not speed
+# up lookups on devices; only the indexed key column does.
+
+import argparse
+import random
+import sqlite3
+import time
+
+LOOKUP_COLUMNS = ['eeno', 'staff_name', 'gender', 'organisation', 'job']
+
+def make_staff_rows(count, seed=7):
+    rng = random.Random(seed)
+    tins = rng.sample(range(10_000_000, 99_999_999), count)
+    return [
+        {
+            'tin': str(tin),
+            'eeno': str(100000 + i),
+            'staff_name': f'Staff {i}',
+            'gender': rng.choice(['Male', 'Female', 'Unknown']),
+            'organisation': f'Ministry {i % 40}',
+            'job': f'Job {i % 300}',
+        }
+        for i, tin in enumerate(tins)
+    ]
+
+def build_scan(rows):
+    def lookup(tin, column):
+        for row in rows:
+            if row['tin'] == tin:
+                return row[column]
+        return ''
+    return lookup
+
+def build_sqlite(rows, key_column, indexed):
+    db = sqlite3.connect(':memory:')
+    columns = [key_column] + LOOKUP_COLUMNS
+    db.execute(f"CREATE TABLE staff ({', '.join(columns)})")
+    db.executemany(f"INSERT INTO staff VALUES ({', '.join('?' * len(columns))})",
+                   [[row['tin']] + [row[col] for col in LOOKUP_COLUMNS] for row in rows])
+    if indexed:
+        db.execute(f'CREATE INDEX staff_{key_column} ON staff ({key_column})')
+
+    def lookup(tin, column):
+        found = db.execute(f'SELECT {column} FROM staff WHERE {key_column} = ? LIMIT 1', (tin,)).fetchone()
+        return found[0] if found else ''
+    return lookup
+
+def time_forms(lookup, tins):
+    """Average milliseconds per form (one pulldata() call per auto-filled column)"""
+    start = time.perf_counter()
+    for tin in tins:
+        for column in LOOKUP_COLUMNS:
+            lookup(tin, column)
+    return (time.perf_counter() - start) / len(tins) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark staff_list.csv lookup layouts')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 10_000, 100_000])
+    parser.add_argument('--forms', type=int, default=200, help='forms (TIN lookups) timed per layout')
+    args = parser.parse_args()
+
+    print(f"{'Rows':>10} {'scan':>10} {'sqlite':>10} {'indexed':>10}   (ms per form)")
+    print("-" * 51)
+    for size in args.sizes:
+        rows = make_staff_rows(size)
+        rng = random.Random(size)
+        tins = [rng.choice(rows)['tin'] for _ in range(args.forms)]
+
+        layouts = [
+            build_scan(rows),
+            build_sqlite(rows, 'tin', indexed=False),
+            build_sqlite(rows, 'tin_key', indexed=True),
+        ]
+        timings = [time_forms(lookup, tins) for lookup in layouts]
+        print(f"{size:>10,} " + ' '.join(f"{ms:>10.3f}" for ms in timings))
+
+if __name__ == "__main__":
+    main()
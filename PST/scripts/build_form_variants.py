@@ -0,0 +1,212 @@
+"""
+Build one TIN auto-fill form per organisation in the staff list
+
+Reads the prepared staff list (see prepare_staff_list_csv.py) once, groups it by
+organisation, and renders for each organisation, across a process pool:
+
+    <output_dir>/<slug>/employee_details_tin_<slug>.xlsx   the form, with its own form_id
+    <output_dir>/<slug>/staff_list.csv                     only that organisation's staff
+
+and writes <output_dir>/manifest.json listing every form and its attachment in the
+format deploy_forms.py takes:
+
+    python build_form_variants.py ../csv/staff_list.csv ../forms
+    python deploy_forms.py ../forms/manifest.json
+
+Usage:
+    python build_form_variants.py [staff_list.csv] [output_dir] [--workers N] [--version V] [--force]
+
+Variants whose form spec and staff are unchanged are left as they are (see the build
+cache in xlsform_builder.py), so re-running after a small staff list change only
+rewrites the organisations it touched. Each organisation keeps the form_id recorded for
+it in an existing manifest.json, so adding an organisation never renames another
+organisation's form on Central.
+"""
+import argparse
+import csv
+import hashlib
+import io
+import json
+import os
+import re
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import instrumentation
+import staff_data
+from create_autofill_tin_form import STAFF_LIST_NAME, tin_form_spec
+from xlsform_builder import build_xlsform
+
+FORM_ID_PREFIX = 'employee_details_tin_'
+BLANK_ORGANISATION_SLUG = 'no_organisation'
+
+def slugify(name):
+    """Lowercase identifier safe for form IDs and folder names ('Min. of Health' -> 'min_of_health')"""
+    return re.sub(r'[^a-z0-9]+', '_', name.lower()).strip('_')
+
+def group_by_organisation(staff_file):
+    """
+    Read the staff list once. Returns (fieldnames, {organisation: [rows]}), with rows
+    as lists in file order.
+    """
+    groups = {}
+    fieldnames = None
+    for row in staff_data.iter_staff_rows(staff_file):
+        if fieldnames is None:
+            fieldnames = list(row)
+        groups.setdefault(row.get('organisation') or '', []).append([row[name] for name in fieldnames])
+    return fieldnames or [], groups
+
+def read_assigned_slugs(manifest_file):
+    """{organisation: slug} recorded in an earlier manifest.json, or {} if there is none"""
+    try:
+        with open(manifest_file, encoding='utf-8') as f:
+            forms = json.load(f).get('forms', [])
+    except (OSError, ValueError):
+        return {}
+    return {
+        form['organisation']: form['form_id'][len(FORM_ID_PREFIX):]
+        for form in forms
+        if 'organisation' in form and form.get('form_id', '').startswith(FORM_ID_PREFIX)
+    }
+
+def _hashed_slug(base, organisation, length=8):
+    """base plus a suffix that depends only on the organisation's name"""
+    return f"{base}_{hashlib.sha1(organisation.encode('utf-8')).hexdigest()[:length]}"
+
+def assign_slugs(organisations, assigned=None):
+    """
+    Unique slug per organisation. Organisations in assigned ({organisation: slug}, see
+    read_assigned_slugs) keep their slug; the others get their slugified name, with a
+    suffix hashed from the full name when several organisations share it, so the result
+    does not depend on which other organisations exist.
+    """
+    slugs = {}
+    used = set()
+    for organisation in sorted(organisations):
+        slug = (assigned or {}).get(organisation)
+        if slug and slug not in used:
+            slugs[organisation] = slug
+            used.add(slug)
+
+    new = [organisation for organisation in sorted(organisations) if organisation not in slugs]
+    bases = {organisation: slugify(organisation) or BLANK_ORGANISATION_SLUG for organisation in new}
+    shared = {base for base, n in Counter(bases.values()).items() if n > 1}
+    for organisation in new:
+        base = bases[organisation]
+        slug = base if base not in used and base not in shared else _hashed_slug(base, organisation)
+        length = 8
+        while slug in used:
+            length += 4
+            slug = _hashed_slug(base, organisation, length)
+        slugs[organisation] = slug
+        used.add(slug)
+    return slugs
+
+def _write_if_changed(path, content):
+    """Write content to path unless it already holds exactly that; returns True if written"""
+    data = content.encode('utf-8')
+    try:
+        with open(path, 'rb') as f:
+            if f.read() == data:
+                return False
+    except OSError:
+        pass
+    with open(path, 'wb') as f:
+        f.write(data)
+    return True
+
+def build_variant(output_dir, organisation, slug, fieldnames, rows, version=None, force=False):
+    """
+    Write one organisation's attachment CSV and form, skipping files that are already
+    up to date; returns its manifest entry and whether anything was written
+    """
+    variant_dir = os.path.join(output_dir, slug)
+    os.makedirs(variant_dir, exist_ok=True)
+
+    attachment = os.path.join(slug, f'{STAFF_LIST_NAME}.csv')
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fieldnames)
+    writer.writerows(rows)
+    wrote_csv = _write_if_changed(os.path.join(output_dir, attachment), buffer.getvalue())
+
+    form_id = FORM_ID_PREFIX + slug
+    title = f"Employee Details - TIN Auto-fill ({organisation or 'No organisation'})"
+    xlsform = os.path.join(slug, f'{form_id}.xlsx')
+    built = build_xlsform(tin_form_spec(form_id, title, version), os.path.join(output_dir, xlsform), force=force)
+
+    return {
+        'form_id': form_id,
+        'organisation': organisation,
+        'staff': len(rows),
+        'xlsform': xlsform,
+        'attachments': [attachment],
+    }, built or wrote_csv
+
+def build_form_variants(staff_file, output_dir, workers=None, version=None, force=False):
+    """Build all organisation variants; returns (manifest dict written, number of variants rebuilt)"""
+    start = time.perf_counter()
+    with instrumentation.span('read'):
+        fieldnames, groups = group_by_organisation(staff_file)
+    slugs = assign_slugs(groups, read_assigned_slugs(os.path.join(output_dir, 'manifest.json')))
+    instrumentation.count('rows', sum(len(rows) for rows in groups.values()))
+    print(f"✓ Read {sum(len(rows) for rows in groups.values()):,} staff in {len(groups)} organisations "
+          f"({time.perf_counter() - start:.2f}s)")
+
+    os.makedirs(output_dir, exist_ok=True)
+    organisations = sorted(groups)
+    with instrumentation.span('build'):
+        if workers == 1:
+            results = [build_variant(output_dir, org, slugs[org], fieldnames, groups[org], version, force)
+                       for org in organisations]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(build_variant, output_dir, org, slugs[org], fieldnames, groups[org],
+                                       version, force)
+                           for org in organisations]
+                results = [future.result() for future in futures]
+
+    manifest = {'forms': [form for form, _ in results]}
+    with instrumentation.span('write'):
+        _write_if_changed(os.path.join(output_dir, 'manifest.json'), json.dumps(manifest, indent=2))
+    rebuilt = sum(1 for _, changed in results if changed)
+    instrumentation.count('forms', len(results))
+    instrumentation.count('forms_rebuilt', rebuilt)
+    return manifest, rebuilt
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Build one TIN auto-fill form per organisation')
+    parser.add_argument('staff_file', nargs='?', default='../csv/staff_list.csv')
+    parser.add_argument('output_dir', nargs='?', default='../forms')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='processes to build forms in (default: one per CPU)')
+    parser.add_argument('--version', help='form version for every variant (default: from the form settings)')
+    parser.add_argument('--force', action='store_true', help='rebuild every form even if unchanged')
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("TIN Auto-fill Form Variants by Organisation")
+    print("=" * 60)
+    print()
+
+    if not os.path.exists(args.staff_file):
+        print(f"✗ Error: {args.staff_file} not found!")
+        print("Please run 'python prepare_staff_list_csv.py' first.")
+        sys.exit(1)
+
+    with instrumentation.instrumented('build_form_variants', args):
+        start = time.perf_counter()
+        manifest, rebuilt = build_form_variants(args.staff_file, args.output_dir, args.workers, args.version,
+                                                args.force)
+        elapsed = time.perf_counter() - start
+
+        for form in manifest['forms']:
+            print(f"  ✓ {form['form_id']:<50} {form['staff']:>7,} staff")
+        print(f"\n✓ {len(manifest['forms'])} forms ({rebuilt} rebuilt, {len(manifest['forms']) - rebuilt} "
+              f"up to date) in {elapsed:.1f}s")
+        print(f"✓ Deployment manifest: {os.path.join(args.output_dir, 'manifest.json')}")
+        print(f"\nDeploy with: python deploy_forms.py {os.path.join(args.output_dir, 'manifest.json')}")
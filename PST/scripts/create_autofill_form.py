@@ -1,57 +1,37 @@
 """
 Create ODK XLSForm with external CSV data for auto-populating staff information
 """
-import pandas as pd
-from openpyxl import Workbook
-from openpyxl.utils.dataframe import dataframe_to_rows
-
-# Read the form definition
-survey_df = pd.read_csv('employee_odk_form_updated.csv')
-
-# Read choices
-choices_df = pd.read_csv('employee_odk_choices.csv')
-
-# Read settings
-settings_df = pd.read_csv('employee_odk_settings.csv')
-
-# Update settings to reference external data
-settings_df['form_title'] = 'Employee Details with Auto-fill'
-settings_df['version'] = '2026010401'
-
-# Create Excel workbook
-wb = Workbook()
-
-# Remove default sheet
-if 'Sheet' in wb.sheetnames:
-    wb.remove(wb['Sheet'])
-
-# Add survey sheet
-ws_survey = wb.create_sheet('survey')
-for r in dataframe_to_rows(survey_df, index=False, header=True):
-    ws_survey.append(r)
-
-# Add choices sheet
-ws_choices = wb.create_sheet('choices')
-for r in dataframe_to_rows(choices_df, index=False, header=True):
-    ws_choices.append(r)
-
-# Add settings sheet
-ws_settings = wb.create_sheet('settings')
-for r in dataframe_to_rows(settings_df, index=False, header=True):
-    ws_settings.append(r)
-
-# Add external_choices sheet for CSV attachment reference
-ws_external = wb.create_sheet('external_choices')
-ws_external.append(['name'])
-ws_external.append(['staff_list'])
-
-# Save the workbook
-output_file = 'employee_details_odk_form_autofill.xlsx'
-wb.save(output_file)
-
-print(f"✅ Created {output_file}")
-print(f"\n📋 Next steps:")
-print(f"1. Upload '{output_file}' to ODK Central")
-print(f"2. Attach 'staff_list.csv' as a form attachment (media file)")
-print(f"3. The form will auto-populate: staff_name, gender, organisation and job position")
-print(f"4. Staff only need to enter their TIN (eeno)")
+import argparse
+import sys
+
+from xlsform_builder import build_xlsform, report_build, spec_from_csvs
+
+def autofill_form_spec():
+    """Form spec: the updated employee form, with the staff list as external data"""
+    spec = spec_from_csvs('employee_odk_form_updated.csv', 'employee_odk_choices.csv', 'employee_odk_settings.csv')
+
+    # Update settings to reference external data
+    spec['settings'].update({'form_title': 'Employee Details with Auto-fill', 'version': '2026010401'})
+
+    # external_choices sheet for CSV attachment reference
+    spec['external_choices'] = [{'name': 'staff_list'}]
+    return spec
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build the employee XLSForm with staff list auto-fill')
+    parser.add_argument('--force', action='store_true', help='rebuild even if the form is up to date')
+    args = parser.parse_args(argv)
+
+    output_file = 'employee_details_odk_form_autofill.xlsx'
+    built = build_xlsform(autofill_form_spec(), output_file, force=args.force)
+
+    report_build(output_file, built)
+    print(f"\n📋 Next steps:")
+    print(f"1. Upload '{output_file}' to ODK Central")
+    print(f"2. Attach 'staff_list.csv' as a form attachment (media file)")
+    print(f"3. The form will auto-populate: staff_name, gender, organisation and job position")
+    print(f"4. Staff only need to enter their TIN (eeno)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,9 +2,21 @@
 Create ODK XLSForm with CSV lookup based on TIN
 When staff enter their TIN, personal information auto-fills from staff-list-with-gender.csv
 """
-import pandas as pd
-from openpyxl import Workbook
-from openpyxl.utils.dataframe import dataframe_to_rows
+import argparse
+import os
+import sys
+
+import staff_data
+from xlsform_builder import build_xlsform, report_build
+
+# Attachment and key column used by pulldata(). To use the indexed companion written by
+# `prepare_staff_list_csv.py --indexed-companion`, set these to 'staff_list_indexed' and 'tin_key'.
+STAFF_LIST_NAME = 'staff_list'
+LOOKUP_KEY_COLUMN = 'tin'
+
+def lookup(column):
+    """pulldata() expression fetching column for the normalized TIN"""
+    return f"pulldata('{STAFF_LIST_NAME}', '{column}', '{LOOKUP_KEY_COLUMN}', ${{tin_lookup}})"
 
 # Define the survey structure with TIN lookup
 survey_data = [
@@ -16,6 +28,13 @@ survey_data = [
         'required': 'yes',
         'hint': 'Enter your TIN to auto-fill your information'
     },
+    # Same normalization prepare_staff_list_csv.py applies to the attachment:
+    # uppercase, without spaces or dashes
+    {
+        'type': 'calculate',
+        'name': 'tin_lookup',
+        'calculation': "translate(normalize-space(${tin}), 'abcdefghijklmnopqrstuvwxyz -', 'ABCDEFGHIJKLMNOPQRSTUVWXYZ')"
+    },
     
     # Auto-filled fields from CSV using pulldata()
     # Personal Information Group
@@ -24,31 +43,31 @@ survey_data = [
         'type': 'calculate',
         'name': 'eeno',
         'label': 'Employee Number',
-        'calculation': 'pulldata(\'staff_list\', \'eeno\', \'tin\', ${tin})'
+        'calculation': lookup('eeno')
     },
     {
         'type': 'calculate',
         'name': 'full_name',
         'label': 'Full Name',
-        'calculation': 'pulldata(\'staff_list\', \'staff_name\', \'tin\', ${tin})'
+        'calculation': lookup('staff_name')
     },
     {
         'type': 'calculate',
         'name': 'gender',
         'label': 'Gender',
-        'calculation': 'pulldata(\'staff_list\', \'gender\', \'tin\', ${tin})'
+        'calculation': lookup('gender')
     },
     {
         'type': 'calculate',
         'name': 'organisation',
         'label': 'Organisation',
-        'calculation': 'pulldata(\'staff_list\', \'organisation\', \'tin\', ${tin})'
+        'calculation': lookup('organisation')
     },
     {
         'type': 'calculate',
         'name': 'job',
         'label': 'Job Title/Position',
-        'calculation': 'pulldata(\'staff_list\', \'job\', \'tin\', ${tin})'
+        'calculation': lookup('job')
     },
     {'type': 'end_group'},
     
@@ -97,9 +116,6 @@ survey_data = [
     {'type': 'end_group'},
 ]
 
-# Create survey dataframe
-survey_df = pd.DataFrame(survey_data)
-
 # Define choices
 choices_data = [
     {'list_name': 'gender', 'name': 'male', 'label': 'Male'},
@@ -118,59 +134,65 @@ choices_data = [
     {'list_name': 'education_level', 'name': 'doctorate', 'label': 'Doctorate'},
 ]
 
-choices_df = pd.DataFrame(choices_data)
-
 # Define settings
-settings_data = [{
+settings_data = {
     'form_title': 'Employee Details - TIN Auto-fill',
     'form_id': 'employee_details_tin_autofill',
     'version': '2026010401',
     'instance_name': 'concat(${full_name}, " - ", ${tin})'
-}]
-
-settings_df = pd.DataFrame(settings_data)
-
-# Create Excel workbook
-wb = Workbook()
+}
 
-# Remove default sheet
-if 'Sheet' in wb.sheetnames:
-    wb.remove(wb['Sheet'])
+def tin_form_spec(form_id=None, form_title=None, version=None):
+    """
+    Form spec of the TIN auto-fill form (see xlsform_builder.py), optionally with its
+    own form_id, title and version (see build_form_variants.py)
+    """
+    settings = dict(settings_data)
+    overrides = {'form_id': form_id, 'form_title': form_title, 'version': version}
+    settings.update({key: value for key, value in overrides.items() if value})
+    return {
+        'survey': survey_data,
+        'choices': choices_data,
+        'settings': settings,
+        # external_choices sheet - this tells ODK to look for staff_list.csv as attachment
+        'external_choices': [{'list_name': STAFF_LIST_NAME}],
+    }
 
-# Add survey sheet
-ws_survey = wb.create_sheet('survey')
-for r in dataframe_to_rows(survey_df, index=False, header=True):
-    ws_survey.append(r)
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build the TIN auto-fill XLSForm')
+    parser.add_argument('--force', action='store_true', help='rebuild even if the form is up to date')
+    args = parser.parse_args(argv)
 
-# Add choices sheet
-ws_choices = wb.create_sheet('choices')
-for r in dataframe_to_rows(choices_df, index=False, header=True):
-    ws_choices.append(r)
+    output_file = '../csv/employee_details_odk_form.xlsx'
+    built = build_xlsform(tin_form_spec(), output_file, force=args.force)
 
-# Add settings sheet
-ws_settings = wb.create_sheet('settings')
-for r in dataframe_to_rows(settings_df, index=False, header=True):
-    ws_settings.append(r)
+    report_build(output_file, built)
+    print("\nIMPORTANT: You need to attach 'staff_list.csv' as a media file when uploading to ODK Central")
+    print("\nThe CSV file should have these columns:")
+    print("- tin (for lookup)")
+    print("- eeno (employee number)")
+    print("- staff_name (full name)")
+    print("- gender")
+    print("- organisation")
+    print("- job")
 
-# Add external_choices sheet - this tells ODK to look for staff_list.csv as attachment
-ws_external = wb.create_sheet('external_choices')
-ws_external.append(['list_name'])
-ws_external.append(['staff_list'])
+    # Report on the attachment if it has been prepared already; the record count is only
+    # shown when the shared staff cache is fresh, so building a form never hashes or
+    # converts the whole staff list
+    staff_list_file = '../csv/staff_list.csv'
+    if os.path.exists(staff_list_file):
+        if staff_data.cache_is_fresh(staff_list_file):
+            print(f"\n✓ Found {staff_list_file} with {staff_data.count_staff_rows(staff_list_file):,} staff records")
+        else:
+            print(f"\n✓ Found {staff_list_file}")
+    print("\nNext steps:")
+    print("1. Create 'staff_list.csv' with: python prepare_staff_list_csv.py staff-list-with-gender.csv")
+    print("   (it normalizes TINs the way the form looks them up; a renamed raw file will not match)")
+    print("2. Upload the form to ODK Central")
+    print("3. Attach 'staff_list.csv' as a media file to the form")
+    print("\nOr run every step at once: python run_pipeline.py <raw staff CSV>")
+    return 0
 
-# Save the workbook
-output_file = '../csv/employee_details_odk_form.xlsx'
-wb.save(output_file)
 
-print(f"✓ Created {output_file}")
-print("\nIMPORTANT: You need to attach 'staff_list.csv' as a media file when uploading to ODK Central")
-print("\nThe CSV file should have these columns:")
-print("- tin (for lookup)")
-print("- eeno (employee number)")
-print("- staff_name (full name)")
-print("- gender")
-print("- organisation")
-print("- job")
-print("\nNext steps:")
-print("1. Rename 'staff-list-with-gender.csv' to 'staff_list.csv'")
-print("2. Upload the form to ODK Central")
-print("3. Attach 'staff_list.csv' as a media file to the form")
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,15 @@
 # create_odk_project.py
 # Script to create a new project on ODK Central
 
-import requests
-from upload_config import ODK_CONFIG
+import argparse
+import sys
 
 def create_project(project_name):
     """Create a new project on ODK Central"""
+    # Imported here so `--help` doesn't pay for requests and the config
+    import requests
+    from odk_central import ODKCentralClient, ODKCentralError
+    from upload_config import ODK_CONFIG
     
     print("=" * 60)
     print("ODK Central - Create New Project")
@@ -13,44 +17,28 @@ def create_project(project_name):
     print()
     
     server_url = ODK_CONFIG['server_url'].rstrip('/')
-    email = ODK_CONFIG['email']
-    password = ODK_CONFIG['password']
     
     print(f"Server: {server_url}")
     print(f"Project Name: {project_name}")
     print()
     
+    client = ODKCentralClient.from_config(ODK_CONFIG)
     try:
-        # Step 1: Authenticate
+        # Step 1: Authenticate (reuses a cached session token when still valid)
         print("[1/2] Authenticating...")
-        auth_url = f"{server_url}/v1/sessions"
-        auth_data = {
-            "email": email,
-            "password": password
-        }
-        
-        auth_response = requests.post(auth_url, json=auth_data, timeout=10)
-        
-        if auth_response.status_code != 200:
-            print(f"✗ Authentication failed: {auth_response.status_code}")
-            print(f"Response: {auth_response.text}")
+        try:
+            client.authenticate()
+        except ODKCentralError as e:
+            print(f"✗ {e}")
+            if e.response is not None:
+                print(f"Response: {e.response.text}")
             return False
         
-        token = auth_response.json()['token']
-        headers = {
-            'Authorization': f'Bearer {token}',
-            'Content-Type': 'application/json'
-        }
         print("✓ Authentication successful")
         
         # Step 2: Create project
         print(f"\n[2/2] Creating project '{project_name}'...")
-        project_url = f"{server_url}/v1/projects"
-        project_data = {
-            "name": project_name
-        }
-        
-        project_response = requests.post(project_url, json=project_data, headers=headers, timeout=10)
+        project_response = client.create_project(project_name)
         
         if project_response.status_code not in [200, 201]:
             print(f"✗ Failed to create project: {project_response.status_code}")
@@ -83,7 +71,14 @@ def create_project(project_name):
         import traceback
         traceback.print_exc()
         return False
+    finally:
+        client.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Create a new project on ODK Central')
+    parser.add_argument('project_name', nargs='?', default='Test', help='name of the project (default: Test)')
+    args = parser.parse_args(argv)
+    return 0 if create_project(args.project_name) else 1
 
 if __name__ == "__main__":
-    project_name = "Test"
-    create_project(project_name)
+    sys.exit(main())
@@ -1,13 +1,27 @@
-import openpyxl
+# delete_instance_name_column.py
+# Remove the instance_name column from the settings sheet of an XLSForm workbook
+#
+# Usage:
+#     python delete_instance_name_column.py [workbook.xlsx]
 
-# Load the workbook
-workbook_path = r'c:\Users\Rohey\Test\PST\csv\Employee_Details_ODK_Form.xlsx'
-wb = openpyxl.load_workbook(workbook_path)
+import argparse
+import sys
 
-# Access the settings sheet
-if 'settings' in wb.sheetnames:
+DEFAULT_WORKBOOK = '../csv/Employee_Details_ODK_Form.xlsx'
+
+def delete_instance_name_column(workbook_path):
+    """Delete the instance_name column from the settings sheet; returns True if it was removed"""
+    import openpyxl
+
+    # Load the workbook
+    wb = openpyxl.load_workbook(workbook_path)
+
+    # Access the settings sheet
+    if 'settings' not in wb.sheetnames:
+        print("'settings' sheet not found in the workbook")
+        return False
     ws = wb['settings']
-    
+
     # Find the instance_name column
     instance_name_col = None
     for col in range(1, ws.max_column + 1):
@@ -15,16 +29,26 @@ if 'settings' in wb.sheetnames:
         if cell_value == 'instance_name':
             instance_name_col = col
             break
-    
-    if instance_name_col:
-        # Delete the column
-        ws.delete_cols(instance_name_col)
-        print(f"Deleted 'instance_name' column from position {instance_name_col}")
-        
-        # Save the workbook
-        wb.save(workbook_path)
-        print(f"Successfully saved {workbook_path}")
-    else:
+
+    if not instance_name_col:
         print("'instance_name' column not found in the settings sheet")
-else:
-    print("'settings' sheet not found in the workbook")
+        return False
+
+    # Delete the column
+    ws.delete_cols(instance_name_col)
+    print(f"Deleted 'instance_name' column from position {instance_name_col}")
+
+    # Save the workbook
+    wb.save(workbook_path)
+    print(f"Successfully saved {workbook_path}")
+    return True
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Remove the instance_name column from an XLSForm settings sheet')
+    parser.add_argument('workbook', nargs='?', default=DEFAULT_WORKBOOK,
+                        help=f'XLSForm workbook to edit (default: {DEFAULT_WORKBOOK})')
+    args = parser.parse_args(argv)
+    return 0 if delete_instance_name_column(args.workbook) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
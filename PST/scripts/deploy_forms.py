@@ -0,0 +1,233 @@
+"""
+Deploy many XLSForms (with their media attachments) to ODK Central concurrently
+
+Reads a JSON manifest listing the forms to deploy:
+
+    {
+        "project_id": 3,
+        "forms": [
+            {
+                "form_id": "employee_details_moh",
+                "xlsform": "forms/employee_details_moh.xlsx",
+                "attachments": ["forms/moh/staff_list.csv"],
+                "publish": true
+            }
+        ]
+    }
+
+Each form has:
+
+    form_id      the form's ID on Central (must match form_id in the XLSForm settings)
+    xlsform      the XLSForm workbook
+    attachments  media files uploaded with it (optional)
+    publish      publish the uploaded draft (optional, default true); false leaves
+                 it as a draft to try out on a device before publishing it in Central
+
+Paths are relative to the manifest. "project_id" defaults to the one in upload_config.py.
+Attachments that already match the server's copy (by MD5) are not uploaded again;
+with --gzip, the others are sent gzip-compressed if the server accepts that.
+
+Forms whose definition and attachments are unchanged since this machine last
+published them are skipped; changed forms are published with a new version.
+
+Each form is checked, uploaded (new form or new draft), given its attachments and
+published (unless "publish" is false). The steps of one form run in order, but forms run side by side, with
+at most --concurrency requests in flight at once.
+
+Usage:
+    python deploy_forms.py <manifest.json> [--concurrency N] [--gzip]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+import instrumentation
+from odk_central import ODKCentralClient, ODKCentralError, form_content_hash, next_version
+
+DEFAULT_CONCURRENCY = 8
+
+def load_manifest(manifest_file):
+    """Read a deployment manifest, resolving file paths relative to it"""
+    with open(manifest_file, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+
+    base_dir = os.path.dirname(os.path.abspath(manifest_file))
+    for spec in manifest.get('forms', []):
+        spec['xlsform'] = os.path.join(base_dir, spec['xlsform'])
+        spec['attachments'] = [os.path.join(base_dir, path) for path in spec.get('attachments', [])]
+    return manifest
+
+class Deployer:
+    """Runs the Central calls of many form deployments with bounded concurrency"""
+
+    def __init__(self, client, project_id, concurrency=DEFAULT_CONCURRENCY, compress=False):
+        self.client = client
+        self.project_id = project_id
+        self.compress = compress
+        self.semaphore = asyncio.Semaphore(concurrency)
+
+    async def call(self, func, *args, **kwargs):
+        """Run one blocking client call in a worker thread once a slot is free"""
+        async with self.semaphore:
+            return await asyncio.to_thread(func, *args, **kwargs)
+
+    async def deploy_form(self, spec):
+        """
+        Deploy one form. Returns a result dict with the form_id, whether it succeeded,
+        the steps taken, the time taken and any error message.
+        """
+        form_id = spec['form_id']
+        result = {'form_id': form_id, 'ok': False, 'steps': [], 'error': None}
+        start = time.perf_counter()
+        try:
+            # One GET tells whether the form exists (404 if not) and what is published
+            published = await self.call(self.client.published_form, self.project_id, form_id)
+            exists = published is not None
+            content_hash = await asyncio.to_thread(form_content_hash, spec['xlsform'], spec['attachments'])
+            if exists:
+                # Skip forms whose content is what was last published: no new version for devices
+                if await self.call(self.client.is_unchanged, self.project_id, form_id, content_hash, published):
+                    result['steps'].append(f"unchanged (version {published.get('version')})")
+                    result['ok'] = True
+                    return self._finish(result, start)
+
+            response = await self.call(self.client.upload_form, self.project_id, form_id,
+                                       spec['xlsform'], as_draft=exists)
+            if response.status_code not in [200, 201]:
+                raise ODKCentralError(f"upload failed: {response.status_code} {response.text}", response)
+            result['steps'].append('new draft' if exists else 'created')
+
+            # Attachments of the same form can go up in parallel; unchanged ones are skipped
+            server_hashes = {}
+            if spec['attachments']:
+                server_hashes = await self.call(self.client.attachment_hashes, self.project_id, form_id)
+            outcomes = await asyncio.gather(*[
+                self.call(self.client.sync_attachment, self.project_id, form_id, path,
+                          server_hashes=server_hashes, compress=self.compress)
+                for path in spec['attachments']
+            ])
+            for path, (outcome, response) in zip(spec['attachments'], outcomes):
+                if outcome == 'uploaded' and response.status_code not in [200, 201]:
+                    raise ODKCentralError(
+                        f"attachment {os.path.basename(path)} failed: {response.status_code} {response.text}",
+                        response)
+            uploaded = sum(1 for outcome, _ in outcomes if outcome == 'uploaded')
+            if outcomes:
+                result['steps'].append(f"{uploaded} attachment(s) uploaded, {len(outcomes) - uploaded} unchanged")
+
+            if spec.get('publish', True):
+                version = next_version(published.get('version')) if published else None
+                response = await self.call(self.client.publish_draft, self.project_id, form_id, version)
+                if response.status_code != 200:
+                    raise ODKCentralError(f"publish failed: {response.status_code} {response.text}", response)
+                await self.call(self.client.record_publish, self.project_id, form_id, content_hash)
+                result['steps'].append(f"published as {version}" if version else 'published')
+
+            result['ok'] = True
+        except Exception as e:
+            result['error'] = str(e)
+        return self._finish(result, start)
+
+    def _finish(self, result, start):
+        result['seconds'] = time.perf_counter() - start
+
+        status = '✓' if result['ok'] else '✗'
+        detail = ', '.join(result['steps']) if result['ok'] else result['error']
+        print(f"  {status} {result['form_id']:<40} {result['seconds']:6.2f}s  {detail}")
+        return result
+
+    async def deploy_all(self, specs):
+        return await asyncio.gather(*[self.deploy_form(spec) for spec in specs])
+
+async def deploy(client, project_id, specs, concurrency=DEFAULT_CONCURRENCY, compress=False):
+    """Deploy all form specs; returns their results in manifest order"""
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=concurrency))
+    # Log in once up front rather than from every concurrent request
+    await asyncio.to_thread(client.authenticate)
+    return await Deployer(client, project_id, concurrency, compress).deploy_all(specs)
+
+def deploy_forms(manifest_file, concurrency=DEFAULT_CONCURRENCY, compress=False):
+    print("=" * 60)
+    print("ODK Central Bulk Form Deployment")
+    print("=" * 60)
+    print()
+
+    from upload_config import ODK_CONFIG
+
+    manifest = load_manifest(manifest_file)
+    project_id = manifest.get('project_id', ODK_CONFIG['project_id'])
+    specs = manifest.get('forms', [])
+
+    missing = [path for spec in specs for path in [spec['xlsform']] + spec['attachments']
+               if not os.path.exists(path)]
+    if missing:
+        print("✗ Error: Missing files:")
+        for path in missing:
+            print(f"  - {path}")
+        return False
+
+    print(f"Server: {ODK_CONFIG['server_url']}")
+    print(f"Project ID: {project_id}")
+    print(f"Forms: {len(specs)} (concurrency {concurrency})")
+    print()
+
+    start = time.perf_counter()
+    with ODKCentralClient.from_config(ODK_CONFIG, pool_size=concurrency) as client:
+        try:
+            results = asyncio.run(deploy(client, project_id, specs, concurrency, compress))
+        except ODKCentralError as e:
+            print(f"✗ {e}")
+            return False
+        except requests.exceptions.Timeout:
+            print(f"✗ Error: Request still timing out after {client.max_retries} retries")
+            print("The server may be slow or unreachable")
+            return False
+        except requests.exceptions.RequestException as e:
+            print(f"✗ Error: Cannot connect to {ODK_CONFIG['server_url']}: {e}")
+            print("Please check your internet connection and server URL")
+            return False
+        metrics = client.metrics.format_summary()
+    elapsed = time.perf_counter() - start
+
+    succeeded = [r for r in results if r['ok']]
+    failed = [r for r in results if not r['ok']]
+    instrumentation.count('forms_deployed', len(succeeded))
+    instrumentation.count('forms_failed', len(failed))
+    print("\n" + "=" * 60)
+    print(f"Deployed {len(succeeded)}/{len(results)} forms in {elapsed:.1f}s")
+    if results:
+        serial_time = sum(r['seconds'] for r in results)
+        print(f"Sum of per-form times: {serial_time:.1f}s ({serial_time / elapsed:.1f}x speed-up)")
+    print(f"Requests: {metrics}")
+    if failed:
+        print("\n✗ Failed forms:")
+        for r in failed:
+            print(f"  - {r['form_id']}: {r['error']}")
+    return not failed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Deploy many forms to ODK Central concurrently',
+        epilog='Each form in the manifest has "form_id", "xlsform", optional "attachments" (list of paths) '
+               'and optional "publish" (default true; false leaves the upload as a draft).')
+    parser.add_argument('manifest', help='JSON manifest of the forms to deploy')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                        help=f'maximum requests in flight (default: {DEFAULT_CONCURRENCY})')
+    parser.add_argument('--gzip', action='store_true',
+                        help='gzip attachment uploads when the server accepts it')
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    with instrumentation.instrumented('deploy_forms', args):
+        ok = deploy_forms(args.manifest, args.concurrency, args.gzip)
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
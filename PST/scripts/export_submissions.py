@@ -0,0 +1,268 @@
+"""
+Export the submissions of a form from ODK Central to a CSV file
+
+Downloads the submissions through Central's CSV ZIP export (default) or its OData
+feed and writes them with one column per question of employee_odk_form.csv, in form
+order, between the submission date and the instance ID:
+
+    submission_date, full_name, date_of_birth, gender, ..., years_of_experience, instance_id
+
+With --tin-form the columns (and the default --form-id) are those of the TIN auto-fill
+form built by create_autofill_tin_form.py instead, starting with its tin question;
+that is the export warehouse.py can reconcile against the staff list.
+
+Memory use stays flat however many submissions there are: the ZIP is streamed to
+disk and its CSV decompressed and parsed row by row, and OData pages are fetched a
+few at a time in parallel ($top/$skip) and written out in order as they arrive.
+
+Usage:
+    python export_submissions.py [output.csv] [--form-id ID] [--format csv|odata]
+                                 [--page-size N] [--workers N] [--form-csv PATH | --tin-form]
+"""
+import argparse
+import csv
+import io
+import os
+import sys
+import tempfile
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import instrumentation
+from odk_central import ODKCentralClient, ODKCentralError
+
+DEFAULT_FORM_ID = 'employee_details_v1'
+DEFAULT_FORM_CSV = '../csv/employee_odk_form.csv'
+DOWNLOAD_BLOCK_SIZE = 1024 * 1024
+PAGE_SIZE = 1000
+WORKERS = 4
+# Form rows that don't hold an answer
+STRUCTURE_TYPES = {'begin_group', 'end_group', 'begin_repeat', 'end_repeat', 'note'}
+
+def _columns(survey_rows):
+    questions = [row['name'] for row in survey_rows
+                 if row.get('name') and row['type'].split(' ')[0] not in STRUCTURE_TYPES]
+    return ['submission_date'] + questions + ['instance_id']
+
+def form_columns(form_csv=DEFAULT_FORM_CSV):
+    """Output columns: submission date, the form's question names in order, instance ID"""
+    with open(form_csv, 'r', encoding='utf-8', newline='') as f:
+        return _columns(csv.DictReader(f))
+
+def tin_form():
+    """(form_id, output columns) of the TIN auto-fill form of create_autofill_tin_form.py"""
+    from create_autofill_tin_form import tin_form_spec
+    spec = tin_form_spec()
+    return spec['settings']['form_id'], _columns(spec['survey'])
+
+def central_time(moment):
+    """moment as Central writes timestamps (UTC, milliseconds), so they compare as strings"""
+    return moment.astimezone(timezone.utc).isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+
+def snapshot_time(client, project_id):
+    """
+    The server's current time, from the Date header of a small request (whole seconds,
+    rounded down), so a local clock ahead of Central can't put the snapshot after
+    submissions the server hasn't handed out yet. Falls back to the local clock only
+    if the server sends no Date.
+    """
+    response = client.get(f'projects/{project_id}')
+    date = response.headers.get('Date')
+    return central_time(parsedate_to_datetime(date) if date else datetime.now(timezone.utc))
+
+def _open_output(output_file):
+    """Temp file next to output_file; os.replace() it into place once complete"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(output_file)), suffix='.csv')
+    # mkstemp creates files as 0600; use the permissions open() would have given
+    umask = os.umask(0)
+    os.umask(umask)
+    os.chmod(tmp_path, 0o666 & ~umask)
+    return os.fdopen(fd, 'w', encoding='utf-8', newline=''), tmp_path
+
+# CSV ZIP export
+
+def download_csv_zip(client, project_id, form_id, zip_path):
+    """Stream the form's submissions.csv.zip to zip_path; returns the bytes written"""
+    response = client.get(f'projects/{project_id}/forms/{form_id}/submissions.csv.zip',
+                          params={'attachments': 'false', 'groupPaths': 'false'}, stream=True)
+    try:
+        if response.status_code != 200:
+            raise ODKCentralError(f"Export failed: {response.status_code} {response.text}", response)
+        written = 0
+        with open(zip_path, 'wb') as f:
+            for block in response.iter_content(DOWNLOAD_BLOCK_SIZE):
+                f.write(block)
+                written += len(block)
+        return written
+    finally:
+        response.close()
+
+def iter_csv_zip_rows(zip_path, form_id):
+    """Yield the submissions in a CSV ZIP export as dicts keyed by question name"""
+    with zipfile.ZipFile(zip_path) as archive:
+        # The main table is <form_id>.csv; repeat groups come as separate files
+        name = next((n for n in archive.namelist() if n == f'{form_id}.csv'), archive.namelist()[0])
+        with archive.open(name) as member:
+            reader = csv.reader(io.TextIOWrapper(member, encoding='utf-8-sig', newline=''))
+            # groupPaths=false: headers are already bare question names, which may contain '-'
+            header = next(reader, [])
+            for values in reader:
+                row = dict(zip(header, values))
+                row['submission_date'] = row.get('SubmissionDate', '')
+                row['instance_id'] = row.get('instanceID') or row.get('KEY', '')
+                yield row
+
+def export_csv_zip(client, project_id, form_id, writer):
+    """Export through the CSV ZIP endpoint; returns the number of submissions written"""
+    fd, zip_path = tempfile.mkstemp(suffix='.zip')
+    os.close(fd)
+    try:
+        size = download_csv_zip(client, project_id, form_id, zip_path)
+        print(f"✓ Downloaded {size / 1024 / 1024:.1f} MB")
+        count = 0
+        for row in iter_csv_zip_rows(zip_path, form_id):
+            writer.writerow(row)
+            count += 1
+        return count
+    finally:
+        os.remove(zip_path)
+
+# OData export
+
+def flatten_submission(submission, row=None):
+    """Flatten an OData submission (answers nested by group) into {question name: value}"""
+    row = {} if row is None else row
+    for key, value in submission.items():
+        if isinstance(value, dict):
+            flatten_submission(value, row)
+        elif not key.startswith('@'):
+            row[key] = '' if value is None else value
+    return row
+
+def _odata_row(submission):
+    row = flatten_submission(submission)
+    system = submission.get('__system', {})
+    row['submission_date'] = system.get('submissionDate', '')
+    row['updated_at'] = system.get('updatedAt') or ''
+    row['instance_id'] = submission.get('__id', '')
+    return row
+
+def fetch_odata_page(client, project_id, form_id, skip, top, snapshot_filter):
+    response = client.get(f'projects/{project_id}/forms/{form_id}.svc/Submissions',
+                          params={'$skip': skip, '$top': top, '$filter': snapshot_filter})
+    if response.status_code != 200:
+        raise ODKCentralError(f"OData page at {skip} failed: {response.status_code} {response.text}", response)
+    return response.json()['value']
+
+def export_odata(client, project_id, form_id, writer, page_size=PAGE_SIZE, workers=WORKERS, odata_filter=None,
+                 snapshot=None):
+    """
+    Export through the OData feed, fetching up to `workers` pages at once. Submissions
+    received after snapshot (default: the server's current time) are left out; submissionDate never changes,
+    so none can drop out of the pages under $skip while they are fetched. odata_filter
+    optionally restricts the export (see sync_submissions.py); it may let submissions
+    in during the export, which at worst repeats one on the next page, but must not
+    let any out, which would shift a later one past its page unseen.
+    Returns the number of submissions written.
+    """
+    snapshot = snapshot or snapshot_time(client, project_id)
+    snapshot_filter = f'__system/submissionDate le {snapshot}'
+    if odata_filter:
+        snapshot_filter = f'({odata_filter}) and {snapshot_filter}'
+    response = client.get(f'projects/{project_id}/forms/{form_id}.svc/Submissions',
+                          params={'$top': 0, '$count': 'true', '$filter': snapshot_filter})
+    if response.status_code != 200:
+        raise ODKCentralError(f"OData count failed: {response.status_code} {response.text}", response)
+    total = response.json().get('@odata.count', 0)
+    print(f"Submissions: {total:,} ({(total + page_size - 1) // page_size} pages of {page_size})")
+
+    count = 0
+    skips = iter(range(0, total, page_size))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # Keep only `workers` pages in flight, writing them in order as they complete
+        pending = deque()
+        for skip in skips:
+            pending.append(executor.submit(fetch_odata_page, client, project_id, form_id,
+                                           skip, page_size, snapshot_filter))
+            if len(pending) >= workers:
+                break
+        while pending:
+            page = pending.popleft().result()
+            next_skip = next(skips, None)
+            if next_skip is not None:
+                pending.append(executor.submit(fetch_odata_page, client, project_id, form_id,
+                                               next_skip, page_size, snapshot_filter))
+            for submission in page:
+                writer.writerow(_odata_row(submission))
+            count += len(page)
+    return count
+
+def export_submissions(output_file, form_id=DEFAULT_FORM_ID, export_format='csv', page_size=PAGE_SIZE,
+                       workers=WORKERS, form_csv=DEFAULT_FORM_CSV, columns=None):
+    print("=" * 60)
+    print("ODK Central Submission Export")
+    print("=" * 60)
+    print()
+
+    from upload_config import ODK_CONFIG
+
+    project_id = ODK_CONFIG['project_id']
+    columns = columns or form_columns(form_csv)
+    print(f"Server: {ODK_CONFIG['server_url']}")
+    print(f"Form: {form_id} (project {project_id}), {len(columns) - 2} questions")
+    print(f"Export: {export_format} -> {output_file}")
+    print()
+
+    start = time.perf_counter()
+    f_out, tmp_path = _open_output(output_file)
+    try:
+        with f_out, ODKCentralClient.from_config(ODK_CONFIG, pool_size=max(workers, 1)) as client:
+            writer = csv.DictWriter(f_out, fieldnames=columns, extrasaction='ignore')
+            writer.writeheader()
+            if export_format == 'odata':
+                count = export_odata(client, project_id, form_id, writer, page_size, workers)
+            else:
+                count = export_csv_zip(client, project_id, form_id, writer)
+            metrics = client.metrics.format_summary()
+        os.replace(tmp_path, output_file)
+    except (ODKCentralError, OSError, zipfile.BadZipFile) as e:
+        os.remove(tmp_path)
+        print(f"✗ {e}")
+        return False
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+    elapsed = time.perf_counter() - start
+    instrumentation.count('submissions', count)
+    instrumentation.count('bytes_written', os.path.getsize(output_file))
+    print(f"✓ Exported {count:,} submissions to {output_file} in {elapsed:.1f}s")
+    print(f"Requests: {metrics}")
+    return True
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Export form submissions from ODK Central')
+    parser.add_argument('output_file', nargs='?', default='../csv/employee_submissions.csv')
+    parser.add_argument('--form-id', help=f'form to export (default: {DEFAULT_FORM_ID}, '
+                                          'or the TIN auto-fill form with --tin-form)')
+    parser.add_argument('--format', dest='export_format', choices=['csv', 'odata'], default='csv',
+                        help='csv: one streamed ZIP download; odata: parallel JSON pages (default: csv)')
+    parser.add_argument('--page-size', type=int, default=PAGE_SIZE, help='OData page size')
+    parser.add_argument('--workers', type=int, default=WORKERS, help='OData pages fetched at once')
+    form = parser.add_mutually_exclusive_group()
+    form.add_argument('--form-csv', default=DEFAULT_FORM_CSV,
+                      help='form definition giving the column layout')
+    form.add_argument('--tin-form', action='store_true',
+                      help='export the TIN auto-fill form (create_autofill_tin_form.py), with its tin column')
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+
+    form_id, columns = tin_form() if args.tin_form else (DEFAULT_FORM_ID, None)
+    with instrumentation.instrumented('export_submissions', args):
+        ok = export_submissions(args.output_file, args.form_id or form_id, args.export_format, args.page_size,
+                                args.workers, args.form_csv, columns)
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,327 @@
+"""
+Local stand-in for the ODK Central API, for testing and benchmarking the upload clients
+
+Implements the endpoints odk_central.py uses, keeping everything in memory:
+
+    POST /v1/sessions                                          log in (any email/password)
+    GET|POST /v1/projects                                      list / create projects
+    GET|POST /v1/projects/{p}/forms                            list / create forms (xlsx body)
+    GET /v1/projects/{p}/forms/{f}                             published form (version, hash)
+    GET|POST /v1/projects/{p}/forms/{f}/draft                  draft details / upload new draft
+    POST /v1/projects/{p}/forms/{f}/draft/attachments/{name}   attach a file (gzip accepted)
+    POST /v1/projects/{p}/forms/{f}/draft/publish[?version=]   publish the draft
+    GET /v1/test/{token}/projects/{p}/forms/{f}/draft/manifest OpenRosa manifest with MD5s
+
+Flaky networks can be simulated: every request waits --latency seconds (plus up to
+--jitter), a --error-rate fraction is answered 500/503, and requests beyond
+--rate-limit per second get 429 with a Retry-After header.
+
+Usage:
+    python fake_central.py [--port 8383] [--latency S] [--jitter S] [--error-rate F] [--rate-limit N]
+
+Then point upload_config.py at http://127.0.0.1:8383, or in Python:
+
+    server = FakeCentral(latency=0.02).start()
+    client = ODKCentralClient(server.url, 'me@example.org', 'secret')
+
+bench_odk_clients.py drives the client this way rather than through the upload scripts.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import random
+import re
+import secrets
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+MANIFEST_NS = 'http://openrosa.org/xforms/xformsManifest'
+TOKEN_LIFETIME = timedelta(hours=24)
+
+class FakeCentral:
+    """In-memory ODK Central with configurable latency, errors and throttling"""
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, jitter=0.0, error_rate=0.0, rate_limit=None,
+                 seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.tokens = set()
+        self.projects = {}
+        self.forms = {}
+        self.request_counts = {}
+        self._window = [0, 0]  # (second, requests in it) for the rate limit
+        self.httpd = ThreadingHTTPServer((host, port), _make_handler(self))
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """Serve in a background thread; returns self"""
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    # Fault injection
+
+    def fault(self):
+        """(status, headers) of an injected failure for this request, or None"""
+        with self.lock:
+            if self.rate_limit:
+                second = int(time.monotonic())
+                if self._window[0] != second:
+                    self._window = [second, 0]
+                self._window[1] += 1
+                if self._window[1] > self.rate_limit:
+                    return 429, {'Retry-After': '1'}
+            if self.error_rate and self.random.random() < self.error_rate:
+                return self.random.choice([500, 503]), {}
+        return None
+
+    def delay(self):
+        with self.lock:
+            extra = self.random.uniform(0, self.jitter) if self.jitter else 0
+        if self.latency or extra:
+            time.sleep(self.latency + extra)
+
+    def count(self, method, route):
+        with self.lock:
+            key = f"{method} {route}"
+            self.request_counts[key] = self.request_counts.get(key, 0) + 1
+
+    # Central behaviour
+
+    def login(self):
+        token = secrets.token_urlsafe(16)
+        with self.lock:
+            self.tokens.add(token)
+        expires = datetime.now(timezone.utc) + TOKEN_LIFETIME
+        return {'token': token, 'expiresAt': expires.isoformat().replace('+00:00', 'Z')}
+
+    def create_project(self, name):
+        with self.lock:
+            project_id = len(self.projects) + 1
+            self.projects[project_id] = {'id': project_id, 'name': name}
+            return self.projects[project_id]
+
+    def form(self, project_id, form_id):
+        return self.forms.get((project_id, form_id))
+
+    def set_draft(self, project_id, form_id, xlsx):
+        with self.lock:
+            form = self.forms.setdefault((project_id, form_id), {
+                'xmlFormId': form_id, 'projectId': project_id,
+                'version': None, 'hash': None, 'publishedAt': None, 'attachments': {}, 'draft': None,
+            })
+            # A new draft starts out with the published version's attachments
+            form['draft'] = {
+                'token': secrets.token_urlsafe(16),
+                'hash': hashlib.md5(xlsx).hexdigest(),
+                'attachments': dict(form['attachments']),
+            }
+            return form
+
+    def publish(self, project_id, form_id, version):
+        with self.lock:
+            form = self.forms.get((project_id, form_id))
+            if not form or not form['draft']:
+                return 404, {'message': 'No draft to publish'}
+            version = version or datetime.now().strftime('%Y%m%d%H%M%S%f')
+            if version == form['version']:
+                return 409, {'message': f'Version {version} already exists'}
+            draft, form['draft'] = form['draft'], None
+            form.update(version=version, hash=draft['hash'], attachments=draft['attachments'],
+                        publishedAt=datetime.now(timezone.utc).isoformat())
+            return 200, {'success': True}
+
+    def draft_by_token(self, token):
+        for form in self.forms.values():
+            if form['draft'] and form['draft']['token'] == token:
+                return form
+        return None
+
+def _public(form):
+    return {key: value for key, value in form.items() if key not in ('draft', 'attachments')}
+
+ROUTES = [
+    ('POST', r'/v1/sessions', 'sessions'),
+    ('GET', r'/v1/projects', 'list_projects'),
+    ('POST', r'/v1/projects', 'create_project'),
+    ('GET', r'/v1/projects/(\d+)/forms', 'list_forms'),
+    ('POST', r'/v1/projects/(\d+)/forms', 'create_form'),
+    ('GET', r'/v1/projects/(\d+)/forms/([^/]+)', 'get_form'),
+    ('GET', r'/v1/projects/(\d+)/forms/([^/]+)/draft', 'get_draft'),
+    ('POST', r'/v1/projects/(\d+)/forms/([^/]+)/draft', 'upload_draft'),
+    ('POST', r'/v1/projects/(\d+)/forms/([^/]+)/draft/attachments/([^/]+)', 'upload_attachment'),
+    ('POST', r'/v1/projects/(\d+)/forms/([^/]+)/draft/publish', 'publish'),
+    ('GET', r'/v1/test/([^/]+)/projects/(\d+)/forms/([^/]+)/draft/manifest', 'manifest'),
+]
+
+def _make_handler(central):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        # Send each response in one write; split header/body writes stall on delayed ACKs
+        wbufsize = -1
+        disable_nagle_algorithm = True
+
+        def log_message(self, *args):
+            pass
+
+        def send(self, status, body=None, headers=None, content_type='application/json'):
+            data = body if isinstance(body, bytes) else json.dumps(body if body is not None else {}).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(data)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def read_body(self):
+            if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+                chunks = []
+                while True:
+                    size = int(self.rfile.readline().split(b';')[0].strip(), 16)
+                    if size == 0:
+                        self.rfile.readline()
+                        break
+                    chunks.append(self.rfile.read(size))
+                    self.rfile.readline()
+                body = b''.join(chunks)
+            else:
+                body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+            if self.headers.get('Content-Encoding', '').lower() == 'gzip':
+                body = gzip.decompress(body)
+            return body
+
+        def handle_request(self):
+            url = urlparse(self.path)
+            body = self.read_body() if self.command == 'POST' else b''
+            for method, pattern, name in ROUTES:
+                match = re.fullmatch(pattern, url.path)
+                if method == self.command and match:
+                    break
+            else:
+                return self.send(404, {'message': 'Not found'})
+
+            central.count(self.command, name)
+            central.delay()
+            injected = central.fault()
+            if injected:
+                return self.send(injected[0], {'message': 'Injected failure'}, injected[1])
+
+            if name not in ('sessions', 'manifest'):
+                auth = self.headers.get('Authorization', '')
+                if not auth.startswith('Bearer ') or auth[len('Bearer '):] not in central.tokens:
+                    return self.send(401, {'message': 'Could not authenticate'})
+            getattr(self, 'route_' + name)(*match.groups(), body=body, query=parse_qs(url.query))
+
+        do_GET = do_POST = handle_request
+
+        # Routes
+
+        def route_sessions(self, body, query):
+            self.send(200, central.login())
+
+        def route_list_projects(self, body, query):
+            self.send(200, list(central.projects.values()))
+
+        def route_create_project(self, body, query):
+            name = json.loads(body or b'{}').get('name')
+            if not name:
+                return self.send(400, {'message': 'name is required'})
+            self.send(200, central.create_project(name))
+
+        def route_list_forms(self, project_id, body, query):
+            forms = [_public(f) for (p, _), f in central.forms.items() if p == int(project_id)]
+            self.send(200, forms)
+
+        def route_create_form(self, project_id, body, query):
+            form_id = self.headers.get('X-XlsForm-FormId-Fallback')
+            if not form_id:
+                return self.send(400, {'message': 'form ID required'})
+            if central.form(int(project_id), form_id):
+                return self.send(409, {'message': f'Form {form_id} already exists'})
+            form = central.set_draft(int(project_id), form_id, body)
+            if query.get('publish') == ['true']:
+                central.publish(int(project_id), form_id, None)
+            self.send(200, _public(form))
+
+        def route_get_form(self, project_id, form_id, body, query):
+            form = central.form(int(project_id), form_id)
+            if not form:
+                return self.send(404, {'message': 'Form not found'})
+            self.send(200, _public(form))
+
+        def route_get_draft(self, project_id, form_id, body, query):
+            form = central.form(int(project_id), form_id)
+            if not form or not form['draft']:
+                return self.send(404, {'message': 'No draft'})
+            self.send(200, dict(_public(form), draftToken=form['draft']['token']))
+
+        def route_upload_draft(self, project_id, form_id, body, query):
+            if not central.form(int(project_id), form_id):
+                return self.send(404, {'message': 'Form not found'})
+            self.send(200, _public(central.set_draft(int(project_id), form_id, body)))
+
+        def route_upload_attachment(self, project_id, form_id, name, body, query):
+            form = central.form(int(project_id), form_id)
+            if not form or not form['draft']:
+                return self.send(404, {'message': 'No draft'})
+            with central.lock:
+                form['draft']['attachments'][name] = hashlib.md5(body).hexdigest()
+            self.send(200, {'success': True})
+
+        def route_publish(self, project_id, form_id, body, query):
+            status, result = central.publish(int(project_id), form_id, query.get('version', [None])[0])
+            self.send(status, result)
+
+        def route_manifest(self, token, project_id, form_id, body, query):
+            form = central.draft_by_token(token)
+            if not form:
+                return self.send(404, {'message': 'Not found'})
+            files = ''.join(
+                f"<mediaFile><filename>{name}</filename><hash>md5:{md5}</hash></mediaFile>"
+                for name, md5 in form['draft']['attachments'].items())
+            xml = f'<?xml version="1.0"?><manifest xmlns="{MANIFEST_NS}">{files}</manifest>'
+            self.send(200, xml.encode(), content_type='text/xml')
+
+    return Handler
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Run a local fake ODK Central server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8383)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every request')
+    parser.add_argument('--jitter', type=float, default=0.0, help='up to this many extra random seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests answered 500/503')
+    parser.add_argument('--rate-limit', type=int, help='requests per second before answering 429')
+    args = parser.parse_args()
+
+    central = FakeCentral(args.host, args.port, args.latency, args.jitter, args.error_rate, args.rate_limit)
+    print(f"✓ Fake ODK Central listening on {central.url} (Ctrl+C to stop)")
+    try:
+        central.httpd.serve_forever()
+    except KeyboardInterrupt:
+        print("\nStopped")
@@ -0,0 +1,172 @@
+# generate_staff_list.py
+# Generate a realistic synthetic staff list CSV for testing and benchmarking
+#
+# Writes the columns the pipeline expects (tin, eeno, staff_name, gender, organisation,
+# job). Given names are drawn from the MALE_NAMES/FEMALE_NAMES sets the gender
+# classifier uses and a few common ones it does not know, followed by Gambian
+# surnames. Like a real export, the file has some problems: some TINs are missing,
+# repeated (half of --duplicate-rate lists an earlier person again, row for row; the
+# other half types an earlier TIN against someone else) or written with spaces,
+# dashes or lowercase letters (--messy-tin-rate). The same --seed always gives the
+# same file.
+#
+# Usage:
+#     python generate_staff_list.py <output.csv> [--rows N] [--seed S]
+#                                   [--missing-tin-rate F] [--duplicate-rate F]
+#                                   [--messy-tin-rate F] [--bom]
+
+import argparse
+import csv
+import random
+import sys
+import time
+
+from add_gender_to_staff import FEMALE_NAMES, MALE_NAMES
+
+SURNAMES = [
+    'jallow', 'ceesay', 'touray', 'bah', 'sowe', 'njie', 'darboe', 'bojang', 'jammeh', 'sanneh',
+    'drammeh', 'manneh', 'camara', 'jobe', 'sarr', 'jeng', 'jaw', 'mendy', 'sanyang', 'fofana',
+    'kujabi', 'colley', 'badjie', 'saidy', 'joof', 'faal', 'secka', 'marong', 'conteh', 'gassama',
+]
+
+# Given names outside MALE_NAMES/FEMALE_NAMES, which the classifier can't place
+OTHER_MALE_NAMES = ['modou', 'sulayman', 'yusupha', 'alieu', 'musa', 'pa']
+OTHER_FEMALE_NAMES = ['ida', 'ramatoulie', 'sirra', 'oumie', 'haddy', 'jainaba']
+UNKNOWN_NAME_RATE = 0.05
+# Share of the duplicates that repeat an earlier row exactly (the rest only reuse its TIN)
+REPEATED_ROW_SHARE = 0.5
+RECENT_ROWS = 10_000
+
+ORGANISATIONS = [
+    'Ministry of Basic and Secondary Education', 'Ministry of Health', 'Ministry of Interior',
+    'Ministry of Agriculture', 'Ministry of Finance and Economic Affairs', 'Ministry of Justice',
+    'Ministry of Foreign Affairs', 'Ministry of Lands and Regional Government',
+    'Ministry of Works, Transport and Infrastructure', 'Ministry of Higher Education',
+    'Ministry of Trade, Industry and Employment', 'Ministry of Tourism and Culture',
+    'Ministry of Fisheries and Water Resources', 'Ministry of Youth and Sports',
+    'Ministry of Environment, Climate Change and Natural Resources', 'Ministry of Information',
+    'Ministry of Gender, Children and Social Welfare', 'Ministry of Petroleum and Energy',
+    'Personnel Management Office', 'Office of the President', 'National Assembly', 'Judiciary',
+    'Gambia Revenue Authority', 'Accountant General\'s Department', 'Public Service Commission',
+]
+
+JOBS = [
+    'Teacher', 'Senior Teacher', 'Head Teacher', 'Nurse', 'Senior Nursing Officer', 'Midwife',
+    'Medical Officer', 'Pharmacist', 'Laboratory Technician', 'Clerk', 'Senior Clerk',
+    'Accountant', 'Assistant Accountant', 'Auditor', 'Administrative Officer', 'Driver',
+    'Messenger', 'Security Officer', 'Police Constable', 'Immigration Officer', 'Agricultural Officer',
+    'Extension Worker', 'Engineer', 'Technician', 'Economist', 'Statistician', 'Secretary',
+    'Records Officer', 'ICT Officer', 'Director', 'Deputy Director', 'Permanent Secretary',
+]
+
+def _weights(count):
+    """Zipf-like weights: a few large organisations/jobs, a long tail of small ones"""
+    return [1 / (rank + 1) for rank in range(count)]
+
+def _messy_tin(rng, tin):
+    """A TIN as someone might have typed it; prepare_staff_list_csv.py normalizes these"""
+    style = rng.randrange(3)
+    if style == 0:
+        return f"{tin[:4]}-{tin[4:]}"
+    if style == 1:
+        return f" {tin[:4]} {tin[4:]} "
+    return f"g{tin}" if rng.random() < 0.5 else f"G{tin}"
+
+def iter_staff_rows(rows, seed=42, missing_tin_rate=0.02, duplicate_rate=0.03, messy_tin_rate=0.01):
+    """Yield rows as lists in column order; reproducible for a given seed"""
+    rng = random.Random(seed)
+    male_names = sorted(MALE_NAMES - FEMALE_NAMES)
+    female_names = sorted(FEMALE_NAMES - MALE_NAMES)
+    organisation_weights = _weights(len(ORGANISATIONS))
+    job_weights = _weights(len(JOBS))
+    recent_rows = []
+
+    for i in range(rows):
+        roll = rng.random()
+        if missing_tin_rate <= roll < missing_tin_rate + duplicate_rate and recent_rows \
+                and rng.random() < REPEATED_ROW_SHARE:
+            # The same person listed twice
+            yield list(rng.choice(recent_rows))
+            continue
+
+        gender = 'Male' if rng.random() < 0.55 else 'Female'
+        if rng.random() < UNKNOWN_NAME_RATE:
+            given = rng.choice(OTHER_MALE_NAMES if gender == 'Male' else OTHER_FEMALE_NAMES)
+        else:
+            given = rng.choice(male_names if gender == 'Male' else female_names)
+        parts = [given]
+        if rng.random() < 0.3:
+            parts.append(rng.choice(male_names if gender == 'Male' else female_names))
+        parts.append(rng.choice(SURNAMES))
+        name = ' '.join(parts)
+        name = name.upper() if rng.random() < 0.2 else name.title()
+
+        new_tin = False
+        if roll < missing_tin_rate:
+            tin = ''
+        elif roll < missing_tin_rate + duplicate_rate and recent_rows:
+            # An earlier TIN typed against someone else
+            tin = rng.choice(recent_rows)[0]
+        else:
+            tin = str(rng.randrange(10_000_000, 100_000_000))
+            new_tin = True
+            if rng.random() < messy_tin_rate:
+                tin = _messy_tin(rng, tin)
+
+        row = [
+            tin,
+            str(100000 + i),
+            name,
+            gender,
+            rng.choices(ORGANISATIONS, organisation_weights)[0],
+            rng.choices(JOBS, job_weights)[0],
+        ]
+        if new_tin:
+            if len(recent_rows) < RECENT_ROWS:
+                recent_rows.append(row)
+            else:
+                recent_rows[rng.randrange(len(recent_rows))] = row
+        yield row
+
+def generate_staff_list(output_file, rows, seed=42, missing_tin_rate=0.02, duplicate_rate=0.03, bom=False,
+                        messy_tin_rate=0.01):
+    """Write a synthetic staff list of rows rows to output_file, after a byte order mark with bom"""
+    with open(output_file, 'w', encoding='utf-8-sig' if bom else 'utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['tin', 'eeno', 'staff_name', 'gender', 'organisation', 'job'])
+        batch = []
+        for row in iter_staff_rows(rows, seed, missing_tin_rate, duplicate_rate, messy_tin_rate):
+            batch.append(row)
+            if len(batch) >= 10_000:
+                writer.writerows(batch)
+                batch = []
+        writer.writerows(batch)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Generate a synthetic staff list CSV')
+    parser.add_argument('output_file')
+    parser.add_argument('--rows', type=int, default=10_000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--missing-tin-rate', type=float, default=0.02,
+                        help='fraction of rows without a TIN (default: 0.02)')
+    parser.add_argument('--duplicate-rate', type=float, default=0.03,
+                        help='fraction of rows repeating an earlier row or its TIN (default: 0.03)')
+    parser.add_argument('--messy-tin-rate', type=float, default=0.01,
+                        help='fraction of new TINs written with spaces, dashes or a lowercase letter (default: 0.01)')
+    parser.add_argument('--bom', action='store_true',
+                        help='start the file with a UTF-8 byte order mark, as Excel does')
+    args = parser.parse_args()
+
+    if args.missing_tin_rate + args.duplicate_rate > 1:
+        print("✗ Error: --missing-tin-rate and --duplicate-rate add up to more than 1")
+        sys.exit(1)
+    if not 0 <= args.messy_tin_rate <= 1:
+        print("✗ Error: --messy-tin-rate must be between 0 and 1")
+        sys.exit(1)
+
+    start = time.perf_counter()
+    generate_staff_list(args.output_file, args.rows, args.seed, args.missing_tin_rate, args.duplicate_rate,
+                        args.bom, args.messy_tin_rate)
+    elapsed = time.perf_counter() - start
+    print(f"✓ Wrote {args.rows:,} staff to {args.output_file} in {elapsed:.1f}s "
+          f"({args.rows / elapsed:,.0f} rows/s)")
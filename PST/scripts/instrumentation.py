@@ -0,0 +1,215 @@
+# instrumentation.py
+# Shared timing spans, counters, peak memory and profiling for the pipeline scripts
+#
+# Code marks out where its time goes with named spans and counts what it processed:
+#
+#     from instrumentation import count, span
+#
+#     with span('read'):
+#         rows = read_rows(...)
+#     count('rows', len(rows))
+#
+# Spans with the same name add up (seconds and calls), so a span around each chunk
+# gives the total for the stage. Spans entered from several threads add up too, so
+# their seconds can exceed the wall time. Outside an instrumented run span() and
+# count() still record into a default run, which costs next to nothing.
+#
+# A script's entry point wraps its work in instrumented(), which adds the run's
+# summary to the output and, depending on the options add_arguments() provides:
+#
+#     --profile [cprofile|pyinstrument]   profile the run; the top functions are printed,
+#                                         or saved with --profile-output FILE (cProfile
+#                                         only sees the main thread)
+#     --metrics-json FILE                 append the run's metrics to FILE as one JSON
+#                                         line (default: $PST_METRICS_JSON), e.g. for
+#                                         charting stage durations across scheduled runs
+
+import contextlib
+import io
+import json
+import os
+import socket
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+METRICS_ENV_VAR = 'PST_METRICS_JSON'
+PROFILE_TOP = 25
+
+def peak_memory_mb(include_children=False):
+    """
+    Peak resident memory of this process in MB (or of any finished child process,
+    if larger, with include_children), or None where it can't be measured
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if include_children:
+        peak = max(peak, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+class Instrumentation:
+    """Timing spans and counters of one run of a script"""
+
+    def __init__(self, name):
+        self.name = name
+        self.started_at = datetime.now(timezone.utc)
+        self._start = time.perf_counter()
+        self.spans = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def span(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            with self._lock:
+                totals = self.spans.setdefault(name, {'seconds': 0.0, 'calls': 0})
+                totals['seconds'] += seconds
+                totals['calls'] += 1
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def summary(self):
+        with self._lock:
+            spans = {name: {'seconds': round(totals['seconds'], 4), 'calls': totals['calls']}
+                     for name, totals in self.spans.items()}
+            counters = dict(self.counters)
+        return {
+            'script': self.name,
+            'started_at': self.started_at.isoformat(),
+            'host': socket.gethostname(),
+            'seconds': round(time.perf_counter() - self._start, 4),
+            'spans': spans,
+            'counters': counters,
+            'peak_rss_mb': peak_memory_mb(include_children=True),
+        }
+
+    def format_summary(self):
+        s = self.summary()
+        parts = [f"{s['seconds']:.2f}s total"]
+        parts += [f"{name} {totals['seconds']:.2f}s" for name, totals in s['spans'].items()]
+        parts += [f"{name} {value:,}" for name, value in s['counters'].items()]
+        if s['peak_rss_mb'] is not None:
+            parts.append(f"peak memory {s['peak_rss_mb']:,.0f} MB")
+        return ', '.join(parts)
+
+    def write_json(self, path):
+        """Append the summary to path as one JSON line"""
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(self.summary()) + '\n')
+
+_current = Instrumentation(os.path.basename(sys.argv[0]) or 'python')
+
+def current():
+    """The Instrumentation of the run in progress"""
+    return _current
+
+def span(name):
+    """Time a block under name in the current run"""
+    return _current.span(name)
+
+def count(name, amount=1):
+    """Add amount to the counter name of the current run"""
+    _current.count(name, amount)
+
+def add_arguments(parser):
+    """Add --profile, --profile-output and --metrics-json to an argparse parser"""
+    group = parser.add_argument_group('instrumentation')
+    group.add_argument('--profile', nargs='?', const='cprofile', choices=['cprofile', 'pyinstrument'],
+                       help='profile the run with cProfile (default) or pyinstrument')
+    group.add_argument('--profile-output',
+                       help='save the profile to this file (.prof for cProfile, .html for pyinstrument)')
+    group.add_argument('--metrics-json', default=os.environ.get(METRICS_ENV_VAR),
+                       help=f'append the run metrics to this JSON lines file (default: ${METRICS_ENV_VAR})')
+    return parser
+
+class _Profiler:
+    """cProfile or pyinstrument behind one start/stop/report interface"""
+
+    def __init__(self, kind):
+        self.kind = kind
+        if kind == 'pyinstrument':
+            try:
+                from pyinstrument import Profiler
+            except ImportError:
+                print("⚠ pyinstrument is not installed (pip install pyinstrument); using cProfile")
+                self.kind = 'cprofile'
+            else:
+                self.profiler = Profiler()
+        if self.kind == 'cprofile':
+            import cProfile
+            self.profiler = cProfile.Profile()
+
+    def start(self):
+        if self.kind == 'cprofile':
+            self.profiler.enable()
+        else:
+            self.profiler.start()
+
+    def stop(self):
+        if self.kind == 'cprofile':
+            self.profiler.disable()
+        else:
+            self.profiler.stop()
+
+    def report(self, output_file=None):
+        if self.kind == 'cprofile':
+            if output_file:
+                self.profiler.dump_stats(output_file)
+                return
+            import pstats
+            stream = io.StringIO()
+            pstats.Stats(self.profiler, stream=stream).sort_stats('cumulative').print_stats(PROFILE_TOP)
+            print(stream.getvalue())
+        elif output_file:
+            with open(output_file, 'w', encoding='utf-8') as f:
+                f.write(self.profiler.output_html())
+        else:
+            print(self.profiler.output_text(unicode=True))
+
+@contextlib.contextmanager
+def instrumented(name, args=None):
+    """
+    Run a script's work as an instrumented run named name. args is the argparse
+    namespace holding the add_arguments() options, if the script has them.
+    Yields the Instrumentation.
+    """
+    global _current
+    previous, _current = _current, Instrumentation(name)
+    run = _current
+    profile = getattr(args, 'profile', None)
+    profile_output = getattr(args, 'profile_output', None)
+    metrics_json = getattr(args, 'metrics_json', None) if args is not None else os.environ.get(METRICS_ENV_VAR)
+
+    profiler = _Profiler(profile) if profile else None
+    if profiler:
+        profiler.start()
+    try:
+        yield run
+    finally:
+        if profiler:
+            profiler.stop()
+            print(f"\nProfile ({profiler.kind}):")
+            profiler.report(profile_output)
+            if profile_output:
+                print(f"✓ Profile saved to {profile_output}")
+        print(f"\n⏱ {run.format_summary()}")
+        if metrics_json:
+            try:
+                run.write_json(metrics_json)
+            except OSError as e:
+                print(f"⚠ Could not write metrics to {metrics_json}: {e}")
+        _current = previous
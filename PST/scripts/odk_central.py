@@ -0,0 +1,657 @@
+# odk_central.py
+# Shared ODK Central API client used by the upload and project scripts
+#
+# One pooled requests.Session is reused for every call, so the TCP/TLS connection is
+# kept alive between requests. The bearer token from /v1/sessions is kept in memory and
+# reused until it expires; it is refreshed automatically when it expires or the server
+# answers 401. With 'cache_token': True in upload_config.py it is also saved to a
+# private file in the user's home folder, so later runs can skip the login.
+#
+# Publishing can be skipped when nothing changed: form_content_hash() hashes the form
+# definition (cell values, not the XLSX bytes, which change on every save) and its
+# attachments, and the client remembers which hash it last published for each form.
+#
+# Every call goes through one transport (_send) built for flaky connections: separate
+# connect/read timeouts, retries with jittered exponential backoff on connection errors
+# and 429/5xx answers (POSTs that are not safe to repeat are only retried when the
+# request provably never reached the server), and a circuit breaker that fails fast
+# while the server is down. Latency and retry counts are kept in client.metrics.
+
+import json
+import mimetypes
+import os
+import hashlib
+import random
+import re
+import tempfile
+import threading
+import time
+import zlib
+from datetime import datetime
+from urllib.parse import urlparse
+from xml.etree import ElementTree
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+import instrumentation
+
+# Read timeout (seconds without data from the server) and connect timeout per attempt
+DEFAULT_TIMEOUT = 30
+CONNECT_TIMEOUT = 5
+AUTH_TIMEOUT = 10
+
+# Retries after the first attempt, and the backoff between them: a random delay of up
+# to BACKOFF_BASE * 2^n seconds (capped at BACKOFF_MAX), or the server's Retry-After
+MAX_RETRIES = 4
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# 429/503 mean the server did not process the request, so any method may be retried
+NOT_PROCESSED_STATUSES = {429, 503}
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'}
+# Network errors worth retrying; ChunkedEncodingError is a connection dropped mid-body
+RETRY_EXCEPTIONS = (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                    requests.exceptions.ChunkedEncodingError)
+
+# Open the circuit after this many consecutive failures, and try again after this long
+CIRCUIT_FAILURE_THRESHOLD = 5
+CIRCUIT_RESET_TIMEOUT = 30
+# Refresh tokens this many seconds before Central says they expire
+TOKEN_EXPIRY_MARGIN = 60
+# Only used when asked for (token_cache_file / 'cache_token' in the config)
+TOKEN_CACHE_FILE = os.path.join(os.path.expanduser('~'), '.odk_central_tokens.json')
+POOL_SIZE = 10
+PUBLISH_RECORD_FILE = os.path.join(os.path.expanduser('~'), '.odk_central_published.json')
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+MANIFEST_NS = 'http://openrosa.org/xforms/xformsManifest'
+UPLOAD_BLOCK_SIZE = 1024 * 1024
+
+def file_md5(path):
+    """MD5 hex digest of a file, the hash Central reports for form attachments"""
+    digest = hashlib.md5()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(UPLOAD_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def form_content_hash(xlsform_file, attachments=()):
+    """
+    SHA-256 of an XLSForm's definition plus its attachments. Only cell values are
+    hashed, so re-saving or regenerating an identical form gives the same hash; the
+    settings version is ignored since it is bumped on publish.
+    """
+    from openpyxl import load_workbook
+
+    digest = hashlib.sha256()
+    workbook = load_workbook(xlsform_file, read_only=True, data_only=True)
+    try:
+        for sheet in workbook.worksheets:
+            rows = sheet.iter_rows(values_only=True)
+            header = next(rows, ())
+            skip = {i for i, name in enumerate(header) if sheet.title == 'settings' and name == 'version'}
+            digest.update(json.dumps(['sheet', sheet.title, header], default=str).encode())
+            for row in rows:
+                values = [value for i, value in enumerate(row) if i not in skip]
+                # Trailing blank cells depend on how the file was edited, not on the form
+                while values and values[-1] in (None, ''):
+                    values.pop()
+                if values:
+                    digest.update(json.dumps(values, default=str).encode())
+    finally:
+        workbook.close()
+
+    for path in sorted(attachments, key=os.path.basename):
+        digest.update(f"attachment {os.path.basename(path)} {file_md5(path)}".encode())
+    return digest.hexdigest()
+
+def next_version(current):
+    """
+    Next form version in the YYYYMMDDNN scheme used by the form scripts: today's
+    date with a counter that goes up when publishing again on the same day.
+    """
+    today = datetime.now().strftime('%Y%m%d')
+    current = str(current or '')
+    if current.startswith(today) and current[len(today):].isdigit():
+        return f"{today}{int(current[len(today):]) + 1:02d}"
+    return f"{today}01"
+
+class _GzipFileStream:
+    """
+    Request body that gzips a file block by block as it is sent. Iterating again
+    starts over from the beginning, so the request can be resent.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def __iter__(self):
+        compressor = zlib.compressobj(wbits=31)  # gzip container
+        with open(self.path, 'rb') as f:
+            for block in iter(lambda: f.read(UPLOAD_BLOCK_SIZE), b''):
+                chunk = compressor.compress(block)
+                if chunk:
+                    yield chunk
+        yield compressor.flush()
+
+class ODKCentralError(Exception):
+    """Raised when ODK Central rejects a request the client can't recover from"""
+
+    def __init__(self, message, response=None):
+        super().__init__(message)
+        self.response = response
+        self.status_code = response.status_code if response is not None else None
+
+class CircuitOpenError(ODKCentralError):
+    """Raised without contacting the server while the circuit breaker is open"""
+
+class CircuitBreaker:
+    """
+    Stops sending requests to a server that keeps failing. After failure_threshold
+    consecutive failures the circuit opens and calls fail fast; after reset_timeout
+    seconds one trial request is let through, and its outcome closes the circuit
+    again or re-opens it.
+    """
+
+    def __init__(self, failure_threshold=CIRCUIT_FAILURE_THRESHOLD, reset_timeout=CIRCUIT_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        return 'half-open' if self._trial_running else 'open'
+
+    def allow(self):
+        """True if a request may be sent now"""
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if not self._trial_running and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial_running or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                self._trial_running = False
+
+class RequestMetrics:
+    """
+    Latency and retry statistics of a client's requests. With metrics_file set, each
+    request is also appended to it as one JSON line.
+    """
+
+    def __init__(self, metrics_file=None):
+        self.metrics_file = metrics_file
+        self.records = []
+        self._lock = threading.Lock()
+
+    def record(self, method, path, status, seconds, attempts, error=None):
+        entry = {
+            'time': time.time(),
+            'method': method,
+            'path': path,
+            'status': status,
+            'seconds': round(seconds, 4),
+            'attempts': attempts,
+            'error': error,
+        }
+        with self._lock:
+            self.records.append(entry)
+            if self.metrics_file:
+                with open(self.metrics_file, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(entry) + '\n')
+
+    def summary(self):
+        """Totals and latency percentiles (in seconds) over all recorded requests"""
+        with self._lock:
+            records = list(self.records)
+        latencies = sorted(r['seconds'] for r in records)
+
+        def percentile(q):
+            return latencies[min(len(latencies) - 1, int(q * len(latencies)))] if latencies else 0.0
+
+        return {
+            'requests': len(records),
+            'retries': sum(r['attempts'] - 1 for r in records),
+            'failed': sum(1 for r in records if r['error'] or (r['status'] or 0) >= 500),
+            'p50_seconds': percentile(0.5),
+            'p95_seconds': percentile(0.95),
+            'p99_seconds': percentile(0.99),
+            'max_seconds': latencies[-1] if latencies else 0.0,
+        }
+
+    def format_summary(self):
+        s = self.summary()
+        return (f"{s['requests']} requests, {s['retries']} retries, {s['failed']} failed; "
+                f"latency p50 {s['p50_seconds']:.2f}s, p95 {s['p95_seconds']:.2f}s, max {s['max_seconds']:.2f}s")
+
+def _never_sent(exc):
+    """True if a requests exception means the request never reached the server"""
+    if isinstance(exc, requests.exceptions.ConnectTimeout):
+        return True
+    reason = getattr(exc.args[0], 'reason', None) if exc.args else None
+    return isinstance(reason, NewConnectionError)
+
+def _retry_after(response):
+    """Seconds from a numeric Retry-After header, or None"""
+    try:
+        return max(0.0, float(response.headers.get('Retry-After', '')))
+    except ValueError:
+        return None
+
+def _parse_expiry(expires_at):
+    """Convert Central's expiresAt timestamp to epoch seconds (0 if missing/unparseable)"""
+    try:
+        return datetime.fromisoformat(expires_at.replace('Z', '+00:00')).timestamp()
+    except (AttributeError, ValueError):
+        return 0
+
+class ODKCentralClient:
+    """Authenticated, connection-pooled client for one ODK Central server and account"""
+
+    def __init__(self, server_url, email, password, timeout=DEFAULT_TIMEOUT,
+                 token_cache_file=None, verify=True, pool_size=POOL_SIZE,
+                 publish_record_file=PUBLISH_RECORD_FILE, max_retries=MAX_RETRIES, metrics_file=None):
+        self.server_url = server_url.rstrip('/')
+        self.email = email
+        self.password = password
+        self.timeout = timeout
+        self.token_cache_file = token_cache_file
+        self.verify = verify
+        self._token = None
+        self._token_expiry = 0
+        # Concurrent callers (see deploy_forms.py) share one login
+        self._auth_lock = threading.Lock()
+        # Whether the server accepts gzip-encoded uploads; None until tried
+        self.gzip_uploads = None
+        self.publish_record_file = publish_record_file
+        self._record_lock = threading.Lock()
+        self.max_retries = max_retries
+        self.breaker = CircuitBreaker()
+        self.metrics = RequestMetrics(metrics_file)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    @classmethod
+    def from_config(cls, config, **kwargs):
+        """
+        Build a client from an ODK_CONFIG dict (see upload_config.py). The optional
+        keys 'timeout', 'max_retries' and 'metrics_file' are passed on as well, and
+        'cache_token': True saves the bearer token to TOKEN_CACHE_FILE between runs.
+        """
+        for key in ('timeout', 'max_retries', 'metrics_file'):
+            if key in config:
+                kwargs.setdefault(key, config[key])
+        if config.get('cache_token'):
+            kwargs.setdefault('token_cache_file', TOKEN_CACHE_FILE)
+        return cls(config['server_url'], config['email'], config['password'], **kwargs)
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def url(self, path):
+        return f"{self.server_url}/v1/{path.lstrip('/')}"
+
+    # Token handling
+
+    def _cache_key(self):
+        return f"{self.server_url}|{self.email}"
+
+    def _load_cached_token(self):
+        if not self.token_cache_file:
+            return
+        try:
+            with open(self.token_cache_file, 'r', encoding='utf-8') as f:
+                entry = json.load(f).get(self._cache_key())
+        except (OSError, ValueError):
+            return
+        if entry and entry.get('expires', 0) - TOKEN_EXPIRY_MARGIN > time.time():
+            self._token = entry['token']
+            self._token_expiry = entry['expires']
+
+    def _save_cached_token(self):
+        if not self.token_cache_file:
+            return
+        try:
+            with open(self.token_cache_file, 'r', encoding='utf-8') as f:
+                tokens = json.load(f)
+        except (OSError, ValueError):
+            tokens = {}
+        now = time.time()
+        tokens = {key: entry for key, entry in tokens.items() if entry.get('expires', 0) > now}
+        tokens[self._cache_key()] = {'token': self._token, 'expires': self._token_expiry}
+        try:
+            _write_json(self.token_cache_file, tokens)
+        except OSError:
+            pass
+
+    def _forget_token(self):
+        self._token = None
+        self._token_expiry = 0
+
+    def authenticate(self, force=False, rejected=None):
+        """
+        Return a valid bearer token, reusing the cached one unless it is about to
+        expire (or force is set). rejected is a token the server answered 401 to:
+        it is replaced by a new login, unless another thread has done so already.
+        Raises ODKCentralError if the login is rejected.
+        """
+        with self._auth_lock:
+            if rejected is not None and self._token is not None and self._token != rejected:
+                return self._token
+            return self._authenticate(force or rejected is not None)
+
+    def _authenticate(self, force):
+        if not force:
+            if self._token is None:
+                self._load_cached_token()
+            if self._token and self._token_expiry - TOKEN_EXPIRY_MARGIN > time.time():
+                return self._token
+
+        # Logging in again is harmless, so the login may be retried like a GET
+        with instrumentation.span('authenticate'):
+            response = self._send(
+                'POST', self.url('sessions'), idempotent=True,
+                json={'email': self.email, 'password': self.password},
+                timeout=(CONNECT_TIMEOUT, min(self.timeout, AUTH_TIMEOUT)),
+            )
+        if response.status_code != 200:
+            self._forget_token()
+            raise ODKCentralError(f"Authentication failed: {response.status_code}", response)
+
+        session_info = response.json()
+        self._token = session_info['token']
+        self._token_expiry = _parse_expiry(session_info.get('expiresAt')) or time.time() + 3600
+        self._save_cached_token()
+        return self._token
+
+    # Requests
+
+    def _backoff(self, attempt):
+        return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+    def _send(self, method, url, idempotent=None, **kwargs):
+        """
+        Send one request with timeouts, retries and the circuit breaker, and record
+        its metrics. idempotent says whether the request is safe to repeat once it may
+        have reached the server (default: by method). Returns the final Response, or
+        raises the last requests exception or CircuitOpenError.
+        """
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        kwargs.setdefault('timeout', (CONNECT_TIMEOUT, self.timeout))
+        kwargs.setdefault('verify', self.verify)
+        # Draft test URLs carry a token; keep it out of the metrics
+        path = re.sub(r'/test/[^/]+/', '/test/{token}/', urlparse(url).path)
+
+        start = time.perf_counter()
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                self.metrics.record(method, path, None, time.perf_counter() - start, attempt, 'circuit open')
+                raise CircuitOpenError(f"Circuit open: {self.server_url} keeps failing, not sending {method} {path}")
+            attempt += 1
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except RETRY_EXCEPTIONS as e:
+                self.breaker.record_failure()
+                retryable = not isinstance(e, requests.exceptions.SSLError) and (idempotent or _never_sent(e))
+                if not retryable or attempt > self.max_retries:
+                    self.metrics.record(method, path, None, time.perf_counter() - start, attempt, type(e).__name__)
+                    raise
+                delay = self._backoff(attempt)
+            except Exception as e:
+                # Anything else (TooManyRedirects, an upload that can't be read) still
+                # counts as a failure, which also ends a half-open trial; otherwise the
+                # breaker would wait for the trial's outcome forever
+                self.breaker.record_failure()
+                self.metrics.record(method, path, None, time.perf_counter() - start, attempt, type(e).__name__)
+                raise
+            else:
+                if response.status_code >= 500:
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+                retryable = response.status_code in RETRY_STATUSES and (
+                    idempotent or response.status_code in NOT_PROCESSED_STATUSES)
+                if not retryable or attempt > self.max_retries:
+                    self.metrics.record(method, path, response.status_code, time.perf_counter() - start, attempt)
+                    return response
+                delay = _retry_after(response)
+                if delay is None:
+                    delay = self._backoff(attempt)
+                delay = min(delay, BACKOFF_MAX)
+            _rewind_uploads(kwargs)
+            time.sleep(delay)
+
+    def request(self, method, path, headers=None, idempotent=None, **kwargs):
+        """
+        Send an authenticated request and return the Response. A 401 (e.g. the token
+        was revoked server-side) triggers one re-login and retry.
+        """
+        token = self.authenticate()
+        for attempt in range(2):
+            request_headers = dict(headers or {})
+            request_headers['Authorization'] = f'Bearer {token}'
+            response = self._send(method, self.url(path), idempotent=idempotent,
+                                  headers=request_headers, **kwargs)
+            if response.status_code != 401 or attempt > 0:
+                return response
+            _rewind_uploads(kwargs)
+            # Threads that got a 401 for the same token share one re-login
+            token = self.authenticate(rejected=token)
+        return response
+
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request('POST', path, **kwargs)
+
+    # Central operations used by the scripts
+
+    def create_project(self, name):
+        return self.post('projects', json={'name': name})
+
+    def form_exists(self, project_id, form_id):
+        return self.get(f'projects/{project_id}/forms/{form_id}').status_code == 200
+
+    def upload_form(self, project_id, form_id, xlsform_file, as_draft):
+        """Upload an XLSForm as a new form, or as a new draft of an existing one"""
+        path = f'projects/{project_id}/forms/{form_id}/draft' if as_draft else f'projects/{project_id}/forms'
+        instrumentation.count('bytes_uploaded', os.path.getsize(xlsform_file))
+        with instrumentation.span('upload'), open(xlsform_file, 'rb') as f:
+            files = {'xlsx': (xlsform_file, f, XLSX_CONTENT_TYPE)}
+            # Replacing a draft can safely be repeated; creating a form can not
+            return self.post(path, headers={'X-XlsForm-FormId-Fallback': form_id}, files=files,
+                             idempotent=as_draft)
+
+    def upload_attachment(self, project_id, form_id, file_path, name=None, compress=False):
+        """
+        Upload a media file (e.g. staff_list.csv) to the form's draft, streamed from
+        disk. With compress, the body is gzipped on the fly (Content-Encoding: gzip).
+        """
+        name = name or os.path.basename(file_path)
+        content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        path = f'projects/{project_id}/forms/{form_id}/draft/attachments/{name}'
+        instrumentation.count('bytes_uploaded', os.path.getsize(file_path))
+        # Uploading an attachment replaces it, so it is safe to repeat
+        with instrumentation.span('upload'):
+            if compress:
+                return self.post(path, headers={'Content-Type': content_type, 'Content-Encoding': 'gzip'},
+                                 data=_GzipFileStream(file_path), idempotent=True)
+            with open(file_path, 'rb') as f:
+                return self.post(path, headers={'Content-Type': content_type}, data=f, idempotent=True)
+
+    def attachment_hashes(self, project_id, form_id):
+        """
+        MD5 hashes of the files currently attached to the form's draft, read from the
+        draft's OpenRosa manifest. Returns: {filename: md5 hex digest}
+        """
+        response = self.get(f'projects/{project_id}/forms/{form_id}/draft')
+        if response.status_code != 200:
+            return {}
+        draft_token = response.json().get('draftToken')
+        if not draft_token:
+            return {}
+
+        # The draft test endpoints are authorized by the draft token in the URL
+        manifest = self._send(
+            'GET', self.url(f'test/{draft_token}/projects/{project_id}/forms/{form_id}/draft/manifest'),
+            headers={'X-OpenRosa-Version': '1.0'})
+        if manifest.status_code != 200:
+            return {}
+
+        hashes = {}
+        for media_file in ElementTree.fromstring(manifest.content).iter(f'{{{MANIFEST_NS}}}mediaFile'):
+            filename = media_file.findtext(f'{{{MANIFEST_NS}}}filename')
+            file_hash = media_file.findtext(f'{{{MANIFEST_NS}}}hash') or ''
+            if filename and file_hash.startswith('md5:'):
+                hashes[filename] = file_hash[len('md5:'):]
+        return hashes
+
+    def sync_attachment(self, project_id, form_id, file_path, name=None, server_hashes=None, compress=False):
+        """
+        Make the draft's attachment match file_path, uploading only if its hash
+        differs from the server's copy (drafts inherit attachments from the
+        published version, so unchanged files are skipped on re-deploys).
+
+        With compress, the upload is gzipped when the server is known to accept it.
+        The first compressed upload is verified against the server's hash; if the
+        server stored it wrongly, the file is re-sent uncompressed and compression
+        is switched off for this client.
+        Returns: ('skipped' or 'uploaded', Response or None)
+        """
+        name = name or os.path.basename(file_path)
+        local_hash = file_md5(file_path)
+        if server_hashes is None:
+            server_hashes = self.attachment_hashes(project_id, form_id)
+        if server_hashes.get(name) == local_hash:
+            return 'skipped', None
+
+        use_gzip = compress and self.gzip_uploads is not False
+        response = self.upload_attachment(project_id, form_id, file_path, name, compress=use_gzip)
+        if use_gzip and self.gzip_uploads is None:
+            accepted = (response.status_code in [200, 201]
+                        and self.attachment_hashes(project_id, form_id).get(name) == local_hash)
+            self.gzip_uploads = accepted
+            if not accepted:
+                response = self.upload_attachment(project_id, form_id, file_path, name)
+        return 'uploaded', response
+
+    def publish_draft(self, project_id, form_id, version=None):
+        """Publish the form's draft, optionally setting a new version string"""
+        params = {'version': version} if version else None
+        with instrumentation.span('publish'):
+            return self.post(f'projects/{project_id}/forms/{form_id}/draft/publish', params=params)
+
+    def published_form(self, project_id, form_id):
+        """
+        The form's details (incl. the published 'version' and 'hash'), or None if the
+        form does not exist (404), so one request tells whether to create it
+        """
+        response = self.get(f'projects/{project_id}/forms/{form_id}')
+        if response.status_code == 404:
+            return None
+        if response.status_code != 200:
+            raise ODKCentralError(f"Could not read form {form_id}: {response.status_code} {response.text}",
+                                  response)
+        return response.json()
+
+    # Publish records: which content hash was last published to which form
+
+    def _record_key(self, project_id, form_id):
+        return f"{self.server_url}|{project_id}|{form_id}"
+
+    def _load_publish_records(self):
+        try:
+            with open(self.publish_record_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def is_unchanged(self, project_id, form_id, content_hash, published=None):
+        """
+        True if content_hash is what this machine last published to the form and the
+        server still serves that same version (nobody published something else since).
+        """
+        if not self.publish_record_file:
+            return False
+        record = self._load_publish_records().get(self._record_key(project_id, form_id))
+        if published is None:
+            published = self.published_form(project_id, form_id)
+        return bool(record and published
+                    and record['content_hash'] == content_hash
+                    and record['version'] == published.get('version')
+                    and record['hash'] == published.get('hash'))
+
+    def record_publish(self, project_id, form_id, content_hash, published=None):
+        """Remember that content_hash is now the published version of the form"""
+        if not self.publish_record_file:
+            return
+        if published is None:
+            published = self.published_form(project_id, form_id)
+        if not published:
+            return
+        with self._record_lock:
+            records = self._load_publish_records()
+            records[self._record_key(project_id, form_id)] = {
+                'content_hash': content_hash,
+                'version': published.get('version'),
+                'hash': published.get('hash'),
+            }
+            try:
+                _write_json(self.publish_record_file, records)
+            except OSError:
+                pass
+
+def _write_json(path, data):
+    """
+    Write data to path as JSON through a temp file renamed into place, so an
+    interrupted or concurrent writer never leaves a half-written file. The file is
+    private to the current user (mkstemp's 0600), as tokens are credentials.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.json')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def _rewind_uploads(kwargs):
+    """Seek file objects being uploaded back to the start so a request can be resent"""
+    bodies = list((kwargs.get('files') or {}).values()) + [kwargs.get('data')]
+    for body in bodies:
+        stream = body[1] if isinstance(body, tuple) else body
+        if hasattr(stream, 'seek'):
+            stream.seek(0)
@@ -2,72 +2,336 @@
 Prepare staff list CSV for ODK form attachment
 Extracts only the necessary columns from a source staff list CSV file.
 
+The output is laid out for pulldata() lookups on devices: TINs are normalized
+(uppercase, no spaces or dashes, matching ${tin_lookup} in the TIN auto-fill form),
+one row per TIN, sorted by TIN so new versions diff cleanly against old ones. With
+--indexed-companion a second copy is written whose key column is named 'tin_key',
+which ODK Collect indexes when importing it; that is what makes lookups fast.
+
+With --chunksize the source is deduplicated and sorted chunk by chunk into temporary
+run files next to the output (or in --temp-dir), which are then merged, so memory stays
+bounded by the chunk size however large the source is. --tin-index also keeps the TINs
+already seen in a scratch SQLite file there instead of in memory.
+
 Usage:
-    python prepare_staff_list_csv.py <input_csv_file>
+    python prepare_staff_list_csv.py <input_csv_file> [output_csv_file] [--chunksize N] [--tin-index]
+                                     [--temp-dir DIR] [--indexed-companion]
     
 Example:
     python prepare_staff_list_csv.py ../csv/my_staff_data.csv
+    
+    # Source larger than RAM: stream it 500,000 rows at a time
+    python prepare_staff_list_csv.py ../csv/all_ministries.csv --chunksize 500000
 """
-import pandas as pd
+import argparse
+import contextlib
+import csv
+import heapq
+import shutil
+import sqlite3
 import sys
 import os
+import tempfile
+import time
+
+import instrumentation
+import staff_data
+
+# Columns needed for the form, with compact dtypes: identifiers stay text (keeps
+# leading zeros), low-cardinality columns are stored as categories
+COLUMN_DTYPES = {
+    'tin': 'string',
+    'eeno': 'string',
+    'staff_name': 'string',
+    'gender': 'category',
+    'organisation': 'category',
+    'job': 'category',
+}
+
+# ODK Collect creates a database index for attachment columns whose name ends in _key
+INDEXED_KEY_COLUMN = 'tin_key'
 
-def prepare_staff_list(input_file, output_file='../csv/staff_list.csv'):
+def normalize_tins(tins):
+    """
+    Uppercase TINs and drop whitespace and dashes, the same normalization the TIN
+    auto-fill form applies to what staff type in. Blank TINs become missing.
+    """
+    tins = tins.str.upper().str.replace(r'[\s-]', '', regex=True)
+    return tins.mask(tins == '')
+
+def indexed_companion_path(output_file):
+    stem, ext = os.path.splitext(output_file)
+    return f"{stem}_indexed{ext}"
+
+def write_lookup_files(lookup_df, output_file, indexed_companion=False):
+    """Save the lookup table sorted by TIN, plus the indexed companion if requested"""
+    with instrumentation.span('sort'):
+        lookup_df = lookup_df.sort_values('tin', kind='stable')
+    with instrumentation.span('write'):
+        lookup_df.to_csv(output_file, index=False)
+        if indexed_companion:
+            companion_file = indexed_companion_path(output_file)
+            lookup_df.rename(columns={'tin': INDEXED_KEY_COLUMN}).to_csv(companion_file, index=False)
+            print(f"✓ Created {companion_file} (key column '{INDEXED_KEY_COLUMN}' for indexed lookups)")
+    instrumentation.count('rows_written', len(lookup_df))
+    return lookup_df
+
+def read_staff_columns(input_file, columns):
+    """
+    Read only the given columns of input_file from the shared Arrow cache (see
+    staff_data.py), which parses the CSV with PyArrow. Falls back to the C parser
+    when PyArrow isn't installed or the file can't be cached. Prints the load time
+    and peak memory.
+    """
+    import pandas as pd
+
+    dtypes = {col: COLUMN_DTYPES.get(col, 'string') for col in columns}
+
+    start = time.perf_counter()
+    with instrumentation.span('read'):
+        table = staff_data.open_staff_table(input_file, columns)
+        if table is not None:
+            source = 'Arrow cache'
+            staff_df = staff_data.table_to_frame(table, dtypes)
+        else:
+            # Not engine='pyarrow': it infers column types before applying dtype,
+            # which strips leading zeros from identifiers
+            source = 'C engine'
+            staff_df = pd.read_csv(input_file, usecols=columns, dtype=dtypes, engine='c')
+    elapsed = time.perf_counter() - start
+    instrumentation.count('rows_read', len(staff_df))
+
+    peak = instrumentation.peak_memory_mb()
+    peak_text = f", peak memory {peak:,.0f} MB" if peak is not None else ""
+    print(f"✓ Loaded {len(staff_df):,} rows in {elapsed:.2f}s ({source}{peak_text})")
+    return staff_df
+
+class SeenTins:
+    """
+    TINs already written; kept in memory, or in a scratch SQLite index created in
+    index_dir when given one
+    """
+
+    def __init__(self, index_dir=None):
+        self._seen = set()
+        self._db = None
+        self._index_file = None
+        if index_dir:
+            fd, self._index_file = tempfile.mkstemp(prefix='.seen-tins-', suffix='.sqlite', dir=index_dir)
+            os.close(fd)
+            self._db = sqlite3.connect(self._index_file)
+            self._db.execute('PRAGMA journal_mode = OFF')
+            self._db.execute('PRAGMA synchronous = OFF')
+            self._db.execute('CREATE TABLE seen (tin TEXT PRIMARY KEY) WITHOUT ROWID')
+
+    def filter_new(self, tins):
+        """Return a list of booleans marking which of tins (unique within the batch) are unseen"""
+        if self._db is None:
+            return [tin not in self._seen for tin in tins]
+        seen = set()
+        tins = list(tins)
+        # Stay under SQLite's limit on query parameters
+        for i in range(0, len(tins), 900):
+            batch = tins[i:i + 900]
+            placeholders = ','.join('?' * len(batch))
+            seen.update(row[0] for row in self._db.execute(
+                f'SELECT tin FROM seen WHERE tin IN ({placeholders})', batch))
+        return [tin not in seen for tin in tins]
+
+    def add(self, tins):
+        if self._db is None:
+            self._seen.update(tins)
+        else:
+            self._db.executemany('INSERT INTO seen (tin) VALUES (?)', ((tin,) for tin in tins))
+
+    def close(self):
+        # The index is scratch space for a single run
+        if self._db is not None:
+            self._db.close()
+            os.remove(self._index_file)
+
+def dedupe_staff_chunks(input_file, run_dir, columns, chunksize, tin_index=False):
+    """
+    Stream input_file in chunks, dropping rows without a TIN and rows whose TIN was
+    already seen, and write the kept rows of each chunk, sorted by TIN, to a run file
+    in run_dir. Gives the same rows as dropna() + drop_duplicates(keep='first') on the
+    whole file in bounded memory; merge_sorted_runs() then puts them in TIN order.
+    With tin_index, the TINs seen so far are kept in a SQLite file in run_dir.
+    Returns: (total records kept, run file paths)
+    """
+    import pandas as pd
+
+    dtypes = {col: COLUMN_DTYPES.get(col, 'string') for col in columns}
+    seen_tins = SeenTins(run_dir if tin_index else None)
+    total_records = 0
+    run_files = []
+
+    start = time.perf_counter()
+    try:
+        chunks = enumerate(pd.read_csv(input_file, usecols=columns, dtype=dtypes, chunksize=chunksize))
+        while True:
+            with instrumentation.span('read'):
+                i, chunk = next(chunks, (None, None))
+            if chunk is None:
+                break
+            instrumentation.count('rows_read', len(chunk))
+            with instrumentation.span('dedupe'):
+                chunk = chunk[columns].assign(tin=lambda df: normalize_tins(df['tin']))
+                chunk = chunk.dropna(subset=['tin'])
+                chunk = chunk.drop_duplicates(subset=['tin'], keep='first')
+                chunk = chunk.loc[seen_tins.filter_new(chunk['tin'])]
+                seen_tins.add(chunk['tin'])
+
+            with instrumentation.span('sort'):
+                chunk = chunk.sort_values('tin', kind='stable')
+            with instrumentation.span('write'):
+                run_file = os.path.join(run_dir, f'run-{i:06d}.csv')
+                chunk.to_csv(run_file, index=False)
+                run_files.append(run_file)
+            total_records += len(chunk)
+            print(f"  Chunk {i + 1}: kept {total_records:,} records so far...")
+    finally:
+        seen_tins.close()
+
+    elapsed = time.perf_counter() - start
+    peak = instrumentation.peak_memory_mb()
+    peak_text = f", peak memory {peak:,.0f} MB" if peak is not None else ""
+    print(f"✓ Streamed {input_file} in {elapsed:.2f}s{peak_text}")
+    return total_records, run_files
+
+def merge_sorted_runs(run_files, output_file, indexed_companion=False):
+    """
+    Merge CSV run files, each sorted by TIN, into output_file (and its indexed
+    companion) in TIN order, holding one row per run in memory.
+    Returns: number of rows written
+    """
+    rows_written = 0
+    with contextlib.ExitStack() as stack:
+        readers = [csv.reader(stack.enter_context(open(path, 'r', encoding='utf-8', newline='')))
+                   for path in run_files]
+        header = [next(reader) for reader in readers][0] if readers else list(COLUMN_DTYPES)
+        tin_column = header.index('tin')
+        outputs = [(output_file, header)]
+        if indexed_companion:
+            outputs.append((indexed_companion_path(output_file),
+                            [INDEXED_KEY_COLUMN if name == 'tin' else name for name in header]))
+        writers = []
+        for path, columns in outputs:
+            # Line endings as pandas' to_csv() writes them, so both paths give the same file
+            writer = csv.writer(stack.enter_context(open(path, 'w', encoding='utf-8', newline='')),
+                                lineterminator=os.linesep)
+            writer.writerow(columns)
+            writers.append(writer)
+
+        for row in heapq.merge(*readers, key=lambda row: row[tin_column]):
+            for writer in writers:
+                writer.writerow(row)
+            rows_written += 1
+    if indexed_companion:
+        print(f"✓ Created {indexed_companion_path(output_file)} (key column '{INDEXED_KEY_COLUMN}' for indexed lookups)")
+    instrumentation.count('rows_written', rows_written)
+    return rows_written
+
+def prepare_staff_list(input_file, output_file='../csv/staff_list.csv', chunksize=None, tin_index=False,
+                       indexed_companion=False, temp_dir=None):
     """
     Prepare a staff list CSV for ODK form attachment.
     
     Args:
         input_file: Path to the source CSV file containing staff data
         output_file: Path for the output CSV file (default: ../csv/staff_list.csv)
+        chunksize: Rows per chunk to stream the source in bounded memory (default: load it whole)
+        tin_index: Track seen TINs in a scratch SQLite file instead of memory in chunked mode
+        indexed_companion: Also write <output>_indexed.csv keyed on 'tin_key'
+        temp_dir: Folder for chunked mode's scratch files (default: the output folder)
     """
+    import pandas as pd
+
     # Check if input file exists
     if not os.path.exists(input_file):
         print(f"❌ Error: Input file not found: {input_file}")
         print(f"   Please provide a valid CSV file with staff data.")
         sys.exit(1)
     
-    # Read the full staff list
-    staff_df = pd.read_csv(input_file)
-    
     # Select only the columns needed for the form
-    columns_needed = ['tin', 'eeno', 'staff_name', 'gender', 'organisation', 'job']
+    columns_needed = list(COLUMN_DTYPES)
     
-    # Check if all required columns exist
-    missing_cols = [col for col in columns_needed if col not in staff_df.columns]
+    # Check if all required columns exist (reads the header only)
+    available_cols = list(pd.read_csv(input_file, nrows=0).columns)
+    missing_cols = [col for col in columns_needed if col not in available_cols]
     if missing_cols:
         print(f"❌ Error: Missing required columns: {missing_cols}")
-        print(f"   Available columns: {list(staff_df.columns)}")
+        print(f"   Available columns: {available_cols}")
         sys.exit(1)
     
-    # Create the lookup CSV with only needed columns
-    lookup_df = staff_df[columns_needed].copy()
-    
-    # Remove any rows with missing TIN (can't lookup without TIN)
-    lookup_df = lookup_df.dropna(subset=['tin'])
-    
-    # Remove duplicates based on TIN (keep first occurrence)
-    lookup_df = lookup_df.drop_duplicates(subset=['tin'], keep='first')
-    
-    # Save as staff_list.csv (the name referenced in the form)
-    lookup_df.to_csv(output_file, index=False)
+    if chunksize:
+        # Too large to load at once: dedupe and sort chunk by chunk into run files,
+        # then merge those (an external merge sort), so memory stays bounded throughout
+        run_dir = tempfile.mkdtemp(prefix='.staff-runs-',
+                                   dir=temp_dir or os.path.dirname(os.path.abspath(output_file)))
+        try:
+            total_records, run_files = dedupe_staff_chunks(
+                input_file, run_dir, columns_needed, chunksize, tin_index)
+            with instrumentation.span('merge'):
+                merge_sorted_runs(run_files, output_file, indexed_companion)
+        finally:
+            shutil.rmtree(run_dir, ignore_errors=True)
+        dtypes = {col: COLUMN_DTYPES[col] for col in columns_needed}
+        sample_df = pd.read_csv(output_file, dtype=dtypes, nrows=5)
+    else:
+        # Read just the needed columns; usecols returns them in file order
+        lookup_df = read_staff_columns(input_file, columns_needed)[columns_needed]
+        
+        with instrumentation.span('dedupe'):
+            # Use the same TIN format the form looks up
+            lookup_df = lookup_df.assign(tin=lambda df: normalize_tins(df['tin']))
+            
+            # Remove any rows with missing TIN (can't lookup without TIN)
+            lookup_df = lookup_df.dropna(subset=['tin'])
+            
+            # Remove duplicates based on TIN (keep first occurrence)
+            lookup_df = lookup_df.drop_duplicates(subset=['tin'], keep='first')
+        
+        # Save as staff_list.csv (the name referenced in the form), sorted by TIN
+        lookup_df = write_lookup_files(lookup_df, output_file, indexed_companion)
+        total_records, sample_df = len(lookup_df), lookup_df.head()
     
     print(f"✓ Created {output_file}")
-    print(f"  Total records: {len(lookup_df)}")
+    print(f"  Total records: {total_records}")
     print(f"\nColumns included:")
     for col in columns_needed:
         print(f"  - {col}")
     print(f"\nSample data:")
-    print(lookup_df.head())
+    print(sample_df)
     print("\n✓ This file is ready to be uploaded as a media attachment to the ODK form")
 
 
-if __name__ == "__main__":
-    if len(sys.argv) < 2:
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv:
         print("❌ Error: No input file specified.")
         print(__doc__)
-        sys.exit(1)
+        return 1
     
-    input_file = sys.argv[1]
-    output_file = sys.argv[2] if len(sys.argv) > 2 else '../csv/staff_list.csv'
+    parser = argparse.ArgumentParser(description='Prepare staff list CSV for ODK form attachment')
+    parser.add_argument('input_file')
+    parser.add_argument('output_file', nargs='?', default='../csv/staff_list.csv')
+    parser.add_argument('--chunksize', type=int,
+                        help='stream the source this many rows at a time (for files larger than RAM)')
+    parser.add_argument('--tin-index', action='store_true',
+                        help='with --chunksize, track seen TINs in a scratch SQLite file instead of memory')
+    parser.add_argument('--temp-dir',
+                        help="with --chunksize, folder for the scratch files (default: the output file's folder)")
+    parser.add_argument('--indexed-companion', action='store_true',
+                        help=f"also write <output>_indexed.csv keyed on '{INDEXED_KEY_COLUMN}' for indexed lookups")
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args(argv)
     
-    prepare_staff_list(input_file, output_file)
+    with instrumentation.instrumented('prepare_staff_list_csv', args):
+        prepare_staff_list(args.input_file, args.output_file, args.chunksize, args.tin_index,
+                           args.indexed_companion, args.temp_dir)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,50 @@
+# pst.py
+# One command line for the PST scripts
+#
+#     python pst.py <command> [options]      (or ./pst <command> on Linux/macOS)
+#     python pst.py <command> --help
+#
+# Each command is the main() of one of the scripts below, which are only imported
+# once the command is known. The scripts in turn import pandas, pyarrow, openpyxl
+# and requests where they use them rather than at the top, so `pst --help` and
+# `pst <command> --help` start in about the time of a bare Python, and the upload
+# commands don't pay for the data libraries. bench_cli_startup.py measures this.
+
+import importlib
+import sys
+
+# command: (module, description)
+COMMANDS = {
+    'enrich': ('add_gender_to_staff', 'add a gender column to a staff list CSV'),
+    'prepare': ('prepare_staff_list_csv', 'prepare the staff list CSV attached to the form'),
+    'build-form': ('create_autofill_tin_form', 'build the TIN auto-fill XLSForm'),
+    'upload': ('quick_upload', 'upload the XLSForm in upload_config.py to ODK Central'),
+    'create-project': ('create_odk_project', 'create a new project on ODK Central'),
+    'clean-workbook': ('delete_instance_name_column', 'remove instance_name from an XLSForm settings sheet'),
+}
+
+def usage():
+    width = max(len(name) for name in COMMANDS)
+    lines = ["usage: pst <command> [options]", "", "commands:"]
+    lines += [f"  {name:<{width}}  {description}" for name, (_, description) in COMMANDS.items()]
+    lines += ["", "Run 'pst <command> --help' for the options of a command."]
+    return '\n'.join(lines)
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] in ('-h', '--help'):
+        print(usage())
+        return 0 if argv else 1
+    name, rest = argv[0], argv[1:]
+    if name not in COMMANDS:
+        print(f"✗ Error: unknown command '{name}'\n")
+        print(usage())
+        return 1
+
+    module = importlib.import_module(COMMANDS[name][0])
+    # argparse takes the program name in usage and errors from argv[0]
+    sys.argv[0] = f'pst {name}'
+    return module.main(rest) or 0
+
+if __name__ == "__main__":
+    sys.exit(main())
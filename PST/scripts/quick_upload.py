@@ -1,12 +1,22 @@
 # quick_upload.py
 # Quick upload to ODK Central using saved config
 
-import requests
+import argparse
+import asyncio
 import os
-from upload_config import ODK_CONFIG
+import sys
+import instrumentation
+
+# Used unless upload_config.py sets 'form_id'; it must match form_id in the form's settings
+DEFAULT_FORM_ID = 'employee_details_v1'
 
 def quick_upload():
     """Upload XLSForm to ODK Central using saved configuration"""
+    # Imported here so `--help` doesn't pay for requests and the config
+    import requests
+    from deploy_forms import Deployer
+    from odk_central import ODKCentralClient, ODKCentralError
+    from upload_config import ODK_CONFIG
     
     print("=" * 60)
     print("ODK Central Form Upload")
@@ -16,34 +26,32 @@ def quick_upload():
     # Get config
     server_url = ODK_CONFIG['server_url'].rstrip('/')
     email = ODK_CONFIG['email']
-    password = ODK_CONFIG['password']
     project_id = ODK_CONFIG['project_id']
     xlsform_file = ODK_CONFIG['xlsform_file']
+    # Optional media files for the form, e.g. ['../csv/staff_list.csv'] for the TIN auto-fill form
+    attachments = ODK_CONFIG.get('attachments', [])
+    compress_attachments = ODK_CONFIG.get('compress_attachments', False)
     
     print(f"Server: {server_url}")
     print(f"Email: {email}")
     print(f"Project ID: {project_id}")
     print(f"Form file: {xlsform_file}")
+    for attachment in attachments:
+        print(f"Attachment: {attachment}")
     print()
     
-    if not os.path.exists(xlsform_file):
-        print(f"✗ Error: {xlsform_file} not found!")
-        return False
+    for path in [xlsform_file] + attachments:
+        if not os.path.exists(path):
+            print(f"✗ Error: {path} not found!")
+            return False
     
+    client = ODKCentralClient.from_config(ODK_CONFIG)
     try:
-        # Step 1: Authenticate
-        print("[1/4] Authenticating...")
-        auth_url = f"{server_url}/v1/sessions"
-        print(f"Auth URL: {auth_url}")
-        auth_data = {
-            "email": email,
-            "password": password
-        }
-        
-        print("Sending authentication request...")
+        # Step 1: Authenticate (reuses a cached session token when still valid)
+        print("[1/2] Authenticating...")
+        print(f"Auth URL: {client.url('sessions')}")
         try:
-            auth_response = requests.post(auth_url, json=auth_data, timeout=10, verify=True)
-            print(f"Auth response status: {auth_response.status_code}")
+            client.authenticate()
         except requests.exceptions.Timeout:
             print("✗ Request timed out - server may be slow or unresponsive")
             return False
@@ -51,74 +59,25 @@ def quick_upload():
             print(f"✗ SSL Error: {e}")
             print("You may need to update certificates or use verify=False (not recommended)")
             return False
-        
-        if auth_response.status_code != 200:
-            print(f"✗ Authentication failed: {auth_response.status_code}")
-            print(f"Response: {auth_response.text}")
+        except ODKCentralError as e:
+            print(f"✗ {e}")
+            if e.response is not None:
+                print(f"Response: {e.response.text}")
             return False
         
-        token = auth_response.json()['token']
-        headers = {
-            'Authorization': f'Bearer {token}'
-        }
         print("✓ Authentication successful")
         
-        # Step 2: Check if form exists
-        print("\n[2/4] Checking existing forms...")
-        form_id = 'employee_details_v1'
-        
-        check_url = f"{server_url}/v1/projects/{project_id}/forms/{form_id}"
-        check_response = requests.get(check_url, headers=headers)
-        
-        form_exists = check_response.status_code == 200
-        
-        if form_exists:
-            print(f"⚠ Form '{form_id}' already exists - will create new version")
-        else:
-            print(f"Creating new form '{form_id}'")
-        
-        # Step 3: Upload the XLSForm
-        print(f"\n[3/4] Uploading form...")
-        
-        with open(xlsform_file, 'rb') as f:
-            files = {
-                'xlsx': (xlsform_file, f, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-            }
-            
-            headers_upload = headers.copy()
-            headers_upload['X-XlsForm-FormId-Fallback'] = form_id
-            
-            if form_exists:
-                # Create draft for existing form
-                upload_url = f"{server_url}/v1/projects/{project_id}/forms/{form_id}/draft"
-                upload_response = requests.post(upload_url, headers=headers_upload, files=files)
-            else:
-                # Create new form
-                upload_url = f"{server_url}/v1/projects/{project_id}/forms"
-                upload_response = requests.post(upload_url, headers=headers_upload, files=files)
-        
-        if upload_response.status_code not in [200, 201]:
-            print(f"✗ Upload failed: {upload_response.status_code}")
-            print(f"Response: {upload_response.text}")
+        # Step 2: Check, upload, attach and publish - the same deployment deploy_forms.py
+        # runs for every form of a manifest, so an unchanged form is not republished
+        form_id = ODK_CONFIG.get('form_id', DEFAULT_FORM_ID)
+        print(f"\n[2/2] Deploying form '{form_id}'...")
+        spec = {'form_id': form_id, 'xlsform': xlsform_file, 'attachments': attachments}
+        deployer = Deployer(client, project_id, compress=compress_attachments)
+        result = asyncio.run(deployer.deploy_form(spec))
+        if not result['ok']:
+            print(f"✗ Deployment failed: {result['error']}")
             return False
         
-        print("✓ Form uploaded successfully")
-        
-        # Step 4: Publish draft if needed
-        if form_exists:
-            print("\n[4/4] Publishing draft...")
-            publish_url = f"{server_url}/v1/projects/{project_id}/forms/{form_id}/draft/publish"
-            publish_response = requests.post(publish_url, headers=headers)
-            
-            if publish_response.status_code != 200:
-                print(f"⚠ Warning: Failed to publish draft: {publish_response.status_code}")
-                print(f"Response: {publish_response.text}")
-                print("You may need to publish manually from ODK Central web interface.")
-            else:
-                print("✓ Form published successfully")
-        else:
-            print("\n[4/4] Form created")
-        
         print("\n" + "=" * 60)
         print("✓ SUCCESS: Form uploaded to ODK Central!")
         print("=" * 60)
@@ -132,7 +91,7 @@ def quick_upload():
         return True
         
     except requests.exceptions.Timeout:
-        print(f"\n✗ Error: Request timed out after 30 seconds")
+        print(f"\n✗ Error: Request still timing out after {client.max_retries} retries")
         print("The server may be slow or unreachable")
         return False
     except requests.exceptions.ConnectionError:
@@ -144,6 +103,18 @@ def quick_upload():
         import traceback
         traceback.print_exc()
         return False
+    finally:
+        print(f"\nRequests: {client.metrics.format_summary()}")
+        client.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Upload the XLSForm in upload_config.py to ODK Central')
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    with instrumentation.instrumented('quick_upload', args):
+        success = quick_upload()
+    return 0 if success else 1
 
 if __name__ == "__main__":
-    quick_upload()
+    sys.exit(main())
@@ -0,0 +1,370 @@
+"""
+Run the whole staff form pipeline in one go: enrich -> prepare -> build -> deploy
+
+Replaces running add_gender_to_staff.py, renaming its output, prepare_staff_list_csv.py,
+create_autofill_tin_form.py and quick_upload.py by hand. The steps form a dependency
+graph and run in one process, so pandas and friends are imported once:
+
+    enrich    add a gender column to the raw staff list      (add_gender_to_staff.py)
+    prepare   dedupe/sort it into staff_list.csv             (prepare_staff_list_csv.py)
+    build     write the TIN auto-fill XLSForm                (create_autofill_tin_form.py)
+    deploy    upload the form with staff_list.csv, publish   (deploy_forms.py)
+
+build needs nothing from the staff list, so it runs while enrich/prepare are busy.
+
+Every output is stored content-addressed in the artifact store (--store), under the
+SHA-256 of its contents. A step is keyed by the hashes of its inputs, its options and
+the source of the code it runs; when a step with the same key has run before, its
+stored outputs are reused instead of running it again. Changing only the form therefore
+rebuilds and redeploys the form without touching the staff list, and a run with nothing
+changed does no work at all. The store can be deleted at any time; it is only a cache.
+
+The final staff_list.csv and form are copied to --output-dir (../csv, where the
+individual scripts write them). Each step's printed output goes to <store>/logs/.
+
+Usage:
+    python run_pipeline.py <raw staff CSV> [--output-dir ../csv] [--no-deploy] [--force]
+                           [--jobs N] [--store DIR] [--form-id ID]
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import instrumentation
+import staff_data
+
+DEFAULT_STORE = '../csv/.pipeline'
+DEFAULT_OUTPUT_DIR = '../csv'
+# The form_id the TIN auto-fill form is built with (see build) and deployed under
+DEFAULT_FORM_ID = 'employee_details_tin_autofill'
+STAFF_LIST_FILE = 'staff_list.csv'
+FORM_FILE = 'employee_details_odk_form.xlsx'
+
+class PipelineError(Exception):
+    """A step failed"""
+
+class Stage:
+    """
+    One step of the pipeline. inputs maps names to external file paths or to
+    (stage name, output file name) of an upstream stage; run(inputs, output_dir) is
+    called with those resolved to file paths and must write every file named in
+    outputs into output_dir. code lists the modules whose source makes up the step.
+    """
+
+    def __init__(self, name, run, inputs=None, outputs=(), params=None, code=()):
+        self.name = name
+        self.run = run
+        self.inputs = inputs or {}
+        self.outputs = list(outputs)
+        self.params = params or {}
+        self.code = list(code)
+
+    @property
+    def upstream(self):
+        return {source[0] for source in self.inputs.values() if isinstance(source, tuple)}
+
+_source_hashes = {}
+
+def source_hash(module_name):
+    """SHA-256 of a pipeline module's source file"""
+    if module_name not in _source_hashes:
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), f'{module_name}.py')
+        _source_hashes[module_name] = staff_data.file_sha256(path)
+    return _source_hashes[module_name]
+
+class ArtifactStore:
+    """
+    Content-addressed files plus a record of which outputs each stage key produced:
+
+        <root>/objects/<sha256>/<file name>   stored outputs
+        <root>/stages/<key>.json              {stage, outputs: {file name: sha256}}
+        <root>/logs/<stage>.log               printed output of the last run of a stage
+    """
+
+    def __init__(self, root):
+        self.root = root
+        for folder in ('objects', 'stages', 'logs', 'tmp'):
+            os.makedirs(os.path.join(root, folder), exist_ok=True)
+
+    def object_path(self, sha256, name):
+        return os.path.join(self.root, 'objects', sha256, name)
+
+    def put(self, path):
+        """Move a file into the store; returns its SHA-256"""
+        sha256 = staff_data.file_sha256(path)
+        target = self.object_path(sha256, os.path.basename(path))
+        if os.path.exists(target):
+            os.remove(path)
+        else:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(path, target)
+        return sha256
+
+    def _record_path(self, key):
+        return os.path.join(self.root, 'stages', f'{key}.json')
+
+    def lookup(self, key):
+        """Outputs {file name: sha256} recorded for key, if all of them are still stored"""
+        try:
+            with open(self._record_path(key), 'r', encoding='utf-8') as f:
+                outputs = json.load(f)['outputs']
+        except (OSError, ValueError, KeyError):
+            return None
+        if all(os.path.exists(self.object_path(sha256, name)) for name, sha256 in outputs.items()):
+            return outputs
+        return None
+
+    def record(self, key, stage_name, outputs):
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.join(self.root, 'tmp'), suffix='.json')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({'stage': stage_name, 'outputs': outputs, 'recorded_at': time.time()}, f, indent=2)
+        os.replace(tmp_path, self._record_path(key))
+
+    def log_path(self, stage_name):
+        return os.path.join(self.root, 'logs', f'{stage_name}.log')
+
+    def scratch_dir(self, stage_name):
+        return tempfile.mkdtemp(prefix=f'{stage_name}-', dir=os.path.join(self.root, 'tmp'))
+
+class _ThreadOutput:
+    """sys.stdout stand-in sending each thread's prints to its own stream, if it has one"""
+
+    def __init__(self, default):
+        self.default = default
+        self.local = threading.local()
+
+    def __getattr__(self, name):
+        return getattr(self.default, name)
+
+    def _stream(self):
+        return getattr(self.local, 'stream', None) or self.default
+
+    def write(self, text):
+        return self._stream().write(text)
+
+    def flush(self):
+        self._stream().flush()
+
+class Pipeline:
+    """Runs stages in dependency order, in parallel where possible, reusing stored outputs"""
+
+    def __init__(self, stages, store, jobs=4, force=False):
+        self.stages = {stage.name: stage for stage in stages}
+        self.store = store
+        self.jobs = jobs
+        self.force = force
+        self.outputs = {}  # stage name -> {file name: stored path}
+        self.hashes = {}   # stage name -> {file name: sha256}
+        self.status = {}   # stage name -> 'ran', 'cached', 'failed' or 'skipped'
+        self._print_lock = threading.Lock()
+
+    def stage_key(self, stage):
+        """Hash of everything a stage's outputs depend on"""
+        inputs = {}
+        for name, source in sorted(stage.inputs.items()):
+            if isinstance(source, tuple):
+                inputs[name] = self.hashes[source[0]][source[1]]
+            else:
+                inputs[name] = staff_data.file_sha256(source)
+        description = {
+            'stage': stage.name,
+            'inputs': inputs,
+            'params': stage.params,
+            'code': {module: source_hash(module) for module in stage.code},
+        }
+        return hashlib.sha256(json.dumps(description, sort_keys=True, default=str).encode()).hexdigest()
+
+    def _input_paths(self, stage):
+        return {name: self.outputs[source[0]][source[1]] if isinstance(source, tuple) else source
+                for name, source in stage.inputs.items()}
+
+    def run_stage(self, stage):
+        """Run (or reuse) one stage; returns 'ran' or 'cached'"""
+        key = self.stage_key(stage)
+        stored = None if self.force else self.store.lookup(key)
+        if stored is None:
+            output_dir = self.store.scratch_dir(stage.name)
+            try:
+                with open(self.store.log_path(stage.name), 'w', encoding='utf-8') as log, \
+                        instrumentation.span(stage.name):
+                    sys.stdout.local.stream = log
+                    try:
+                        stage.run(self._input_paths(stage), output_dir)
+                    except SystemExit as e:
+                        # The wrapped scripts exit on bad input
+                        raise PipelineError(f"exited with status {e.code}; see {log.name}")
+                    finally:
+                        sys.stdout.local.stream = None
+                missing = [name for name in stage.outputs if not os.path.exists(os.path.join(output_dir, name))]
+                if missing:
+                    raise PipelineError(f"did not write {', '.join(missing)}")
+                stored = {name: self.store.put(os.path.join(output_dir, name)) for name in stage.outputs}
+            finally:
+                shutil.rmtree(output_dir, ignore_errors=True)
+            self.store.record(key, stage.name, stored)
+            result = 'ran'
+        else:
+            result = 'cached'
+        self.hashes[stage.name] = stored
+        self.outputs[stage.name] = {name: self.store.object_path(sha256, name) for name, sha256 in stored.items()}
+        return result
+
+    def run(self):
+        """Run every stage; returns True if all succeeded"""
+        stdout = sys.stdout
+        sys.stdout = _ThreadOutput(stdout)
+        pending = dict(self.stages)
+        running = {}
+        try:
+            with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+                while pending or running:
+                    for name, stage in list(pending.items()):
+                        upstream = [self.status.get(dep) for dep in stage.upstream]
+                        if any(status in ('failed', 'skipped') for status in upstream):
+                            self.status[name] = 'skipped'
+                            del pending[name]
+                            self._report(f"  - {name:<10} skipped (an earlier step failed)")
+                        elif all(status in ('ran', 'cached') for status in upstream):
+                            running[executor.submit(self._timed, stage)] = name
+                            del pending[name]
+                    if not running:
+                        break
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        name = running.pop(future)
+                        self.status[name] = future.result()
+        finally:
+            sys.stdout = stdout
+        return all(status in ('ran', 'cached') for status in self.status.values())
+
+    def _timed(self, stage):
+        start = time.perf_counter()
+        try:
+            result = self.run_stage(stage)
+        except Exception as e:
+            self._report(f"  ✗ {stage.name:<10} failed after {time.perf_counter() - start:.1f}s: {e}")
+            return 'failed'
+        if result == 'cached':
+            self._report(f"  ✓ {stage.name:<10} unchanged, reused stored outputs")
+        else:
+            self._report(f"  ✓ {stage.name:<10} ran in {time.perf_counter() - start:.1f}s "
+                         f"(log: {self.store.log_path(stage.name)})")
+        return result
+
+    def _report(self, line):
+        # Stages finish on different threads; keep their lines whole
+        with self._print_lock:
+            print(line, flush=True)
+
+# Stages
+
+def enrich(inputs, output_dir):
+    from add_gender_to_staff import enrich_file
+    enrich_file(inputs['staff'], os.path.join(output_dir, 'staff-list-with-gender.csv'))
+
+def prepare(inputs, output_dir):
+    from prepare_staff_list_csv import prepare_staff_list
+    prepare_staff_list(inputs['staff'], os.path.join(output_dir, STAFF_LIST_FILE))
+
+def make_build(form_id):
+    def build_stage(inputs, output_dir):
+        from create_autofill_tin_form import tin_form_spec
+        from xlsform_builder import build_xlsform
+        # Central takes the form's ID from its settings, so it must match the one deployed to
+        build_xlsform(tin_form_spec(form_id=form_id), os.path.join(output_dir, FORM_FILE), force=True)
+    return build_stage
+
+def make_deploy(config, form_id):
+    def deploy_stage(inputs, output_dir):
+        from deploy_forms import deploy
+        from odk_central import ODKCentralClient
+
+        spec = {'form_id': form_id, 'xlsform': inputs['form'], 'attachments': [inputs['staff_list']]}
+        with ODKCentralClient.from_config(config) as client:
+            result = asyncio.run(deploy(client, config['project_id'], [spec], concurrency=4,
+                                        compress=config.get('compress_attachments', False)))[0]
+        if not result['ok']:
+            raise PipelineError(result['error'])
+    return deploy_stage
+
+def pipeline_stages(staff_file, deploy_config=None, form_id=DEFAULT_FORM_ID):
+    stages = [
+        Stage('enrich', enrich, inputs={'staff': staff_file}, outputs=['staff-list-with-gender.csv'],
+              code=['add_gender_to_staff', 'staff_data', 'instrumentation']),
+        Stage('prepare', prepare, inputs={'staff': ('enrich', 'staff-list-with-gender.csv')},
+              outputs=[STAFF_LIST_FILE], code=['prepare_staff_list_csv', 'staff_data', 'instrumentation']),
+        Stage('build', make_build(form_id), outputs=[FORM_FILE], params={'form_id': form_id},
+              code=['create_autofill_tin_form', 'xlsform_builder']),
+    ]
+    if deploy_config is not None:
+        stages.append(Stage(
+            'deploy', make_deploy(deploy_config, form_id),
+            inputs={'form': ('build', FORM_FILE), 'staff_list': ('prepare', STAFF_LIST_FILE)},
+            params={'server_url': deploy_config['server_url'], 'project_id': deploy_config['project_id'],
+                    'form_id': form_id},
+            code=['deploy_forms', 'odk_central', 'instrumentation']))
+    return stages
+
+def copy_if_changed(source, target):
+    """Copy source over target unless they already match; returns True if copied"""
+    if os.path.exists(target) and staff_data.file_sha256(target) == staff_data.file_sha256(source):
+        return False
+    os.makedirs(os.path.dirname(os.path.abspath(target)), exist_ok=True)
+    shutil.copyfile(source, target)
+    return True
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Run enrich -> prepare -> build -> deploy as a cached pipeline')
+    parser.add_argument('staff_file', help='raw staff list CSV (with a staff_name column)')
+    parser.add_argument('--output-dir', default=DEFAULT_OUTPUT_DIR,
+                        help=f'where to put {STAFF_LIST_FILE} and {FORM_FILE} (default: {DEFAULT_OUTPUT_DIR})')
+    parser.add_argument('--store', default=DEFAULT_STORE, help=f'artifact store (default: {DEFAULT_STORE})')
+    parser.add_argument('--jobs', type=int, default=4, help='steps run at once (default: 4)')
+    parser.add_argument('--force', action='store_true', help='run every step even if its inputs are unchanged')
+    parser.add_argument('--no-deploy', action='store_true', help='stop after building; do not upload')
+    parser.add_argument('--form-id', default=DEFAULT_FORM_ID,
+                        help=f'form_id the form is built with and deployed under (default: {DEFAULT_FORM_ID})')
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("Staff Form Pipeline")
+    print("=" * 60)
+    print()
+
+    if not os.path.exists(args.staff_file):
+        print(f"✗ Error: {args.staff_file} not found!")
+        sys.exit(1)
+
+    deploy_config = None
+    if not args.no_deploy:
+        try:
+            from upload_config import ODK_CONFIG as deploy_config
+        except ImportError:
+            print("✗ Error: upload_config.py not found; create it or run with --no-deploy")
+            sys.exit(1)
+
+    with instrumentation.instrumented('run_pipeline', args):
+        pipeline = Pipeline(pipeline_stages(args.staff_file, deploy_config, args.form_id),
+                            ArtifactStore(args.store), args.jobs, args.force)
+        ok = pipeline.run()
+
+        print()
+        for stage_name, file_name in (('prepare', STAFF_LIST_FILE), ('build', FORM_FILE)):
+            if stage_name in pipeline.outputs:
+                target = os.path.join(args.output_dir, file_name)
+                changed = copy_if_changed(pipeline.outputs[stage_name][file_name], target)
+                print(f"✓ {target} {'updated' if changed else 'unchanged'}")
+
+    ran = sum(1 for status in pipeline.status.values() if status == 'ran')
+    cached = sum(1 for status in pipeline.status.values() if status == 'cached')
+    print(f"\n{'✓' if ok else '✗'} {ran} step(s) ran, {cached} reused")
+    sys.exit(0 if ok else 1)
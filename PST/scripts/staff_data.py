@@ -0,0 +1,193 @@
+# staff_data.py
+# Shared loader for staff list CSVs, backed by a memory-mapped Arrow cache
+#
+# The first load of a staff CSV converts it into an uncompressed Arrow IPC file in a
+# .staff_cache folder next to it. Later loads memory-map that file instead of parsing
+# the CSV again. The cache is rebuilt when the CSV changes (size/mtime, confirmed by
+# its SHA-256 so a touched or copied file is not reconverted).
+#
+# Without pyarrow installed every function falls back to reading the CSV directly.
+# pyarrow is only imported once a staff file is actually read.
+
+import csv
+import hashlib
+import json
+import os
+import tempfile
+
+pa = pc = pa_csv = pa_ipc = None
+_pyarrow_loaded = False
+
+CACHE_DIR_NAME = '.staff_cache'
+# Bump when the cache layout changes so old caches are rebuilt
+# 2: the first column of a CSV starting with a byte order mark is stored as text too
+CACHE_FORMAT_VERSION = 2
+
+# Values pandas.read_csv treats as missing by default; applied when loading a DataFrame
+NA_VALUES = [
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND',
+    '1.#QNAN', '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null',
+]
+
+def _load_pyarrow():
+    """Import pyarrow on first use; returns False if it isn't installed"""
+    global pa, pc, pa_csv, pa_ipc, _pyarrow_loaded
+    if not _pyarrow_loaded:
+        try:
+            import pyarrow
+            import pyarrow.compute
+            import pyarrow.csv
+            import pyarrow.ipc
+        except ImportError:
+            pass
+        else:
+            pa, pc, pa_csv, pa_ipc = pyarrow, pyarrow.compute, pyarrow.csv, pyarrow.ipc
+        _pyarrow_loaded = True
+    return pa is not None
+
+def cache_paths(csv_path):
+    """Return (arrow file, metadata file) paths of the cache for csv_path"""
+    folder, name = os.path.split(os.path.abspath(csv_path))
+    base = os.path.join(folder, CACHE_DIR_NAME, name)
+    return base + '.arrow', base + '.json'
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _read_meta(meta_path):
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _write_meta(meta_path, meta):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(meta_path), suffix='.json')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, meta_path)
+
+def cache_is_fresh(csv_path):
+    """True if the Arrow cache of csv_path exists and matches the current CSV contents"""
+    arrow_path, meta_path = cache_paths(csv_path)
+    meta = _read_meta(meta_path)
+    if not meta or meta.get('version') != CACHE_FORMAT_VERSION or not os.path.exists(arrow_path):
+        return False
+
+    stat = os.stat(csv_path)
+    if meta['size'] == stat.st_size and meta['mtime_ns'] == stat.st_mtime_ns:
+        return True
+    if meta['size'] != stat.st_size or meta['sha256'] != file_sha256(csv_path):
+        return False
+
+    # Same contents with a new timestamp: keep the cache, remember the new mtime
+    meta['mtime_ns'] = stat.st_mtime_ns
+    _write_meta(meta_path, meta)
+    return True
+
+def build_cache(csv_path):
+    """
+    Convert csv_path into its Arrow cache, streaming it batch by batch so files
+    larger than memory can be converted. Every column is stored as text exactly
+    as it appears in the file.
+    """
+    arrow_path, meta_path = cache_paths(csv_path)
+    os.makedirs(os.path.dirname(arrow_path), exist_ok=True)
+
+    with open(csv_path, 'r', encoding='utf-8-sig', newline='') as f:
+        column_names = next(csv.reader(f), [])
+
+    stat = os.stat(csv_path)
+    sha256 = file_sha256(csv_path)
+
+    convert_options = pa_csv.ConvertOptions(
+        column_types={name: pa.string() for name in column_names},
+        strings_can_be_null=False,
+    )
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(arrow_path), suffix='.arrow')
+    os.close(fd)
+    try:
+        reader = pa_csv.open_csv(csv_path, convert_options=convert_options)
+        num_rows = 0
+        with pa_ipc.new_file(tmp_path, reader.schema) as writer:
+            for batch in reader:
+                writer.write_batch(batch)
+                num_rows += batch.num_rows
+        os.replace(tmp_path, arrow_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    _write_meta(meta_path, {
+        'version': CACHE_FORMAT_VERSION,
+        'source': os.path.basename(csv_path),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'sha256': sha256,
+        'num_rows': num_rows,
+    })
+
+def open_staff_table(csv_path, columns=None):
+    """
+    Return the contents of csv_path as a memory-mapped pyarrow Table (zero-copy),
+    building or refreshing the cache first if needed. Returns None when pyarrow is
+    not installed or the file can't be converted (e.g. ragged rows), so callers
+    can fall back to reading the CSV.
+    """
+    if not _load_pyarrow():
+        return None
+    try:
+        if not cache_is_fresh(csv_path):
+            build_cache(csv_path)
+        arrow_path = cache_paths(csv_path)[0]
+        table = pa_ipc.open_file(pa.memory_map(arrow_path, 'r')).read_all()
+    except (OSError, pa.ArrowException):
+        return None
+    return table.select(columns) if columns is not None else table
+
+def table_to_frame(table, dtypes=None):
+    """
+    Convert a staff table to a pandas DataFrame, treating the same values as missing
+    as pandas.read_csv() does and applying dtypes ({column: dtype}).
+    """
+    na_values = pa.array(NA_VALUES)
+    columns = [pc.if_else(pc.is_in(column, value_set=na_values), None, column)
+               for column in table.columns]
+    staff_df = pa.table(columns, names=table.column_names).to_pandas()
+    return staff_df.astype(dtypes) if dtypes else staff_df
+
+def load_staff(csv_path, columns=None, dtypes=None):
+    """Load a staff CSV as a DataFrame, from the Arrow cache when available"""
+    table = open_staff_table(csv_path, columns)
+    if table is not None:
+        return table_to_frame(table, dtypes)
+
+    import pandas as pd
+    return pd.read_csv(csv_path, usecols=columns, dtype=dtypes)
+
+def iter_staff_rows(csv_path):
+    """
+    Yield the rows of a staff CSV as dicts of strings, like csv.DictReader, reading
+    from the Arrow cache when available.
+    """
+    table = open_staff_table(csv_path)
+    if table is None:
+        with open(csv_path, 'r', encoding='utf-8-sig', newline='') as f:
+            yield from csv.DictReader(f)
+        return
+
+    for batch in table.to_batches():
+        yield from batch.to_pylist()
+
+def count_staff_rows(csv_path):
+    """Number of data rows in a staff CSV; free once the CSV has been cached"""
+    table = open_staff_table(csv_path)
+    if table is not None:
+        return table.num_rows
+    with open(csv_path, 'r', encoding='utf-8-sig', newline='') as f:
+        return sum(1 for _ in csv.DictReader(f))
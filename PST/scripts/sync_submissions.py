@@ -0,0 +1,266 @@
+"""
+Incrementally sync the submissions of a form from ODK Central into a local SQLite store
+
+The first sync downloads every submission. Later syncs only ask the OData feed for
+submissions received or edited since the last one, so they take time proportional to
+what changed rather than to the total. Each submission is upserted into the
+`submissions` table keyed by --key, with one column per question of the form; the
+newest submission for a key wins, and edits of it replace it. The form is
+employee_odk_form.csv (keyed by employee_id) or, with --tin-form, the TIN auto-fill
+form of create_autofill_tin_form.py (keyed by tin). The key must be a question of
+the form.
+
+Every submission fetched is also logged in the `instances` table (instance ID, TIN,
+submission date), which warehouse.py uses to reconcile submissions against the staff
+list, duplicates included. Only a form with a tin question (i.e. --tin-form) can be
+reconciled; for other forms nothing is logged there and a warning is printed.
+
+The high-water mark (the latest submissionDate/updatedAt seen, plus the instance IDs
+at exactly that time so ties are not fetched twice) is kept in the `checkpoint`
+table of the same database, and only moves once a sync has completed.
+
+Pages are fetched by $skip over the submissions received up to the moment the sync
+started, by the server's clock (see export_odata()); the delta has no upper bound on
+updatedAt, so an edit made during the sync can only add a submission to the result,
+never remove one from under the pages. The mark never moves past that start time
+either, so submissions edited during the sync are fetched again by the next one.
+
+A submission can become visible after its own submissionDate (the server stamps it
+before the upload has committed), i.e. after a sync already moved the mark past it.
+So each delta re-reads --overlap seconds (default 300) behind the mark; submissions
+fetched again are upserted over themselves.
+
+Usage:
+    python sync_submissions.py [--db PATH] [--form-id ID] [--key COLUMN] [--full]
+                               [--page-size N] [--workers N] [--overlap SECONDS]
+                               [--form-csv PATH | --tin-form]
+"""
+import argparse
+import json
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+import instrumentation
+from odk_central import ODKCentralClient, ODKCentralError
+from export_submissions import (DEFAULT_FORM_CSV, DEFAULT_FORM_ID, PAGE_SIZE, WORKERS, central_time, export_odata,
+                                form_columns, snapshot_time, tin_form)
+
+DEFAULT_DB = '../csv/submissions.sqlite'
+DEFAULT_KEY = 'employee_id'
+TIN_FORM_KEY = 'tin'
+UPSERT_BATCH_SIZE = 1000
+# Seconds re-read behind the mark, for submissions that became visible late
+OVERLAP_SECONDS = 300
+
+# One row per submission (rowid grows with every insert/replace, so readers can follow it)
+INSTANCES_TABLE_SQL = (
+    "CREATE TABLE IF NOT EXISTS instances ("
+    "instance_id TEXT PRIMARY KEY, tin TEXT, submission_date TEXT)")
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+class SubmissionStore:
+    """
+    SQLite table of the latest submission per key, plus the sync checkpoint of each
+    form. Acts as the row writer for export_odata(): rows are upserted in batches.
+    """
+
+    def __init__(self, db_file, columns, key):
+        if key not in columns:
+            questions = ', '.join(columns[1:-1])
+            raise ValueError(f"Key column '{key}' is not a question of the form (questions: {questions})")
+        self.conn = sqlite3.connect(db_file)
+        self.columns = columns + ['updated_at']
+        self.key = key
+        # The TIN is what warehouse.py reconciles on; forms without one aren't logged
+        self.has_tin = 'tin' in columns
+        self.batch = []
+        self.instances = []
+        self.mark = ''
+        self.mark_ids = set()
+        self.skipped_ids = set()
+        self.seen_ids = set()
+        self.ceiling = None
+        self.upserted = 0
+        self.without_key = 0
+        self._create_tables()
+
+    def _create_tables(self):
+        column_defs = ', '.join(f"{_quote(c)} TEXT" for c in self.columns)
+        self.conn.execute(f"CREATE TABLE IF NOT EXISTS submissions ({column_defs}, PRIMARY KEY ({_quote(self.key)}))")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS checkpoint ("
+            "form_id TEXT PRIMARY KEY, mark TEXT, mark_ids TEXT, synced_at TEXT, submissions INTEGER)")
+        self.conn.execute(INSTANCES_TABLE_SQL)
+        # Columns added to the form since the table was created
+        existing = {row[1] for row in self.conn.execute("PRAGMA table_info(submissions)")}
+        for column in self.columns:
+            if column not in existing:
+                self.conn.execute(f"ALTER TABLE submissions ADD COLUMN {_quote(column)} TEXT")
+        self.conn.commit()
+
+    def load_checkpoint(self, form_id):
+        """Start from the form's saved high-water mark; returns it ('' if never synced)"""
+        row = self.conn.execute("SELECT mark, mark_ids FROM checkpoint WHERE form_id = ?", (form_id,)).fetchone()
+        if row:
+            self.mark, self.mark_ids = row[0], set(json.loads(row[1]))
+        self.skipped_ids = set(self.mark_ids)
+        return self.mark
+
+    def reset_checkpoint(self, form_id):
+        self.conn.execute("DELETE FROM checkpoint WHERE form_id = ?", (form_id,))
+        self.conn.commit()
+
+    def delta_filter(self, snapshot, overlap=OVERLAP_SECONDS):
+        """
+        OData $filter for submissions received or edited since overlap seconds before
+        the mark (None for a full sync). export_odata() bounds the submission date by
+        snapshot, the server's time; the mark won't move past it (see writerow).
+        """
+        self.ceiling = snapshot
+        if not self.mark:
+            return None
+        since = central_time(datetime.fromisoformat(self.mark.replace('Z', '+00:00')) - timedelta(seconds=overlap))
+        return f"(__system/submissionDate ge {since} or __system/updatedAt ge {since})"
+
+    def writerow(self, row):
+        changed_at = max(row['submission_date'], row['updated_at'])
+        # Submissions at exactly the old mark were stored by the previous sync, and a
+        # submission edited during this one may come twice as the pages shift
+        if changed_at == self.mark and row['instance_id'] in self.skipped_ids:
+            return
+        if row['instance_id'] in self.seen_ids:
+            return
+        self.seen_ids.add(row['instance_id'])
+        # Edits after the sync started are left for the next sync to fetch again
+        if self.ceiling is None or changed_at <= self.ceiling:
+            if changed_at > self.mark:
+                self.mark, self.mark_ids = changed_at, set()
+            if changed_at == self.mark:
+                self.mark_ids.add(row['instance_id'])
+
+        if self.has_tin:
+            self.instances.append((row['instance_id'], str(row.get('tin', '')), row['submission_date']))
+        if row.get(self.key):
+            self.batch.append([str(row.get(c, '')) for c in self.columns])
+        else:
+            self.without_key += 1
+        if len(self.batch) >= UPSERT_BATCH_SIZE or len(self.instances) >= UPSERT_BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        if self.instances:
+            self.conn.executemany("INSERT OR REPLACE INTO instances VALUES (?, ?, ?)", self.instances)
+            self.instances = []
+        if not self.batch:
+            self.conn.commit()
+            return
+        names = ', '.join(_quote(c) for c in self.columns)
+        placeholders = ', '.join('?' for _ in self.columns)
+        updates = ', '.join(f"{_quote(c)} = excluded.{_quote(c)}" for c in self.columns if c != self.key)
+        # A newer submission for the same key wins; an edit of the stored one replaces it
+        self.conn.executemany(
+            f"INSERT INTO submissions ({names}) VALUES ({placeholders}) "
+            f"ON CONFLICT ({_quote(self.key)}) DO UPDATE SET {updates} "
+            f"WHERE excluded.instance_id = submissions.instance_id "
+            f"OR excluded.submission_date >= submissions.submission_date",
+            self.batch)
+        self.conn.commit()
+        self.upserted += len(self.batch)
+        self.batch = []
+
+    def save_checkpoint(self, form_id):
+        self.flush()
+        total = self.conn.execute("SELECT COUNT(*) FROM submissions").fetchone()[0]
+        self.conn.execute(
+            "INSERT OR REPLACE INTO checkpoint (form_id, mark, mark_ids, synced_at, submissions) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (form_id, self.mark, json.dumps(sorted(self.mark_ids)),
+             datetime.now(timezone.utc).isoformat(), total))
+        self.conn.commit()
+        return total
+
+    def close(self):
+        self.conn.close()
+
+def sync_submissions(db_file=DEFAULT_DB, form_id=DEFAULT_FORM_ID, key=DEFAULT_KEY, full=False,
+                     page_size=PAGE_SIZE, workers=WORKERS, form_csv=DEFAULT_FORM_CSV, columns=None,
+                     overlap=OVERLAP_SECONDS):
+    print("=" * 60)
+    print("ODK Central Submission Sync")
+    print("=" * 60)
+    print()
+
+    from upload_config import ODK_CONFIG
+
+    project_id = ODK_CONFIG['project_id']
+    try:
+        store = SubmissionStore(db_file, columns or form_columns(form_csv), key)
+    except (OSError, sqlite3.Error, ValueError) as e:
+        print(f"✗ {e}")
+        return False
+    if not store.has_tin:
+        print("⚠ The form has no tin question, so warehouse.py can't reconcile these submissions "
+              "against the staff list (sync the TIN auto-fill form with --tin-form for that)")
+    try:
+        if full:
+            store.reset_checkpoint(form_id)
+        mark = store.load_checkpoint(form_id)
+        print(f"Server: {ODK_CONFIG['server_url']}")
+        print(f"Form: {form_id} (project {project_id}) -> {db_file}, keyed by {key}")
+        print(f"Since: {mark or 'the beginning (full sync)'}")
+        print()
+
+        start = time.perf_counter()
+        with ODKCentralClient.from_config(ODK_CONFIG, pool_size=max(workers, 1)) as client:
+            snapshot = snapshot_time(client, project_id)
+            fetched = export_odata(client, project_id, form_id, store, page_size, workers,
+                                   odata_filter=store.delta_filter(snapshot, overlap), snapshot=snapshot)
+            metrics = client.metrics.format_summary()
+        with instrumentation.span('checkpoint'):
+            total = store.save_checkpoint(form_id)
+    except (ODKCentralError, OSError, sqlite3.Error, ValueError) as e:
+        print(f"✗ {e}")
+        return False
+    finally:
+        store.close()
+
+    elapsed = time.perf_counter() - start
+    instrumentation.count('submissions', fetched)
+    instrumentation.count('rows_upserted', store.upserted)
+    print(f"✓ Fetched {fetched:,} new, edited or overlapping submissions in {elapsed:.1f}s "
+          f"({store.upserted:,} upserted, {store.without_key:,} without {key})")
+    print(f"✓ Store now holds {total:,} {key}s; next sync starts from {store.mark or 'the beginning'}")
+    print(f"Requests: {metrics}")
+    return True
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Incrementally sync form submissions into SQLite')
+    parser.add_argument('--db', default=DEFAULT_DB, help=f'SQLite store (default: {DEFAULT_DB})')
+    parser.add_argument('--form-id', help=f'form to sync (default: {DEFAULT_FORM_ID}, '
+                                          'or the TIN auto-fill form with --tin-form)')
+    parser.add_argument('--key', help=f'question that identifies an employee (default: {DEFAULT_KEY}, '
+                                      f'or {TIN_FORM_KEY} with --tin-form)')
+    parser.add_argument('--full', action='store_true', help='ignore the checkpoint and fetch everything')
+    parser.add_argument('--page-size', type=int, default=PAGE_SIZE, help='OData page size')
+    parser.add_argument('--workers', type=int, default=WORKERS, help='OData pages fetched at once')
+    parser.add_argument('--overlap', type=int, default=OVERLAP_SECONDS,
+                        help=f'seconds re-read behind the last mark, for late submissions (default: {OVERLAP_SECONDS})')
+    form = parser.add_mutually_exclusive_group()
+    form.add_argument('--form-csv', default=DEFAULT_FORM_CSV, help='form definition giving the columns')
+    form.add_argument('--tin-form', action='store_true',
+                      help='sync the TIN auto-fill form (create_autofill_tin_form.py), which warehouse.py reconciles')
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+
+    if args.tin_form:
+        (form_id, columns), key = tin_form(), TIN_FORM_KEY
+    else:
+        form_id, columns, key = DEFAULT_FORM_ID, None, DEFAULT_KEY
+    with instrumentation.instrumented('sync_submissions', args):
+        ok = sync_submissions(args.db, args.form_id or form_id, args.key or key, args.full, args.page_size,
+                              args.workers, args.form_csv, columns, args.overlap)
+    sys.exit(0 if ok else 1)
@@ -2,9 +2,10 @@
 # Script to upload XLSForm to ODK Central
 
 import requests
-import json
 from getpass import getpass
 import os
+import instrumentation
+from odk_central import ODKCentralClient, ODKCentralError
 
 def upload_to_odk_central():
     """Upload XLSForm to ODK Central"""
@@ -35,36 +36,25 @@ def upload_to_odk_central():
         print("Please run 'python create_odk_xlsform.py' first.")
         return False
     
+    client = ODKCentralClient(server_url, email, password)
     try:
-        # Step 1: Authenticate and get session token
+        # Step 1: Authenticate and get session token (reused if still valid)
         print("\n[1/4] Authenticating...")
-        auth_url = f"{server_url}/v1/sessions"
-        auth_data = {
-            "email": email,
-            "password": password
-        }
-        
-        auth_response = requests.post(auth_url, json=auth_data)
-        
-        if auth_response.status_code != 200:
-            print(f"✗ Authentication failed: {auth_response.status_code}")
-            print(f"Response: {auth_response.text}")
+        try:
+            client.authenticate()
+        except ODKCentralError as e:
+            print(f"✗ {e}")
+            if e.response is not None:
+                print(f"Response: {e.response.text}")
             return False
         
-        token = auth_response.json()['token']
-        headers = {
-            'Authorization': f'Bearer {token}'
-        }
         print("✓ Authentication successful")
         
         # Step 2: Check if form already exists
         print("\n[2/4] Checking existing forms...")
         form_id = 'employee_details_v1'
         
-        check_url = f"{server_url}/v1/projects/{project_id}/forms/{form_id}"
-        check_response = requests.get(check_url, headers=headers)
-        
-        form_exists = check_response.status_code == 200
+        form_exists = client.form_exists(project_id, form_id)
         
         if form_exists:
             print(f"⚠ Form '{form_id}' already exists")
@@ -73,32 +63,10 @@ def upload_to_odk_central():
                 print("Upload cancelled.")
                 return False
         
-        # Step 3: Upload the XLSForm
+        # Step 3: Upload the XLSForm (new draft for an existing form, otherwise a new form)
         print(f"\n[3/4] Uploading form...")
         
-        if form_exists:
-            # Create new draft for existing form
-            draft_url = f"{server_url}/v1/projects/{project_id}/forms/{form_id}/draft"
-            upload_url = f"{draft_url}"
-            method = 'post'
-        else:
-            # Create new form
-            upload_url = f"{server_url}/v1/projects/{project_id}/forms"
-            method = 'post'
-        
-        # Upload file
-        with open(xlsform_file, 'rb') as f:
-            files = {
-                'xlsx': (xlsform_file, f, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-            }
-            
-            headers_upload = headers.copy()
-            headers_upload['X-XlsForm-FormId-Fallback'] = form_id
-            
-            if method == 'post':
-                upload_response = requests.post(upload_url, headers=headers_upload, files=files)
-            else:
-                upload_response = requests.put(upload_url, headers=headers_upload, files=files)
+        upload_response = client.upload_form(project_id, form_id, xlsform_file, as_draft=form_exists)
         
         if upload_response.status_code not in [200, 201]:
             print(f"✗ Upload failed: {upload_response.status_code}")
@@ -110,8 +78,7 @@ def upload_to_odk_central():
         # Step 4: Publish the draft (if it's an update)
         if form_exists:
             print("\n[4/4] Publishing draft...")
-            publish_url = f"{server_url}/v1/projects/{project_id}/forms/{form_id}/draft/publish"
-            publish_response = requests.post(publish_url, headers=headers)
+            publish_response = client.publish_draft(project_id, form_id)
             
             if publish_response.status_code != 200:
                 print(f"⚠ Warning: Failed to publish draft: {publish_response.status_code}")
@@ -144,10 +111,13 @@ def upload_to_odk_central():
     except Exception as e:
         print(f"\n✗ Error: {e}")
         return False
+    finally:
+        client.close()
 
 def main():
     try:
-        upload_to_odk_central()
+        with instrumentation.instrumented('upload_to_odk_central'):
+            upload_to_odk_central()
     except KeyboardInterrupt:
         print("\n\nUpload cancelled by user.")
     except Exception as e:
@@ -0,0 +1,311 @@
+"""
+Reconcile submissions against the staff list in a local SQLite warehouse
+
+Answers "which TINs in staff_list.csv have not submitted yet, per organisation". The
+prepared staff list (see prepare_staff_list_csv.py) and the submissions synced by
+sync_submissions.py (or imported from an export_submissions.py CSV) are loaded into
+indexed tables of the same database:
+
+    staff      one row per normalized TIN, with its number of submissions
+    submitted  the TIN of every submission seen
+    coverage   precomputed staff/submitted counts per organisation, job and gender
+
+Refreshing is incremental: only submissions added or edited since the last refresh
+are applied, adjusting the counts of the TINs they touch. The staff list is reloaded
+(and the counts recomputed) only when the file changes. Reports then read the
+precomputed tables and indexes, so they return in milliseconds.
+
+Submissions are matched to staff by TIN, which only the TIN auto-fill form collects:
+sync or export it with --tin-form. Submissions without any TIN (e.g. of
+employee_odk_form.csv) are refused rather than reported as every staff member missing.
+
+Usage:
+    python warehouse.py [--db PATH] [--staff-list PATH] [--submissions-csv PATH]
+                        [--organisation NAME] [--missing-csv PATH] [--top N]
+"""
+import argparse
+import csv
+import os
+import re
+import sqlite3
+import sys
+import time
+
+import instrumentation
+import staff_data
+from sync_submissions import DEFAULT_DB, INSTANCES_TABLE_SQL
+
+DEFAULT_STAFF_LIST = '../csv/staff_list.csv'
+DIMENSIONS = ['organisation', 'job', 'gender']
+STAFF_COLUMNS = ['tin', 'eeno', 'staff_name', 'gender', 'organisation', 'job']
+BATCH_SIZE = 5000
+
+def normalize_tin(tin):
+    """
+    Uppercase a TIN and drop whitespace and dashes, like normalize_tins() in
+    prepare_staff_list_csv.py and the TIN auto-fill form. Blank TINs become None.
+    """
+    tin = re.sub(r'[\s-]', '', (tin or '').upper())
+    return tin or None
+
+class Warehouse:
+    def __init__(self, db_file=DEFAULT_DB):
+        self.conn = sqlite3.connect(db_file)
+        self.conn.create_function('normalize_tin', 1, normalize_tin, deterministic=True)
+        self._create_tables()
+
+    def _create_tables(self):
+        staff_defs = ', '.join(f"{c} TEXT" for c in STAFF_COLUMNS)
+        self.conn.executescript(f"""
+            CREATE TABLE IF NOT EXISTS staff (
+                tin_key TEXT PRIMARY KEY, {staff_defs}, submissions INTEGER NOT NULL DEFAULT 0);
+            CREATE INDEX IF NOT EXISTS staff_organisation ON staff (organisation, submissions);
+            CREATE INDEX IF NOT EXISTS staff_job ON staff (job, submissions);
+            CREATE INDEX IF NOT EXISTS staff_gender ON staff (gender, submissions);
+            CREATE INDEX IF NOT EXISTS staff_submissions ON staff (submissions);
+            CREATE TABLE IF NOT EXISTS submitted (instance_id TEXT PRIMARY KEY, tin_key TEXT);
+            CREATE INDEX IF NOT EXISTS submitted_tin ON submitted (tin_key);
+            CREATE TABLE IF NOT EXISTS coverage (
+                dimension TEXT, value TEXT, staff INTEGER, submitted INTEGER,
+                PRIMARY KEY (dimension, value));
+            CREATE TABLE IF NOT EXISTS warehouse_state (name TEXT PRIMARY KEY, value TEXT);
+        """)
+        self.conn.execute(INSTANCES_TABLE_SQL)
+        self.conn.commit()
+
+    def _state(self, name, default=None):
+        row = self.conn.execute("SELECT value FROM warehouse_state WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else default
+
+    def _set_state(self, name, value):
+        self.conn.execute("INSERT OR REPLACE INTO warehouse_state VALUES (?, ?)", (name, str(value)))
+
+    # Loading
+
+    def load_staff_list(self, staff_file=DEFAULT_STAFF_LIST):
+        """
+        (Re)load the staff list if it changed since the last load, then recompute the
+        submission counts and coverage. Returns True if it was reloaded.
+        """
+        stat = os.stat(staff_file)
+        signature = f"{os.path.abspath(staff_file)}|{stat.st_size}|{stat.st_mtime_ns}"
+        if self._state('staff_signature') == signature:
+            return False
+
+        placeholders = ', '.join('?' for _ in range(len(STAFF_COLUMNS) + 1))
+        rows = 0
+        with self.conn:
+            self.conn.execute("DELETE FROM staff")
+            batch = []
+            for row in staff_data.iter_staff_rows(staff_file):
+                tin_key = normalize_tin(row.get('tin'))
+                if tin_key is None:
+                    continue
+                batch.append([tin_key] + [row.get(c) or '' for c in STAFF_COLUMNS])
+                rows += 1
+                if len(batch) >= BATCH_SIZE:
+                    self.conn.executemany(f"INSERT OR IGNORE INTO staff ({'tin_key, ' + ', '.join(STAFF_COLUMNS)}) "
+                                          f"VALUES ({placeholders})", batch)
+                    batch = []
+            self.conn.executemany(f"INSERT OR IGNORE INTO staff ({'tin_key, ' + ', '.join(STAFF_COLUMNS)}) "
+                                  f"VALUES ({placeholders})", batch)
+            loaded = self.conn.execute("SELECT COUNT(*) FROM staff").fetchone()[0]
+            # Rows whose TIN matched an earlier one once normalized
+            self._set_state('staff_duplicates', rows - loaded)
+            self._recompute()
+            self._set_state('staff_signature', signature)
+        return True
+
+    def import_submissions_csv(self, submissions_file):
+        """Add the submissions of an export_submissions.py CSV (needs a tin column)"""
+        with open(submissions_file, 'r', encoding='utf-8', newline='') as f, self.conn:
+            reader = csv.DictReader(f)
+            if 'tin' not in (reader.fieldnames or []):
+                raise ValueError(f"{submissions_file} has no 'tin' column; export the TIN auto-fill form "
+                                 f"with `export_submissions.py --tin-form`")
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO instances VALUES (?, ?, ?)",
+                ((row['instance_id'], row['tin'], row['submission_date']) for row in reader))
+
+    def _recompute(self):
+        """Rebuild the submission counts and coverage from scratch"""
+        self.conn.execute("""
+            UPDATE staff SET submissions = (
+                SELECT COUNT(*) FROM submitted WHERE submitted.tin_key = staff.tin_key)""")
+        self.conn.execute("DELETE FROM coverage")
+        self.conn.execute("""
+            INSERT INTO coverage SELECT 'all', '', COUNT(*), COALESCE(SUM(submissions > 0), 0) FROM staff""")
+        for dimension in DIMENSIONS:
+            self.conn.execute(f"""
+                INSERT INTO coverage SELECT '{dimension}', {dimension}, COUNT(*), SUM(submissions > 0)
+                FROM staff GROUP BY {dimension}""")
+
+    def _adjust(self, tin_key, delta):
+        """Add delta to a TIN's submission count, updating coverage if it crosses zero"""
+        row = self.conn.execute(
+            "SELECT submissions, organisation, job, gender FROM staff WHERE tin_key = ?", (tin_key,)).fetchone()
+        if row is None:
+            return  # Not on the staff list; reported as unknown
+        before, values = row[0], dict(zip(DIMENSIONS, row[1:]))
+        after = before + delta
+        self.conn.execute("UPDATE staff SET submissions = ? WHERE tin_key = ?", (after, tin_key))
+        if (before > 0) != (after > 0):
+            change = 1 if after > 0 else -1
+            keys = [('all', '')] + [(dimension, values[dimension]) for dimension in DIMENSIONS]
+            self.conn.executemany("UPDATE coverage SET submitted = submitted + ? WHERE dimension = ? AND value = ?",
+                                  [(change, dimension, value) for dimension, value in keys])
+
+    def check_submission_tins(self):
+        """Raise ValueError if there are submissions but none of them has a TIN to match on"""
+        total, with_tin = self.conn.execute(
+            "SELECT COUNT(*), COUNT(NULLIF(TRIM(tin), '')) FROM instances").fetchone()
+        if total and not with_tin:
+            raise ValueError(f"None of the {total:,} submissions has a TIN, so they can't be matched to the "
+                             f"staff list; sync the TIN auto-fill form with `sync_submissions.py --tin-form`")
+
+    def refresh(self):
+        """Apply submissions added or edited since the last refresh; returns how many"""
+        self.check_submission_tins()
+        last_rowid = int(self._state('instances_rowid', 0))
+        applied = 0
+        with self.conn:
+            rows = self.conn.execute(
+                "SELECT rowid, instance_id, tin FROM instances WHERE rowid > ? ORDER BY rowid", (last_rowid,)
+            ).fetchall()
+            for rowid, instance_id, tin in rows:
+                new_key = normalize_tin(tin)
+                old = self.conn.execute("SELECT tin_key FROM submitted WHERE instance_id = ?", (instance_id,)).fetchone()
+                old_key = old[0] if old else None
+                last_rowid = rowid
+                if old is not None and old_key == new_key:
+                    continue
+                if old_key is not None:
+                    self._adjust(old_key, -1)
+                if new_key is not None:
+                    self._adjust(new_key, 1)
+                self.conn.execute("INSERT OR REPLACE INTO submitted VALUES (?, ?)", (instance_id, new_key))
+                applied += 1
+            self._set_state('instances_rowid', last_rowid)
+        return applied
+
+    # Reports
+
+    def coverage(self, dimension):
+        """[(value, staff, submitted)] for one dimension, least covered first"""
+        return self.conn.execute(
+            "SELECT value, staff, submitted FROM coverage WHERE dimension = ? "
+            "ORDER BY CAST(submitted AS REAL) / staff, value", (dimension,)).fetchall()
+
+    def totals(self):
+        staff, submitted = self.conn.execute(
+            "SELECT staff, submitted FROM coverage WHERE dimension = 'all'").fetchone() or (0, 0)
+        return {
+            'staff': staff,
+            'submitted': submitted,
+            'missing': staff - submitted,
+            'duplicate_tins': self.conn.execute("SELECT COUNT(*) FROM staff WHERE submissions > 1").fetchone()[0],
+            'staff_list_duplicates': int(self._state('staff_duplicates', 0)),
+            'unknown_tins': self.conn.execute("""
+                SELECT COUNT(DISTINCT tin_key) FROM submitted
+                WHERE tin_key IS NOT NULL AND tin_key NOT IN (SELECT tin_key FROM staff)""").fetchone()[0],
+        }
+
+    def missing(self, organisation=None):
+        """Staff (tin, eeno, staff_name, organisation, job) with no submission yet"""
+        columns = 'tin, eeno, staff_name, organisation, job'
+        if organisation is None:
+            return self.conn.execute(f"SELECT {columns} FROM staff WHERE submissions = 0 ORDER BY tin")
+        return self.conn.execute(
+            f"SELECT {columns} FROM staff WHERE organisation = ? AND submissions = 0 ORDER BY tin", (organisation,))
+
+    def duplicates(self):
+        """(tin, staff_name, submissions) of TINs submitted more than once"""
+        return self.conn.execute(
+            "SELECT tin, staff_name, submissions FROM staff WHERE submissions > 1 ORDER BY submissions DESC, tin")
+
+    def close(self):
+        self.conn.close()
+
+def print_report(warehouse, top=10):
+    start = time.perf_counter()
+    totals = warehouse.totals()
+    tables = {dimension: warehouse.coverage(dimension) for dimension in DIMENSIONS}
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    staff = totals['staff']
+    percent = 100 * totals['submitted'] / staff if staff else 0
+    print(f"Staff on list: {staff:,}")
+    print(f"Submitted:     {totals['submitted']:,} ({percent:.1f}%)")
+    print(f"Missing:       {totals['missing']:,}")
+    print(f"TINs submitted more than once: {totals['duplicate_tins']:,}")
+    print(f"Submitted TINs not on the staff list: {totals['unknown_tins']:,}")
+    if totals['staff_list_duplicates']:
+        print(f"⚠ {totals['staff_list_duplicates']:,} staff list rows repeat a TIN (after normalization)")
+
+    for dimension, rows in tables.items():
+        print(f"\nCoverage by {dimension} (lowest {min(top, len(rows))} of {len(rows)}):")
+        for value, staff, submitted in rows[:top]:
+            print(f"  {value or '(blank)':<40} {submitted:>7,}/{staff:<7,} {100 * submitted / staff:5.1f}%")
+    print(f"\n(report computed in {elapsed_ms:.1f} ms)")
+
+def write_missing_csv(warehouse, output_file, organisation=None):
+    with open(output_file, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['tin', 'eeno', 'staff_name', 'organisation', 'job'])
+        count = 0
+        for row in warehouse.missing(organisation):
+            writer.writerow(row)
+            count += 1
+    return count
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Reconcile ODK submissions against the staff list')
+    parser.add_argument('--db', default=DEFAULT_DB, help=f'SQLite warehouse (default: {DEFAULT_DB})')
+    parser.add_argument('--staff-list', default=DEFAULT_STAFF_LIST)
+    parser.add_argument('--submissions-csv', help='also import an export_submissions.py CSV')
+    parser.add_argument('--organisation', help='only list missing staff of this organisation')
+    parser.add_argument('--missing-csv', help='write the staff who have not submitted to this CSV')
+    parser.add_argument('--top', type=int, default=10, help='rows shown per coverage table')
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("Staff Submission Reconciliation")
+    print("=" * 60)
+    print()
+
+    warehouse = Warehouse(args.db)
+    with instrumentation.instrumented('warehouse', args):
+        try:
+            start = time.perf_counter()
+            if not os.path.exists(args.staff_list):
+                print(f"✗ Error: {args.staff_list} not found!")
+                sys.exit(1)
+            with instrumentation.span('load_staff'):
+                loaded = warehouse.load_staff_list(args.staff_list)
+            if loaded:
+                print(f"✓ Loaded {args.staff_list}")
+            if args.submissions_csv:
+                with instrumentation.span('import'):
+                    warehouse.import_submissions_csv(args.submissions_csv)
+            with instrumentation.span('refresh'):
+                applied = warehouse.refresh()
+            instrumentation.count('submissions_applied', applied)
+            print(f"✓ Applied {applied:,} new or changed submissions in {time.perf_counter() - start:.2f}s")
+            print()
+
+            with instrumentation.span('report'):
+                print_report(warehouse, args.top)
+            if args.missing_csv:
+                with instrumentation.span('write'):
+                    count = write_missing_csv(warehouse, args.missing_csv, args.organisation)
+                print(f"\n✓ Wrote {count:,} missing staff to {args.missing_csv}")
+            elif args.organisation:
+                print(f"\nMissing in {args.organisation}:")
+                for tin, eeno, staff_name, _, job in warehouse.missing(args.organisation):
+                    print(f"  {tin}  {eeno:<10} {staff_name:<40} {job}")
+        except (OSError, sqlite3.Error, ValueError) as e:
+            print(f"✗ {e}")
+            sys.exit(1)
+        finally:
+            warehouse.close()
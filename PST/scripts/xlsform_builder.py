@@ -0,0 +1,202 @@
+"""
+Build XLSForm workbooks from declarative form specs
+
+A form spec is a plain dict with one entry per XLSForm sheet:
+
+    {
+        'survey': [{'type': 'text', 'name': 'tin', 'label': 'TIN', 'required': 'yes'}, ...],
+        'choices': [{'list_name': 'gender', 'name': 'male', 'label': 'Male'}, ...],
+        'settings': {'form_title': ..., 'form_id': ..., 'version': ...},
+        'external_choices': [{'list_name': 'staff_list'}],   # optional
+    }
+
+build_xlsform() writes all sheets in a single streaming pass (openpyxl write-only
+mode): the columns and widths of each sheet are worked out from the spec rows, then
+the rows are written once, without reading cells back. Blank values become empty
+cells. spec_from_csvs() loads a spec from the survey/choices/settings CSVs in ../csv.
+
+Builds are cached like make: next to each workbook a hidden .<name>.build.json
+records the hash of the spec (i.e. of the input CSVs and overrides) and of this
+builder. When neither changed and the workbook is untouched, it is not rewritten,
+so its timestamp (and anything downstream watching it) stays put. Pass force=True
+(--force in the scripts) to rebuild anyway.
+
+Usage:
+    python xlsform_builder.py <survey.csv> <choices.csv> <settings.csv> <output.xlsx> [--force]
+"""
+import argparse
+import csv
+import hashlib
+import json
+import os
+import sys
+import tempfile
+
+SHEETS = ['survey', 'choices', 'settings', 'external_choices']
+MAX_COLUMN_WIDTH = 50
+HEADER_COLOR = '366092'
+
+def read_csv_rows(csv_file):
+    """Rows of a CSV as dicts, leaving out empty values"""
+    rows = []
+    with open(csv_file, 'r', encoding='utf-8', newline='') as f:
+        reader = csv.DictReader(f)
+        for row in reader:
+            # DictReader files surplus fields under None (e.g. an unquoted comma)
+            if None in row:
+                raise ValueError(f"{csv_file} line {reader.line_num}: expected {len(reader.fieldnames)} "
+                                 f"fields, saw {len(reader.fieldnames) + len(row[None])}")
+            rows.append({key: value for key, value in row.items() if value not in (None, '')})
+    return rows
+
+def spec_from_csvs(survey_csv, choices_csv, settings_csv):
+    """Form spec from the survey/choices/settings CSVs (e.g. employee_odk_form.csv)"""
+    settings = read_csv_rows(settings_csv)
+    return {
+        'survey': read_csv_rows(survey_csv),
+        'choices': read_csv_rows(choices_csv),
+        'settings': settings[0] if settings else {},
+    }
+
+def sheet_rows(spec, sheet):
+    """The spec's rows for one sheet as a list of dicts (settings is a single dict)"""
+    rows = spec.get(sheet) or []
+    return [rows] if isinstance(rows, dict) else list(rows)
+
+def sheet_layout(rows):
+    """
+    Columns (in order of first appearance) and their widths for a list of row dicts,
+    sized to the longest header or value like Excel's auto-fit, capped at 50.
+    """
+    widths = {}
+    for row in rows:
+        for column, value in row.items():
+            length = len(str(value)) if value is not None else 0
+            if column not in widths:
+                widths[column] = len(str(column))
+            if length > widths[column]:
+                widths[column] = length
+    return list(widths), [min(width + 2, MAX_COLUMN_WIDTH) for width in widths.values()]
+
+def _header_row(sheet, columns):
+    # openpyxl is imported when a workbook is built, not when the module is
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font, PatternFill
+
+    fill = PatternFill(start_color=HEADER_COLOR, end_color=HEADER_COLOR, fill_type='solid')
+    font = Font(bold=True, color='FFFFFF')
+    cells = []
+    for column in columns:
+        cell = WriteOnlyCell(sheet, value=column)
+        cell.fill = fill
+        cell.font = font
+        cells.append(cell)
+    return cells
+
+_generator_hash = None
+
+def generator_hash():
+    """SHA-256 of this builder's source: a new builder version invalidates every build"""
+    global _generator_hash
+    if _generator_hash is None:
+        with open(os.path.abspath(__file__), 'rb') as f:
+            _generator_hash = hashlib.sha256(f.read()).hexdigest()
+    return _generator_hash
+
+def spec_hash(spec):
+    return hashlib.sha256(json.dumps(spec, sort_keys=True, default=str).encode()).hexdigest()
+
+def build_record_path(output_file):
+    folder, name = os.path.split(os.path.abspath(output_file))
+    return os.path.join(folder, f'.{name}.build.json')
+
+def _read_build_record(output_file):
+    try:
+        with open(build_record_path(output_file), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _write_build_record(output_file, record):
+    """Write the build record through a temp file, so an interrupted run can't leave half of one"""
+    record_path = build_record_path(output_file)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(record_path), suffix='.json')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(record, f, indent=2)
+    os.replace(tmp_path, record_path)
+
+def is_up_to_date(spec, output_file):
+    """True if output_file was built from this spec by this builder and not touched since"""
+    record = _read_build_record(output_file)
+    if not record or not os.path.exists(output_file):
+        return False
+    stat = os.stat(output_file)
+    return (record.get('generator_sha256') == generator_hash()
+            and record.get('spec_sha256') == spec_hash(spec)
+            and record.get('output_size') == stat.st_size
+            and record.get('output_mtime_ns') == stat.st_mtime_ns)
+
+def build_xlsform(spec, output_file, force=False):
+    """
+    Write the form spec to output_file as an XLSForm workbook, unless the build cache
+    shows it is already up to date (see is_up_to_date) and force is not set.
+    Returns True if the workbook was written, False if it was up to date.
+    """
+    if not force and is_up_to_date(spec, output_file):
+        return False
+
+    from openpyxl import Workbook
+    from openpyxl.utils import get_column_letter
+
+    workbook = Workbook(write_only=True)
+    for sheet_name in SHEETS:
+        rows = sheet_rows(spec, sheet_name)
+        if not rows:
+            continue
+        columns, widths = sheet_layout(rows)
+        sheet = workbook.create_sheet(sheet_name)
+        # Write-only sheets take their column widths before any rows
+        for index, width in enumerate(widths, start=1):
+            sheet.column_dimensions[get_column_letter(index)].width = width
+        sheet.append(_header_row(sheet, columns))
+        for row in rows:
+            sheet.append([_cell_value(row.get(column)) for column in columns])
+
+    output_dir = os.path.dirname(os.path.abspath(output_file))
+    os.makedirs(output_dir, exist_ok=True)
+    workbook.save(output_file)
+
+    stat = os.stat(output_file)
+    _write_build_record(output_file, {
+        'generator_sha256': generator_hash(),
+        'spec_sha256': spec_hash(spec),
+        'output_size': stat.st_size,
+        'output_mtime_ns': stat.st_mtime_ns,
+    })
+    return True
+
+def _cell_value(value):
+    return None if value == '' else value
+
+def report_build(output_file, built):
+    if built:
+        print(f"✓ Created {output_file}")
+    else:
+        print(f"✓ {output_file} is up to date (use --force to rebuild)")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build an XLSForm from survey, choices and settings CSVs')
+    parser.add_argument('survey_csv')
+    parser.add_argument('choices_csv')
+    parser.add_argument('settings_csv')
+    parser.add_argument('output_file')
+    parser.add_argument('--force', action='store_true', help='rebuild even if the form is up to date')
+    args = parser.parse_args(argv)
+
+    built = build_xlsform(spec_from_csvs(args.survey_csv, args.choices_csv, args.settings_csv), args.output_file,
+                          force=args.force)
+    report_build(args.output_file, built)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())